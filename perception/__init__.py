@@ -18,12 +18,20 @@ except Exception:
     logging.warning('TensorFlow can be installed following the instructions in https://www.tensorflow.org/get_started/os_setup')
 
 from .feature_matcher import Correspondences, NormalCorrespondences, FeatureMatcher, RawDistanceFeatureMatcher, PointToPlaneFeatureMatcher
-from .image import Image, ColorImage, DepthImage, IrImage, GrayscaleImage, RgbdImage, GdImage, SegmentationImage, BinaryImage, PointCloudImage, NormalCloudImage
+from .image import Image, ColorImage, DepthImage, IrImage, GrayscaleImage, RgbdImage, GdImage, SegmentationImage, BinaryImage, PointCloudImage, NormalCloudImage, ImageBatch
+from .binary_ray_tracer import BinaryRayTracer
+from .connected_components import ConnectedComponents
 from .object_render import RenderMode, ObjectRender, QueryImageBundle
 from .chessboard_registration import ChessboardRegistrationResult, CameraChessboardRegistration
 from .point_registration import RegistrationResult, IterativeRegistrationSolver, PointToPlaneICPSolver
 from .detector import RgbdDetection, RgbdDetector, RgbdForegroundMaskDetector, RgbdForegroundMaskQueryImageDetector, PointCloudBoxDetector, RgbdDetectorFactory
 from .camera_sensor import CameraSensor, VirtualSensor, TensorDatasetVirtualSensor
+from .async_camera_sensor import AsyncCameraSensor
+from .frame_synchronizer import FrameSynchronizer
+from .depth_filter import TemporalDepthFilter
+from .shared_frame_channel import SharedFrameChannel
+from .rgbd_recording import RgbdRecordingWriter, RgbdRecording, RgbdRecordingSensor
+from .point_cloud2 import pointcloud2_dtype, pointcloud2_to_array
 from .webcam_sensor import WebcamSensor
 
 try:
@@ -68,12 +76,15 @@ __all__ = [
     'FeatureExtractor', 'CNNBatchFeatureExtractor', 'CNNReusableBatchFeatureExtractor',
     'Correspondences', 'NormalCorrespondences', 'FeatureMatcher', 'RawDistanceFeatureMatcher', 'PointToPlaneFeatureMatcher',
     'Feature', 'LocalFeature', 'GlobalFeature', 'SHOTFeature', 'MVCNNFeature', 'BagOfFeatures',
-    'Image', 'ColorImage', 'DepthImage', 'IrImage', 'GrayscaleImage', 'RgbdImage', 'GdImage', 'SegmentationImage', 'BinaryImage', 'PointCloudImage', 'NormalCloudImage',
+    'Image', 'ColorImage', 'DepthImage', 'IrImage', 'GrayscaleImage', 'RgbdImage', 'GdImage', 'SegmentationImage', 'BinaryImage', 'PointCloudImage', 'NormalCloudImage', 'ImageBatch',
+    'BinaryRayTracer', 'ConnectedComponents',
     'Kinect2PacketPipelineMode', 'Kinect2FrameMode', 'Kinect2RegistrationMode', 'Kinect2DepthMode', 'Kinect2BridgedQuality', 'Kinect2Sensor','KinectSensorBridged','VirtualKinect2Sensor', 'Kinect2SensorFactory', 'load_images',
     'EnsensoSensor',
     'RgbdSensorFactory', 'PrimesenseSensor', 'VirtualPrimesenseSensor', 'PrimesenseSensor_ROS', 'PrimesenseRegistrationMode',
     'RenderMode', 'ObjectRender', 'QueryImageBundle',
     'RegistrationResult', 'IterativeRegistrationSolver', 'PointToPlaneICPSolver',
-    'OpenCVCameraSensor',
+    'OpenCVCameraSensor', 'AsyncCameraSensor', 'FrameSynchronizer', 'TemporalDepthFilter', 'SharedFrameChannel',
+    'pointcloud2_dtype', 'pointcloud2_to_array',
+    'RgbdRecordingWriter', 'RgbdRecording', 'RgbdRecordingSensor',
     'VideoRecorder',
 ]
@@ -0,0 +1,322 @@
+"""
+Wrapper that captures frames from a camera sensor on a background thread.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .camera_sensor import CameraSensor
+from .exceptions import SensorUnresponsiveException
+
+class AsyncCameraSensor(CameraSensor):
+    """Captures frames from any CameraSensor on a background thread into a
+    fixed-size ring buffer, so that processing can overlap with acquisition.
+
+    Frames are stored exactly as returned by the wrapped sensor's frames()
+    method along with the time at which they were captured. Attributes that
+    are not defined by this class (e.g. intrinsics) are looked up on the
+    wrapped sensor.
+    """
+    def __init__(self, sensor, buffer_size=30, frames_kwargs=None, stop_timeout=5.0):
+        """Create an asynchronous wrapper for a sensor.
+
+        Parameters
+        ----------
+        sensor : :obj:`CameraSensor`
+            the sensor to capture from
+        buffer_size : int
+            the number of most recent frames to keep
+        frames_kwargs : :obj:`dict`
+            keyword arguments for each call to the sensor's frames() method,
+            e.g. {'flush': False} for an OpenCVCameraSensor
+        stop_timeout : float
+            maximum time in seconds that stop() waits for a capture in progress
+
+        Raises
+        ------
+        ValueError
+            If the buffer size is not positive.
+        """
+        if buffer_size < 1:
+            raise ValueError('Buffer size must be positive')
+        self._sensor = sensor
+        self._buffer_size = buffer_size
+        self._frames_kwargs = frames_kwargs
+        if self._frames_kwargs is None:
+            self._frames_kwargs = {}
+        self._stop_timeout = stop_timeout
+
+        # ring buffer of frames, indexed by sequence number modulo the size
+        self._buffer = [None] * self._buffer_size
+        self._timestamps = np.zeros(self._buffer_size)
+        self._read = np.zeros(self._buffer_size, dtype=bool)
+        self._num_captured = 0
+        self._num_dropped = 0
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._capture_error = None
+
+    def __getattr__(self, name):
+        """Looks up attributes missing from the wrapper on the wrapped sensor."""
+        if name == '_sensor':
+            raise AttributeError(name)
+        return getattr(self._sensor, name)
+
+    @property
+    def sensor(self):
+        """:obj:`CameraSensor` : The wrapped sensor.
+        """
+        return self._sensor
+
+    @property
+    def is_running(self):
+        """bool : True if the capture thread is running, or false otherwise.
+        """
+        return self._running
+
+    @property
+    def buffer_size(self):
+        """int : The number of most recent frames kept in the buffer.
+        """
+        return self._buffer_size
+
+    @property
+    def num_captured(self):
+        """int : The number of frames captured since the last start.
+        """
+        return self._num_captured
+
+    @property
+    def capture_error(self):
+        """:obj:`Exception` : The error that stopped capture, or None.
+        """
+        return self._capture_error
+
+    @property
+    def num_dropped(self):
+        """int : The number of frames that were overwritten in the buffer
+        without ever being returned.
+        """
+        return self._num_dropped
+
+    def start(self):
+        """Starts the wrapped sensor and the capture thread.
+        """
+        if self._running:
+            return
+        self._sensor.start()
+        with self._cond:
+            self._buffer = [None] * self._buffer_size
+            self._timestamps[:] = 0
+            self._read[:] = False
+            self._num_captured = 0
+            self._num_dropped = 0
+            self._capture_error = None
+            self._running = True
+        self._thread = threading.Thread(target=self._capture_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the capture thread and the wrapped sensor. If the wrapped
+        sensor is blocked in frames() for longer than the stop timeout, the
+        thread is abandoned and any frame it captures later is discarded.
+
+        Returns
+        -------
+        bool
+            True if the stream was stopped, False if it was already stopped.
+        """
+        if self._thread is None:
+            return False
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(self._stop_timeout)
+        if self._thread.is_alive():
+            logging.warning('Capture from %s did not stop within %.3f sec' %(type(self._sensor).__name__, self._stop_timeout))
+        with self._cond:
+            self._thread = None
+        self._sensor.stop()
+        return True
+
+    def _capture_loop(self):
+        """Reads frames from the sensor into the ring buffer until stopped."""
+        thread = threading.current_thread()
+        while self._running:
+            try:
+                frames = self._sensor.frames(**self._frames_kwargs)
+            except Exception as e:
+                logging.error('Capture from %s failed: %s' %(type(self._sensor).__name__, str(e)))
+                with self._cond:
+                    if self._thread is not thread:
+                        return
+                    self._capture_error = e
+                    self._running = False
+                    self._cond.notify_all()
+                return
+            timestamp = time.time()
+
+            with self._cond:
+                # a thread abandoned by stop() must not touch the buffer
+                if self._thread is not thread:
+                    return
+                ind = self._num_captured % self._buffer_size
+                if self._buffer[ind] is not None and not self._read[ind]:
+                    self._num_dropped += 1
+                self._buffer[ind] = frames
+                self._timestamps[ind] = timestamp
+                self._read[ind] = False
+                self._num_captured += 1
+                self._cond.notify_all()
+
+    def _wait_for_frame(self, num_captured, timeout):
+        """Blocks until more than num_captured frames have been captured.
+        Must be called while holding the condition.
+
+        Raises
+        ------
+        RuntimeError
+            If capture stops before a new frame arrives.
+        SensorUnresponsiveException
+            If no new frame arrives within the timeout.
+        """
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+        while self._num_captured <= num_captured:
+            if not self._running:
+                if self._capture_error is not None:
+                    raise RuntimeError('Capture stopped: %s' %(str(self._capture_error)))
+                raise RuntimeError('Capture not running. Cannot read frames')
+            remaining = None
+            if end_time is not None:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    raise SensorUnresponsiveException('No frame received within %.3f sec' %(timeout))
+            self._cond.wait(remaining)
+
+    def _get(self, seq_num):
+        """Returns the frames and timestamp for a buffered sequence number and
+        marks them as read. Must be called while holding the condition."""
+        ind = seq_num % self._buffer_size
+        self._read[ind] = True
+        return self._buffer[ind], self._timestamps[ind]
+
+    def frames(self):
+        """Returns the most recently captured frames, waiting for the first
+        frame if none have been captured yet.
+
+        Returns
+        -------
+        :obj:`tuple`
+            the frames as returned by the wrapped sensor
+        """
+        frames, _ = self.latest_frame()
+        return frames
+
+    def frames_batch(self, num_frames, color=True, depth=True, timeout=None):
+        """Collects the next num_frames captured frames directly into stacked
+        arrays. Unlike frames(), every frame in the batch is distinct.
+
+        Parameters
+        ----------
+        num_frames : int
+            The number of frames to collect.
+        color : bool
+            Whether or not to collect the color images.
+        depth : bool
+            Whether or not to collect the depth images.
+        timeout : float
+            maximum time to wait for each frame in seconds, or None to wait
+            indefinitely
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            The color images, or None if not collected or not available.
+        :obj:`ImageBatch`
+            The depth images, or None if not collected or not available.
+        :obj:`numpy.ndarray`
+            The capture time of each frame, in seconds since the epoch.
+        """
+        return self._collect_frames_batch(lambda: self.next_frame(timeout),
+                                          num_frames, color, depth)
+
+    def latest_frame(self, timeout=None):
+        """Returns the most recently captured frames and their timestamp,
+        waiting for the first frame if none have been captured yet.
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait in seconds, or None to wait indefinitely
+
+        Returns
+        -------
+        :obj:`tuple`
+            the frames as returned by the wrapped sensor
+        float
+            the capture time in seconds since the epoch
+
+        Raises
+        ------
+        RuntimeError
+            If capture stopped because the wrapped sensor raised an error.
+        """
+        with self._cond:
+            if self._capture_error is not None:
+                raise RuntimeError('Capture stopped: %s' %(str(self._capture_error)))
+            if self._num_captured == 0:
+                self._wait_for_frame(0, timeout)
+            return self._get(self._num_captured - 1)
+
+    def next_frame(self, timeout=None):
+        """Waits for a frame captured after this call and returns it with its
+        timestamp.
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait in seconds, or None to wait indefinitely
+
+        Returns
+        -------
+        :obj:`tuple`
+            the frames as returned by the wrapped sensor
+        float
+            the capture time in seconds since the epoch
+        """
+        with self._cond:
+            num_captured = self._num_captured
+            self._wait_for_frame(num_captured, timeout)
+            return self._get(num_captured)
+
+    def last_frames(self, num_frames):
+        """Returns up to the last num_frames buffered frames, oldest first.
+
+        Parameters
+        ----------
+        num_frames : int
+            number of frames to return, at most the buffer size
+
+        Returns
+        -------
+        :obj:`list`
+            the frames as returned by the wrapped sensor
+        :obj:`numpy.ndarray`
+            the capture times in seconds since the epoch
+        """
+        with self._cond:
+            num_frames = min(num_frames, self._buffer_size, self._num_captured)
+            seq_nums = range(self._num_captured - num_frames, self._num_captured)
+            frames = []
+            timestamps = np.zeros(num_frames)
+            for i, seq_num in enumerate(seq_nums):
+                frames_i, timestamps[i] = self._get(seq_num)
+                frames.append(frames_i)
+            return frames, timestamps
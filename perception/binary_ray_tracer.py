@@ -0,0 +1,256 @@
+"""
+Batched ray marching over binary masks using distance transforms.
+"""
+import numpy as np
+import scipy.ndimage as snd
+
+class BinaryRayTracer(object):
+    """Answers batches of ray queries of the form "march from start along
+    direction in steps of t until the w x w window around the current
+    position does (or does not) contain a nonzero pixel".
+
+    A summed-area table of the mask makes each window test constant time, and
+    chessboard distance transforms of the mask bound how many steps a ray can
+    safely skip without changing the outcome (sphere tracing). Returned
+    positions lie on the same step grid as a step-by-step march, so results
+    match the original per-step queries of BinaryImage.
+
+    Attributes
+    ----------
+    w : int
+        width of the square window tested at each position
+    """
+    def __init__(self, mask, w=13):
+        """
+        Parameters
+        ----------
+        mask : :obj:`numpy.ndarray` of bool
+            2D mask of the nonzero pixels
+        w : int
+            width of the square window tested at each position
+
+        Raises
+        ------
+        ValueError
+            If the mask is not 2D or the window width is not positive.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask.shape) != 2:
+            raise ValueError('Mask must be 2D')
+        if w < 1:
+            raise ValueError('Window width must be positive')
+        self.w = w
+        self._mask = mask
+        self._height, self._width = mask.shape
+
+        # summed-area table with a leading row and column of zeros
+        self._integral = np.zeros([self._height + 1, self._width + 1], dtype=np.int32)
+        self._integral[1:, 1:] = np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1)
+
+        # distance transforms are computed on first use
+        self._dist_to_nonzero = None
+        self._dist_to_zero = None
+
+    @property
+    def shape(self):
+        """:obj:`tuple` of int : The height and width of the mask.
+        """
+        return self._mask.shape
+
+    def _distance_transform(self, mask):
+        """Chessboard distance from each pixel to the nearest pixel of mask,
+        or a bound beyond the image size if the mask is empty."""
+        if not np.any(mask):
+            return np.full(mask.shape, self._height + self._width + self.w, dtype=np.int32)
+        return snd.distance_transform_cdt(~mask, metric='chessboard').astype(np.int32)
+
+    @property
+    def dist_to_nonzero(self):
+        """:obj:`numpy.ndarray` of int : The chessboard distance from each
+        pixel to the nearest nonzero pixel.
+        """
+        if self._dist_to_nonzero is None:
+            self._dist_to_nonzero = self._distance_transform(self._mask)
+        return self._dist_to_nonzero
+
+    @property
+    def dist_to_zero(self):
+        """:obj:`numpy.ndarray` of int : The chessboard distance from each
+        pixel to the nearest zero pixel.
+        """
+        if self._dist_to_zero is None:
+            self._dist_to_zero = self._distance_transform(~self._mask)
+        return self._dist_to_zero
+
+    def window_counts(self, pixels):
+        """Counts the nonzero pixels in the window at each position.
+
+        Parameters
+        ----------
+        pixels : :obj:`numpy.ndarray` of float
+            Nx2 array of (row, column) positions
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            number of nonzero pixels in each window, zero outside the image
+        :obj:`numpy.ndarray` of bool
+            whether each window lies inside the image
+        """
+        pixels = np.asarray(pixels, dtype=np.float64).reshape(-1, 2)
+
+        # the window covers rows floor(p - w / 2) to floor(p - w / 2) + w - 1,
+        # clipped at zero for positions just past the top or left border
+        corner = pixels - self.w / 2.0
+        first = np.floor(corner).astype(np.int64)
+        last = first + self.w - 1
+        in_bounds = np.all(corner > -1, axis=1) & (last[:, 0] < self._height) & (last[:, 1] < self._width)
+
+        first = np.clip(first, 0, [self._height, self._width])
+        last = np.clip(last, 0, [self._height - 1, self._width - 1])
+        s = self._integral
+        counts = s[last[:, 0] + 1, last[:, 1] + 1] - s[first[:, 0], last[:, 1] + 1] \
+                 - s[last[:, 0] + 1, first[:, 1]] + s[first[:, 0], first[:, 1]]
+        counts[~in_bounds] = 0
+        return counts, in_bounds
+
+    def _window_centers(self, pixels):
+        """Returns the pixel at the center of the window of each position,
+        clipped to the image."""
+        center = np.floor(pixels - self.w / 2.0).astype(np.int64) + (self.w - 1) // 2
+        return np.clip(center, 0, [self._height - 1, self._width - 1])
+
+    def _steps_to_border(self, pixels, steps):
+        """Returns the number of steps after which each window first leaves
+        the image, or infinity for rays that never leave it."""
+        lower = self.w / 2.0 - 1
+        upper = np.array([self._height, self._width]) - self.w / 2.0 + 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            num_steps = np.where(steps > 0, (upper - pixels) / steps,
+                                 np.where(steps < 0, (lower - pixels) / steps, np.inf))
+        return np.ceil(np.min(num_steps, axis=1))
+
+    def _march(self, starts, directions, t, find_nonzero, stop_at_border):
+        """Marches a batch of rays until their windows contain a nonzero pixel
+        (find_nonzero) or no nonzero pixels (otherwise).
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            Nx2 array of final positions
+        :obj:`numpy.ndarray` of bool
+            whether each ray met the window condition inside the image
+        """
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 2)
+        if starts.shape != directions.shape:
+            raise ValueError('Number of starts and directions must match')
+        num_rays = starts.shape[0]
+        if find_nonzero:
+            dists = self.dist_to_nonzero
+            margin = self.w // 2 + 1
+        else:
+            dists = self.dist_to_zero
+            margin = 1
+
+        # chessboard length of one step
+        step_len = t * np.max(np.abs(directions), axis=1)
+
+        steps = np.zeros(num_rays, dtype=np.int64)
+        found = np.zeros(num_rays, dtype=bool)
+        active = np.ones(num_rays, dtype=bool)
+        while np.any(active):
+            inds = np.nonzero(active)[0]
+            pixels = starts[inds] + (t * steps[inds])[:, np.newaxis] * directions[inds]
+            counts, in_bounds = self.window_counts(pixels)
+            if find_nonzero:
+                hit = in_bounds & (counts > 0)
+            else:
+                hit = in_bounds & (counts == 0)
+
+            # rays stop on a hit or when leaving the image; a ray that starts
+            # outside the image gets one step to enter it, as before
+            left = ~in_bounds & ((steps[inds] > 0) | stop_at_border)
+            stalled = ~hit & ~left & (step_len[inds] == 0)
+            found[inds[hit]] = True
+            active[inds[hit | left | stalled]] = False
+
+            # skip every step that provably keeps the window condition false
+            move = ~(hit | left | stalled)
+            if not np.any(move):
+                continue
+            centers = self._window_centers(pixels[move])
+            slack = dists[centers[:, 0], centers[:, 1]] - margin
+            num_skip = np.floor((slack - 1e-6) / step_len[inds[move]])
+
+            # stop short of the border so that rays leave at the first outside step
+            num_skip = np.minimum(num_skip, self._steps_to_border(pixels[move], t * directions[inds[move]]) - 1)
+            num_skip[~in_bounds[move]] = 1
+            steps[inds[move]] += np.maximum(num_skip, 1).astype(np.int64)
+
+        pixels = starts + (t * steps)[:, np.newaxis] * directions
+        return pixels, found
+
+    def closest_nonzero_pixels(self, starts, directions, t=0.5):
+        """Marches each ray until a nonzero pixel lies in its window.
+
+        Parameters
+        ----------
+        starts : :obj:`numpy.ndarray` of float
+            Nx2 array of (row, column) start positions
+        directions : :obj:`numpy.ndarray` of float
+            Nx2 array of direction vectors
+        t : float
+            step size along the directions
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            Nx2 array of the first positions with a nonzero pixel in the window
+        :obj:`numpy.ndarray` of bool
+            whether each ray found a nonzero pixel before leaving the image
+        """
+        return self._march(starts, directions, t, True, False)
+
+    def closest_allzero_pixels(self, starts, directions, t=0.5):
+        """Marches each ray until its window contains only zero pixels.
+
+        Parameters
+        ----------
+        starts : :obj:`numpy.ndarray` of float
+            Nx2 array of (row, column) start positions
+        directions : :obj:`numpy.ndarray` of float
+            Nx2 array of direction vectors
+        t : float
+            step size along the directions
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            Nx2 array of the first positions with an all-zero window
+        :obj:`numpy.ndarray` of bool
+            whether each ray found an all-zero window before leaving the image
+        """
+        return self._march(starts, directions, t, False, False)
+
+    def closest_nonzero_or_border_pixels(self, starts, directions, t=0.5):
+        """Marches each ray until a nonzero pixel lies in its window or the
+        window leaves the image.
+
+        Parameters
+        ----------
+        starts : :obj:`numpy.ndarray` of float
+            Nx2 array of (row, column) start positions
+        directions : :obj:`numpy.ndarray` of float
+            Nx2 array of direction vectors
+        t : float
+            step size along the directions
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            Nx2 array of the positions at which each ray stopped
+        :obj:`numpy.ndarray` of bool
+            whether each ray stopped at a nonzero pixel rather than the border
+        """
+        return self._march(starts, directions, t, True, True)
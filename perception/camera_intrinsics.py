@@ -19,6 +19,77 @@ try:
 except Exception:
     logging.warning('autolab_perception is not installed as a catkin package - ROS msg conversions will not be available for image wrappers')
 
+def rasterize_depth(pixels, depths, height, width, splat_size=1, out=None):
+    """Renders projected points into a depth buffer, keeping the nearest
+    point at each pixel.
+
+    Parameters
+    ----------
+    pixels : :obj:`numpy.ndarray` of float
+        A 2xN array of the column and row of each projected point.
+    depths : :obj:`numpy.ndarray` of float
+        The depth of each projected point. Points with zero or negative
+        depth are ignored.
+    height : int
+        The height of the depth buffer in pixels.
+    width : int
+        The width of the depth buffer in pixels.
+    splat_size : int
+        The side length in pixels of the square footprint each point is
+        drawn into. Values greater than one fill holes in sparse clouds.
+    out : :obj:`numpy.ndarray` of float32
+        Optional contiguous height x width buffer to render into. Nonzero
+        depths already in the buffer take part in the depth test, so
+        several clouds can be rendered into one buffer.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray` of float32
+        The depth buffer, with zeros where no point was projected.
+
+    Raises
+    ------
+    ValueError
+        If the output buffer has the wrong shape or is not contiguous.
+    """
+    if out is None:
+        out = np.zeros([height, width], dtype=np.float32)
+    elif out.shape[:2] != (height, width) or out.size != height * width or \
+         not out.flags.c_contiguous:
+        raise ValueError('Output buffer must be a contiguous %d x %d array' %(height, width))
+    depth_buffer = out.reshape(height * width)
+
+    # remove points behind the camera or outside of the image
+    cols = pixels[0,:]
+    rows = pixels[1,:]
+    valid_ind = np.where((depths > 0) & \
+                         (cols > -1) & (cols < width) & \
+                         (rows > -1) & (rows < height))[0]
+    cols = cols[valid_ind].astype(np.intp)
+    rows = rows[valid_ind].astype(np.intp)
+    depths = depths[valid_ind]
+
+    # draw each point into a square footprint
+    if splat_size > 1:
+        offsets = np.arange(splat_size) - splat_size // 2
+        offset_rows, offset_cols = np.meshgrid(offsets, offsets, indexing='ij')
+        rows = (rows[:,np.newaxis] + offset_rows.ravel()).ravel()
+        cols = (cols[:,np.newaxis] + offset_cols.ravel()).ravel()
+        depths = np.repeat(depths, splat_size**2)
+        valid_ind = np.where((cols >= 0) & (cols < width) & \
+                             (rows >= 0) & (rows < height))[0]
+        cols = cols[valid_ind]
+        rows = rows[valid_ind]
+        depths = depths[valid_ind]
+
+    # keep the minimum depth at each pixel
+    zbuffer = depth_buffer.astype(np.float32)
+    zbuffer[zbuffer == 0] = np.inf
+    np.minimum.at(zbuffer, rows * width + cols, depths.astype(np.float32))
+    zbuffer[zbuffer == np.inf] = 0.0
+    depth_buffer[:] = zbuffer
+    return out
+
 class CameraIntrinsics(object):
     """A set of intrinsic parameters for a camera. This class is used to project
     and deproject points.
@@ -64,6 +135,9 @@ class CameraIntrinsics(object):
                             [       0,   self._fy, self._cy],
                             [       0,          0,        1]])
 
+        # cache of unit-depth pixel rays, keyed by image shape
+        self._ray_cache = {}
+
     @property
     def frame(self):
         """:obj:`str` : The frame of reference for the point cloud.
@@ -94,6 +168,7 @@ class CameraIntrinsics(object):
         self._K = np.array([[self._fx, self._skew, self._cx],
                             [       0,   self._fy, self._cy],
                             [       0,          0,        1]])
+        self._ray_cache = {}
 
     @property
     def cy(self):
@@ -107,6 +182,7 @@ class CameraIntrinsics(object):
         self._K = np.array([[self._fx, self._skew, self._cx],
                             [       0,   self._fy, self._cy],
                             [       0,          0,        1]])
+        self._ray_cache = {}
 
     @property
     def skew(self):
@@ -286,10 +362,11 @@ class CameraIntrinsics(object):
             return Point(data=points_proj[:2,:].astype(np.int16), frame=self._frame)
         return ImageCoords(data=points_proj[:2,:].astype(np.int16), frame=self._frame)
 
-    def project_to_image(self, point_cloud, round_px=True):
+    def project_to_image(self, point_cloud, round_px=True, splat_size=1, out=None):
         """Projects a point cloud onto the camera image plane and creates
         a depth image. Zero depth means no point projected into the camera
-        at that pixel location (i.e. infinite depth).
+        at that pixel location (i.e. infinite depth). When several points
+        project to the same pixel the closest one is kept.
 
         Parameters
         ----------
@@ -299,6 +376,14 @@ class CameraIntrinsics(object):
         round_px : bool
             If True, projections are rounded to the nearest pixel.
 
+        splat_size : int
+            The side length in pixels of the square footprint each point is
+            drawn into. Values greater than one fill holes in sparse clouds.
+
+        out : :obj:`numpy.ndarray` of float32
+            Optional contiguous height x width buffer to render into. Nonzero
+            depths already in the buffer take part in the depth test.
+
         Returns
         -------
         :obj:`DepthImage`
@@ -320,39 +405,73 @@ class CameraIntrinsics(object):
         if len(points_proj.shape) == 1:
             points_proj = points_proj[:, np.newaxis]
         point_depths = points_proj[2,:]
-        point_z = np.tile(point_depths, [3, 1])
-        points_proj = np.divide(points_proj, point_z)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            points_proj = points_proj[:2,:] / point_depths
         if round_px:
             points_proj = np.round(points_proj)
-        points_proj = points_proj[:2,:].astype(np.int16)
 
-        valid_ind = np.where((points_proj[0,:] >= 0) & \
-                             (points_proj[1,:] >= 0) & \
-                             (points_proj[0,:] < self.width) & \
-                             (points_proj[1,:] < self.height))[0]
-
-        depth_data = np.zeros([self.height, self.width])
-        depth_data[points_proj[1,valid_ind], points_proj[0,valid_ind]] = point_depths[valid_ind]
+        depth_data = rasterize_depth(points_proj, point_depths,
+                                     self.height, self.width,
+                                     splat_size=splat_size, out=out)
         return DepthImage(depth_data, frame=self.frame)
 
-    def deproject(self, depth_image):
-        """Deprojects a DepthImage into a PointCloud.
+    def unit_rays(self, height=None, width=None):
+        """Returns the rays through the center of each pixel of an image,
+        scaled to unit depth. Rays are computed once per image shape and
+        cached, so repeated deprojections only cost a single multiply.
+
+        Parameters
+        ----------
+        height : int
+            The height of the image in pixels. Defaults to the camera height.
+        width : int
+            The width of the image in pixels. Defaults to the camera width.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float32
+            A read-only height x width x 3 array with the x, y, z coordinates
+            of the point at depth 1 for each pixel.
+        """
+        if height is None:
+            height = self._height
+        if width is None:
+            width = self._width
+        key = (int(height), int(width))
+        if key not in self._ray_cache:
+            # create homogeneous pixels
+            row_indices = np.arange(key[0])
+            col_indices = np.arange(key[1])
+            pixel_grid = np.meshgrid(col_indices, row_indices)
+            pixels_homog = np.stack([pixel_grid[0], pixel_grid[1],
+                                     np.ones(key)], axis=2)
+
+            # rays through each pixel at unit depth
+            rays = pixels_homog.dot(np.linalg.inv(self._K).T).astype(np.float32)
+            rays.flags.writeable = False
+            self._ray_cache[key] = rays
+        return self._ray_cache[key]
+
+    def _deproject_data(self, depth_image, out=None):
+        """Scales the cached unit rays by the depth at each pixel.
 
         Parameters
         ----------
         depth_image : :obj:`DepthImage`
-            The 2D depth image to projet into a point cloud.
+            The 2D depth image to deproject.
+        out : :obj:`numpy.ndarray` of float32
+            Optional height x width x 3 buffer to write the points to.
 
         Returns
         -------
-        :obj:`autolab_core.PointCloud`
-            A 3D point cloud created from the depth image.
+        :obj:`numpy.ndarray` of float32
+            A height x width x 3 array of the 3D point at each pixel.
 
         Raises
         ------
         ValueError
             If depth_image is not a valid DepthImage in the same reference frame
-            as the camera.
+            as the camera or the output buffer has the wrong shape.
         """
         # check valid input
         if not isinstance(depth_image, DepthImage):
@@ -360,25 +479,50 @@ class CameraIntrinsics(object):
         if depth_image.frame != self._frame:
             raise ValueError('Cannot deproject points in frame %s from camera with frame %s' %(depth_image.frame, self._frame))
 
-        # create homogeneous pixels
-        row_indices = np.arange(depth_image.height)
-        col_indices = np.arange(depth_image.width)
-        pixel_grid = np.meshgrid(col_indices, row_indices)
-        pixels = np.c_[pixel_grid[0].flatten(), pixel_grid[1].flatten()].T
-        pixels_homog = np.r_[pixels, np.ones([1, pixels.shape[1]])]
-        depth_arr = np.tile(depth_image.data.flatten(), [3,1])
+        rays = self.unit_rays(depth_image.height, depth_image.width)
+        if out is None:
+            out = np.empty(rays.shape, dtype=np.float32)
+        elif out.shape != rays.shape:
+            raise ValueError('Output buffer must have shape %s' %(str(rays.shape)))
 
         # deproject
-        points_3d = depth_arr * np.linalg.inv(self._K).dot(pixels_homog)
-        return PointCloud(data=points_3d, frame=self._frame)
+        np.multiply(rays, depth_image.raw_data, out=out)
+        return out
+
+    def deproject(self, depth_image, out=None):
+        """Deprojects a DepthImage into a PointCloud.
+
+        Parameters
+        ----------
+        depth_image : :obj:`DepthImage`
+            The 2D depth image to projet into a point cloud.
+        out : :obj:`numpy.ndarray` of float32
+            Optional height x width x 3 buffer to write the points to, which
+            the returned point cloud will reference.
+
+        Returns
+        -------
+        :obj:`autolab_core.PointCloud`
+            A 3D point cloud created from the depth image.
+
+        Raises
+        ------
+        ValueError
+            If depth_image is not a valid DepthImage in the same reference frame
+            as the camera.
+        """
+        points_3d = self._deproject_data(depth_image, out=out)
+        return PointCloud(data=points_3d.reshape(-1, 3).T, frame=self._frame)
 
-    def deproject_to_image(self, depth_image):
+    def deproject_to_image(self, depth_image, out=None):
         """Deprojects a DepthImage into a PointCloudImage.
 
         Parameters
         ----------
         depth_image : :obj:`DepthImage`
             The 2D depth image to projet into a point cloud.
+        out : :obj:`numpy.ndarray` of float32
+            Optional height x width x 3 buffer to write the points to.
 
         Returns
         -------
@@ -391,8 +535,7 @@ class CameraIntrinsics(object):
             If depth_image is not a valid DepthImage in the same reference frame
             as the camera.
         """
-        point_cloud = self.deproject(depth_image)
-        point_cloud_im_data = point_cloud.data.T.reshape(depth_image.height, depth_image.width, 3)
+        point_cloud_im_data = self._deproject_data(depth_image, out=out)
         return PointCloudImage(data=point_cloud_im_data,
                                frame=self._frame)
 
@@ -443,7 +586,7 @@ class CameraIntrinsics(object):
         if file_ext.lower() != INTR_EXTENSION:
             raise ValueError('Extension %s not supported for CameraIntrinsics. Must be stored with extension %s' %(file_ext, INTR_EXTENSION))
 
-        camera_intr_dict = copy.deepcopy(self.__dict__)
+        camera_intr_dict = copy.deepcopy(dict([(k, v) for k, v in self.__dict__.items() if k != '_ray_cache']))
         camera_intr_dict['_K'] = 0 # can't save matrix
         f = open(filename, 'w')
         json.dump(camera_intr_dict, f)
@@ -6,9 +6,12 @@ from abc import ABCMeta, abstractmethod
 
 from .camera_intrinsics import CameraIntrinsics
 from .constants import *
-from .image import ColorImage, DepthImage, IrImage
+from .image import ColorImage, DepthImage, IrImage, ImageBatch
 
+import numpy as np
 import os
+import re
+import time
 
 class CameraSensor(object):
     """Abstract base class for camera sensors.
@@ -40,15 +43,132 @@ class CameraSensor(object):
         """
         pass
 
+    def frames_batch(self, num_frames, color=True, depth=True):
+        """Collect a series of consecutive frames directly into stacked arrays.
+
+        Parameters
+        ----------
+        num_frames : int
+            The number of consecutive frames to collect.
+        color : bool
+            Whether or not to collect the color images.
+        depth : bool
+            Whether or not to collect the depth images.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            The color images, or None if not collected or not available.
+        :obj:`ImageBatch`
+            The depth images, or None if not collected or not available.
+        :obj:`numpy.ndarray`
+            The time at which each frame was received, in seconds since the epoch.
+        """
+        return self._collect_frames_batch(lambda: (self.frames(), time.time()),
+                                          num_frames, color, depth)
+
+    def _collect_frames_batch(self, next_frames, num_frames, color, depth):
+        """Stacks the frames returned by successive calls to next_frames, a
+        function returning the frames tuple and its timestamp."""
+        color_data = None
+        depth_data = None
+        color_frame = None
+        color_encoding = None
+        depth_frame = None
+        timestamps = np.zeros(num_frames)
+        for i in range(num_frames):
+            frames, timestamps[i] = next_frames()
+            color_im, depth_im = frames[0], frames[1]
+
+            # allocate the stacks once the image sizes are known
+            if color and color_im is not None:
+                if color_data is None:
+                    color_data = np.zeros((num_frames,) + color_im.shape,
+                                          dtype=color_im.raw_data.dtype)
+                    color_frame = color_im.frame
+                    color_encoding = color_im.encoding
+                color_data[i, ...] = color_im.raw_data
+            if depth and depth_im is not None:
+                if depth_data is None:
+                    depth_data = np.zeros((num_frames,) + depth_im.shape,
+                                          dtype=depth_im.raw_data.dtype)
+                    depth_frame = depth_im.frame
+                depth_data[i, ...] = depth_im.raw_data
+
+        color_batch = None
+        depth_batch = None
+        if color_data is not None:
+            color_batch = ImageBatch(color_data, ColorImage, color_frame, copy=False,
+                                     encoding=color_encoding)
+        if depth_data is not None:
+            depth_batch = ImageBatch(depth_data, DepthImage, depth_frame, copy=False)
+        return color_batch, depth_batch, timestamps
+
+    def median_depth_img(self, num_img=1, fill_depth=0.0):
+        """Collect a series of depth images and return the median of the set.
+
+        Parameters
+        ----------
+        num_img : int
+            The number of consecutive frames to process.
+        fill_depth : float
+            The depth to assign to pixels with a median depth of zero.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            The median DepthImage collected from the frames.
+        """
+        _, depth_batch, _ = self.frames_batch(num_img, color=False)
+        median_depth = depth_batch.median()
+        median_depth.data[median_depth.data == 0.0] = fill_depth
+        return median_depth
+
+    def min_depth_img(self, num_img=1):
+        """Collect a series of depth images and return the min of the set,
+        ignoring zero depths.
+
+        Parameters
+        ----------
+        num_img : int
+            The number of consecutive frames to process.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            The min DepthImage collected from the frames.
+        """
+        _, depth_batch, _ = self.frames_batch(num_img, color=False)
+        return depth_batch.min()
+
+    def mean_depth_img(self, num_img=1):
+        """Collect a series of depth images and return the mean of the set,
+        ignoring zero depths.
+
+        Parameters
+        ----------
+        num_img : int
+            The number of consecutive frames to process.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            The mean DepthImage collected from the frames.
+        """
+        _, depth_batch, _ = self.frames_batch(num_img, color=False)
+        return depth_batch.mean(ignore_zeros=True)
+
 
 class VirtualSensor(CameraSensor):
     SUPPORTED_FILE_EXTS = ['.png', '.npy']
+    DEPTH_FILE_PATTERN = re.compile(r'^depth_(\d+)\.npy$')
 
     """ Class for a virtual sensor that uses pre-captured images
     stored to disk instead of actually connecting to a sensor.
     For debugging purposes.
     """
-    def __init__(self, path_to_images, frame=None, loop=True):
+    def __init__(self, path_to_images, frame=None, loop=True, num_prefetch=0,
+                 num_workers=4, mmap_depth=False):
         """Create a new virtualized Primesense sensor.
 
         This requires a directory containing a specific set of files.
@@ -77,19 +197,28 @@ class VirtualSensor(CameraSensor):
         frame : :obj:`str`
             The name of the frame of reference in which the sensor resides.
             If None, this will be discovered from the files in the directory.
-        loop : :obj:`str`
+        loop : bool
             Whether or not to loop back to the first image after running out
+        num_prefetch : int
+            The number of upcoming frames to decode ahead of time on a thread
+            pool while the stream is running. Zero disables prefetching.
+        num_workers : int
+            The number of threads used for prefetching.
+        mmap_depth : bool
+            If True, depth images are memory-mapped from the .npy files
+            instead of being read into memory. The returned depth images are
+            then read-only.
         """
-        self._running = False
+        self._init_stream(loop, num_prefetch, num_workers)
         self._path_to_images = path_to_images
-        self._im_index = 0
         self._num_images = 0
         self._frame = frame
+        self._mmap_depth = mmap_depth
         filenames = os.listdir(self._path_to_images)
 
         # get number of images
         for filename in filenames:
-            if filename.find('depth') != -1 and filename.endswith('.npy'):
+            if VirtualSensor.DEPTH_FILE_PATTERN.match(filename) is not None:
                 self._num_images += 1
 
         # set the frame dynamically
@@ -120,6 +249,18 @@ class VirtualSensor(CameraSensor):
         else:
             self._ir_intr = CameraIntrinsics.load(generic_intr_filename)            
 
+    def _init_stream(self, loop, num_prefetch=0, num_workers=4):
+        """Sets up the stream position and prefetching state shared by all
+        virtual sensors.
+        """
+        self._running = False
+        self._im_index = 0
+        self._loop = loop
+        self._num_prefetch = num_prefetch
+        self._num_workers = num_workers
+        self._executor = None
+        self._prefetched = {}
+
     @property
     def path_to_images(self):
         """:obj:`str` : The path to a directory containing images that the virtualized
@@ -163,6 +304,11 @@ class VirtualSensor(CameraSensor):
         """
         return self._ir_intr
 
+    @property
+    def num_images(self):
+        """int : The number of frames available to the sensor.
+        """
+        return self._num_images
 
     def start(self):
         """Starts the sensor stream.
@@ -172,6 +318,12 @@ class VirtualSensor(CameraSensor):
         """
         self._im_index = 0
         self._running = True
+        self._prefetched = {}
+        if self._num_prefetch > 0 and self._executor is None:
+            # imported here since Python 2 only has the executor through the futures backport
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=self._num_workers)
+        self._prefetch(0)
 
     def stop(self):
         """Stops the sensor stream.
@@ -185,8 +337,80 @@ class VirtualSensor(CameraSensor):
         if not self._running:
             return False
         self._running = False
+        for future in self._prefetched.values():
+            future.cancel()
+        self._prefetched = {}
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
         return True
 
+    def _load_frame(self, index):
+        """Reads the color, depth and IR images of a frame from disk."""
+        color_filename = os.path.join(self._path_to_images, 'color_%d%s' %(index, self._color_ext))
+        color_im = ColorImage.open(color_filename, frame=self._frame)
+        depth_filename = os.path.join(self._path_to_images, 'depth_%d.npy' %(index))
+        if self._mmap_depth:
+            depth_im = DepthImage(np.load(depth_filename, mmap_mode='r'), frame=self._frame, copy=False)
+        else:
+            depth_im = DepthImage.open(depth_filename, frame=self._frame)
+        return color_im, depth_im, None
+
+    def _prefetch(self, index):
+        """Schedules decoding of the frames that frames() will return next,
+        starting at the given index, and cancels any other pending frames."""
+        if self._executor is None or self._num_images == 0:
+            return
+        upcoming = []
+        for i in range(index, index + self._num_prefetch):
+            if i >= self._num_images:
+                if not self._loop:
+                    break
+                i = i % self._num_images
+            upcoming.append(i)
+        for i in list(self._prefetched.keys()):
+            if i not in upcoming:
+                self._prefetched.pop(i).cancel()
+        for i in upcoming:
+            if i not in self._prefetched.keys():
+                self._prefetched[i] = self._executor.submit(self._load_frame, i)
+
+    def _get_frame(self, index):
+        """Returns a prefetched frame, or reads it if it was not prefetched."""
+        future = self._prefetched.pop(index, None)
+        if future is not None:
+            return future.result()
+        return self._load_frame(index)
+
+    def frame_at(self, index):
+        """Retrieve the frame with the given index, independently of the
+        position of the stream.
+
+        Parameters
+        ----------
+        index : int
+            The index of the frame.
+
+        Returns
+        -------
+        :obj:`tuple` of :obj:`ColorImage`, :obj:`DepthImage`, :obj:`IrImage`
+            The ColorImage, DepthImage, and IrImage of the frame.
+
+        Raises
+        ------
+        ValueError
+            If the index is out of range.
+        """
+        if index < 0 or index >= self._num_images:
+            raise ValueError('Frame index %d out of range for %d images' %(index, self._num_images))
+
+        # leave prefetched frames in place for the stream, handing out copies
+        # so that frames() returns images the caller has not modified
+        future = self._prefetched.get(index, None)
+        if future is not None:
+            return tuple([im.copy() if im is not None else None for im in future.result()])
+        return self._load_frame(index)
+
     def frames(self):
         """Retrieve the next frame from the image directory and convert it to a ColorImage,
         a DepthImage, and an IrImage.
@@ -211,37 +435,16 @@ class VirtualSensor(CameraSensor):
             raise RuntimeError('Device pointing to %s not runnning. Cannot read frames' %(self._path_to_images))
 
         if self._im_index >= self._num_images:
-            raise RuntimeError('Device is out of images')
+            if not self._loop or self._num_images == 0:
+                raise RuntimeError('Device is out of images')
+            self._im_index = 0
 
         # read images
-        color_filename = os.path.join(self._path_to_images, 'color_%d%s' %(self._im_index, self._color_ext))
-        color_im = ColorImage.open(color_filename, frame=self._frame)
-        depth_filename = os.path.join(self._path_to_images, 'depth_%d.npy' %(self._im_index))
-        depth_im = DepthImage.open(depth_filename, frame=self._frame)
-        self._im_index = (self._im_index + 1) % self._num_images
-        return color_im, depth_im, None
-
-    def median_depth_img(self, num_img=1):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
+        frames = self._get_frame(self._im_index)
+        self._im_index += 1
+        self._prefetch(self._im_index)
+        return frames
 
-        return Image.median_images(depths)
-    
 
 class TensorDatasetVirtualSensor(VirtualSensor):
     CAMERA_INTR_FIELD = 'camera_intrs'
@@ -254,11 +457,11 @@ class TensorDatasetVirtualSensor(VirtualSensor):
     """
     def __init__(self, dataset_path, frame=None, loop=True):
         self._dataset_path = dataset_path
+        self._path_to_images = dataset_path
         self._frame = frame
         self._color_frame = frame
         self._ir_frame = frame
-        self._im_index = 0
-        self._running = False
+        self._init_stream(loop, num_workers=1)
         
         from dexnet.learning import TensorDataset
         self._dataset = TensorDataset.open(self._dataset_path)
@@ -272,34 +475,9 @@ class TensorDatasetVirtualSensor(VirtualSensor):
         self._color_intr = CameraIntrinsics.from_vec(camera_intr_vec, frame=self._color_frame).resize(self._image_rescale_factor)
         self._ir_intr = CameraIntrinsics.from_vec(camera_intr_vec, frame=self._ir_frame).resize(self._image_rescale_factor)
 
-    def frames(self):
-        """Retrieve the next frame from the tensor dataset and convert it to a ColorImage,
-        a DepthImage, and an IrImage.
-
-        Parameters
-        ----------
-        skip_registration : bool
-            If True, the registration step is skipped.
-
-        Returns
-        -------
-        :obj:`tuple` of :obj:`ColorImage`, :obj:`DepthImage`, :obj:`IrImage`, :obj:`numpy.ndarray`
-            The ColorImage, DepthImage, and IrImage of the current frame.
-
-        Raises
-        ------
-        RuntimeError
-            If the stream is not running or if all images in the
-            directory have been used.
-        """
-        if not self._running:
-            raise RuntimeError('Device pointing to %s not runnning. Cannot read frames' %(self._path_to_images))
-
-        if self._im_index >= self._num_images:
-            raise RuntimeError('Device is out of images')
-
-        # read images
-        datapoint = self._dataset.datapoint(self._im_index,
+    def _load_frame(self, index):
+        """Reads the color and depth images of a frame from the tensor dataset."""
+        datapoint = self._dataset.datapoint(index,
                                             TensorDatasetVirtualSensor.IMAGE_FIELDS)
         color_im = ColorImage(datapoint[TensorDatasetVirtualSensor.COLOR_IM_FIELD],
                               frame=self._frame)
@@ -308,5 +486,4 @@ class TensorDatasetVirtualSensor(VirtualSensor):
         if self._image_rescale_factor != 1.0:
             color_im = color_im.resize(self._image_rescale_factor)
             depth_im = depth_im.resize(self._image_rescale_factor, interp='nearest')
-        self._im_index = (self._im_index + 1) % self._num_images
         return color_im, depth_im, None
@@ -89,20 +89,12 @@ class CameraChessboardRegistration:
         k = 0
         while k < num_transform_avg:
             # average a bunch of depth images together
-            depth_ims = None
-            for i in range(num_images):
-                start = time.time()
-                small_color_im, new_depth_im, _ = sensor.frames()
-                end = time.time()
-                logging.info('Frames Runtime: %.3f' %(end-start))
-                if depth_ims is None:
-                    depth_ims = np.zeros([new_depth_im.height,
-                                          new_depth_im.width,
-                                          num_images])
-                depth_ims[:,:,i] = new_depth_im.data
-
-            med_depth_im = np.median(depth_ims, axis=2)
-            depth_im = DepthImage(med_depth_im, sensor.ir_frame)
+            start = time.time()
+            color_ims, depth_ims, _ = sensor.frames_batch(num_images)
+            end = time.time()
+            logging.info('Frames Runtime: %.3f' %(end-start))
+            small_color_im = color_ims[num_images - 1]
+            depth_im = DepthImage(depth_ims.median().raw_data, sensor.ir_frame, copy=False)
 
             # find the corner pixels in an upsampled version of the color image
             big_color_im = small_color_im.resize(color_image_rescale_factor)
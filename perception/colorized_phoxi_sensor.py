@@ -119,29 +119,6 @@ class ColorizedPhoXiSensor(CameraSensor):
         phoxi_color_im = self._colorize(phoxi_depth_im, webcam_color_im)
         return phoxi_color_im, phoxi_depth_im, None
 
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        DepthImage
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
-
     def _colorize(self, depth_im, color_im):
         """Colorize a depth image from the PhoXi using a color image from the webcam.
 
@@ -0,0 +1,173 @@
+"""
+Single-pass connected-component statistics for binary masks.
+"""
+import cv2
+import numpy as np
+import scipy.ndimage as snd
+
+class ConnectedComponents(object):
+    """Labels the connected components of a binary mask in one pass and
+    exposes per-component statistics as arrays.
+
+    Components are numbered 1 to num_components in the label image, with 0
+    for the background. Entry k of each statistic array describes the
+    component with label k + 1.
+    """
+    def __init__(self, mask, connectivity=8):
+        """
+        Parameters
+        ----------
+        mask : :obj:`numpy.ndarray`
+            2D mask in which nonzero pixels are foreground
+        connectivity : int
+            4 or 8 pixel connectivity
+
+        Raises
+        ------
+        ValueError
+            If the mask is not 2D or the connectivity is invalid.
+        """
+        mask = np.asarray(mask)
+        if len(mask.shape) != 2:
+            raise ValueError('Mask must be 2D')
+        if connectivity not in [4, 8]:
+            raise ValueError('Connectivity must be 4 or 8')
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            (mask > 0).astype(np.uint8), connectivity=connectivity, ltype=cv2.CV_32S)
+        self._labels = labels
+        self._num_components = num_labels - 1
+
+        # drop the background and convert to (row, column) ordering
+        stats = stats[1:]
+        self._areas = stats[:, cv2.CC_STAT_AREA]
+        min_px = np.c_[stats[:, cv2.CC_STAT_TOP], stats[:, cv2.CC_STAT_LEFT]]
+        max_px = min_px + np.c_[stats[:, cv2.CC_STAT_HEIGHT], stats[:, cv2.CC_STAT_WIDTH]] - 1
+        self._bboxes = np.c_[min_px, max_px]
+        self._centroids = centroids[1:, ::-1]
+
+    @property
+    def labels(self):
+        """:obj:`numpy.ndarray` of int : The label image, with 0 for the background.
+        """
+        return self._labels
+
+    @property
+    def num_components(self):
+        """int : The number of connected components.
+        """
+        return self._num_components
+
+    @property
+    def areas(self):
+        """:obj:`numpy.ndarray` of int : The number of pixels in each component.
+        """
+        return self._areas
+
+    @property
+    def bboxes(self):
+        """:obj:`numpy.ndarray` of int : Nx4 array of the inclusive bounding
+        box of each component as (min row, min column, max row, max column).
+        """
+        return self._bboxes
+
+    @property
+    def centroids(self):
+        """:obj:`numpy.ndarray` of float : Nx2 array of the (row, column)
+        centroid of each component.
+        """
+        return self._centroids
+
+    def min_distances(self, point):
+        """Returns the distance from a point to the closest pixel of each
+        component.
+
+        Parameters
+        ----------
+        point : :obj:`numpy.ndarray` of float
+            the (row, column) reference point
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            the minimum distance to each component
+        """
+        if self._num_components == 0:
+            return np.zeros(0)
+        height, width = self._labels.shape
+        rows, cols = np.ogrid[:height, :width]
+        dists = np.sqrt((rows - point[0])**2 + (cols - point[1])**2)
+        return self.component_minimum(dists)
+
+    def distances_to_component(self, index):
+        """Returns the distance from each component to the closest pixel of
+        a given component.
+
+        Parameters
+        ----------
+        index : int
+            the index of the reference component, from 0 to num_components - 1
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            the minimum distance from each component to the reference
+            component, which is zero for the reference itself
+        """
+        dists = snd.distance_transform_edt(self._labels != index + 1)
+        return self.component_minimum(dists)
+
+    def component_minimum(self, values):
+        """Returns the minimum of a per-pixel array over each component.
+
+        Parameters
+        ----------
+        values : :obj:`numpy.ndarray`
+            array with the same height and width as the label image
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            the minimum value over each component
+        """
+        if self._num_components == 0:
+            return np.zeros(0, dtype=values.dtype)
+        index = np.arange(1, self._num_components + 1)
+        return np.array(snd.minimum(values, self._labels, index))
+
+    def mask(self, indices):
+        """Returns a mask of the given components.
+
+        Parameters
+        ----------
+        indices : :obj:`numpy.ndarray` of int or bool
+            the indices of the components, from 0 to num_components - 1, or a
+            boolean array with one entry per component
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of bool
+            mask that is True on the pixels of the components
+        """
+        lut = np.zeros(self._num_components + 1, dtype=bool)
+        lut[1:][indices] = True
+        return lut[self._labels]
+
+    def boundary_pixels(self, index):
+        """Returns the outer boundary of a component, searching only its
+        bounding box.
+
+        Parameters
+        ----------
+        index : int
+            the index of the component, from 0 to num_components - 1
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            Nx2 array of (row, column) boundary pixels, in order along the boundary
+        """
+        min_i, min_j, max_i, max_j = self._bboxes[index]
+        component = (self._labels[min_i:max_i + 1, min_j:max_j + 1] == index + 1).astype(np.uint8)
+        contours = cv2.findContours(component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+        boundary_px = max(contours, key=len).reshape(-1, 2)
+        return boundary_px[:, ::-1] + np.array([min_i, min_j])
@@ -8,6 +8,8 @@ COLOR_IMAGE_EXTS = ['.png', '.jpg']
 MIN_DEPTH = 0.25
 MAX_DEPTH = 1.25
 MAX_IR = 65535
+PNG_COMPRESSION_LEVEL = 1
+MAX_SET_RAY_TRACERS = 8
 
 TF_EXTENSION = '.tf'
 INTR_EXTENSION = '.intr'
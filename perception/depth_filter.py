@@ -0,0 +1,158 @@
+"""
+Streaming temporal filtering of noisy depth images.
+"""
+import numpy as np
+
+from .image import DepthImage
+
+class TemporalDepthFilter(object):
+    """Denoises a stream of depth images one frame at a time with bounded
+    memory. Maintains a windowed median over the most recent frames, plus a
+    running min, an exponential mean and a count of valid (nonzero)
+    observations for each pixel since the last reset.
+
+    Attributes
+    ----------
+    window_size : int
+        number of most recent frames used for the median
+    alpha : float
+        weight of the newest frame in the exponential mean
+    """
+    def __init__(self, window_size=5, alpha=0.2):
+        if window_size < 1:
+            raise ValueError('Window size must be positive')
+        if alpha <= 0.0 or alpha > 1.0:
+            raise ValueError('Alpha must be in (0, 1]')
+        self.window_size = window_size
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        """Discards all frames and statistics."""
+        self._frame = None
+        self._window = None
+        self._min = None
+        self._mean = None
+        self._valid_counts = None
+        self._num_frames = 0
+
+    @property
+    def num_frames(self):
+        """int : The number of frames added since the last reset.
+        """
+        return self._num_frames
+
+    @property
+    def shape(self):
+        """:obj:`tuple` of int : The height and width of the filtered images,
+        or None if no frames have been added.
+        """
+        if self._min is None:
+            return None
+        return self._min.shape
+
+    @property
+    def valid_counts(self):
+        """:obj:`numpy.ndarray` of int : The number of frames in which each
+        pixel had a nonzero depth since the last reset.
+        """
+        return self._valid_counts
+
+    @property
+    def valid_fraction(self):
+        """:obj:`numpy.ndarray` of float : The fraction of frames in which
+        each pixel had a nonzero depth since the last reset.
+        """
+        if self._num_frames == 0:
+            return None
+        return self._valid_counts.astype(np.float32) / self._num_frames
+
+    def add(self, depth_im):
+        """Updates the filter with a new depth image.
+
+        Parameters
+        ----------
+        depth_im : :obj:`DepthImage`
+            the new depth image
+
+        Raises
+        ------
+        ValueError
+            If the image size differs from the previous images.
+        """
+        data = depth_im.raw_data[:, :, 0]
+        if self._min is None:
+            height, width = data.shape
+            self._frame = depth_im.frame
+            self._window = np.zeros([self.window_size, height, width], dtype=np.float32)
+            self._min = np.zeros([height, width], dtype=np.float32)
+            self._mean = np.zeros([height, width], dtype=np.float32)
+            self._valid_counts = np.zeros([height, width], dtype=np.uint32)
+        elif data.shape != self._min.shape:
+            raise ValueError('Depth image shape %s does not match filter shape %s' %(str(data.shape), str(self._min.shape)))
+
+        # overwrite the oldest frame in the window
+        self._window[self._num_frames % self.window_size] = data
+
+        # the running min and mean only consider valid depths, and the first
+        # valid observation of a pixel initializes both
+        valid_px = data > 0
+        first_px = valid_px & (self._valid_counts == 0)
+        np.copyto(self._min, data, where=first_px | (valid_px & (data < self._min)))
+        np.copyto(self._mean, data, where=first_px)
+        update_px = valid_px & ~first_px
+        self._mean[update_px] += self.alpha * (data[update_px] - self._mean[update_px])
+        self._valid_counts += valid_px
+        self._num_frames += 1
+
+    def median(self, ignore_zeros=False):
+        """Returns the median of the frames in the window.
+
+        Parameters
+        ----------
+        ignore_zeros : bool
+            If True, only nonzero depths are considered, and pixels with no
+            valid depth in the window are zero.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            the median depth image
+        """
+        self._check_frames()
+        window = self._window[:min(self._num_frames, self.window_size)]
+        if not ignore_zeros:
+            median_data = np.median(window, axis=0)
+        else:
+            valid_window = np.where(window > 0, window, np.float32(np.nan))
+            all_zero_px = np.all(window == 0, axis=0)
+            valid_window[:, all_zero_px] = 0
+            median_data = np.nanmedian(valid_window, axis=0)
+        return DepthImage(median_data, self._frame, copy=False)
+
+    def min(self):
+        """Returns the running min of the nonzero depths.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            the min depth image, zero where no valid depth was observed
+        """
+        self._check_frames()
+        return DepthImage(self._min, self._frame)
+
+    def mean(self):
+        """Returns the exponential mean of the nonzero depths.
+
+        Returns
+        -------
+        :obj:`DepthImage`
+            the mean depth image, zero where no valid depth was observed
+        """
+        self._check_frames()
+        return DepthImage(self._mean, self._frame)
+
+    def _check_frames(self):
+        """Raises a ValueError if no frames have been added."""
+        if self._num_frames == 0:
+            raise ValueError('No frames have been added to the filter')
@@ -41,14 +41,19 @@ class RgbdDetection(object):
         alias for camera_intr, for backwards comp
     point_normal_cloud : :obj:`PointNormalCloud`
         point cloud with normals for the detected object
+    color_seg_centers : :obj:`numpy.ndarray`
+        kmeans cluster centers of the color segmentation of the object, if fast
+        color segmentation was used
     """
-    def __init__(self, color_thumbnail, depth_thumbnail, bounding_box, binary_thumbnail=None, camera_intr=None, contour=None):
+    def __init__(self, color_thumbnail, depth_thumbnail, bounding_box, binary_thumbnail=None, camera_intr=None, contour=None,
+                 color_seg_centers=None):
         self.color_thumbnail = color_thumbnail         # cropped color image from bounding box
         self.depth_thumbnail = depth_thumbnail         # cropped depth image from bounding box
         self.bounding_box = bounding_box # bounding box in original source image
         self.binary_thumbnail = binary_thumbnail       # optional binary image masking the object
         self.camera_intr = camera_intr   # optional intrinsics of camera taking the thumbnail
         self.contour = contour           # optional contour describing the object boundary
+        self.color_seg_centers = color_seg_centers # optional kmeans centers to warm-start the next frame
 
     @property
     def height(self):
@@ -222,8 +227,9 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
     Converts all detections within a specified area into query images for a cnn.
     Optionally resegements the images using KMeans to remove spurious background pixels.
     """
-    def _segment_color(self, color_im, bounding_box, bgmodel, cfg, vis_segmentation=False):
-        """ Re-segments a color image to isolate an object of interest using foreground masking and kmeans """
+    def _segment_color(self, color_im, bounding_box, bgmodel, cfg, vis_segmentation=False, init_centers=None):
+        """ Re-segments a color image to isolate an object of interest using foreground masking and kmeans.
+        Returns the binary mask, segmentation, refined bounding box and, for fast segmentation, the kmeans centers. """
         # read params
         foreground_mask_tolerance = cfg['foreground_mask_tolerance']
         color_seg_rgb_weight = cfg['color_seg_rgb_weight']
@@ -239,14 +245,25 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
         binary_im = color_im.foreground_mask(foreground_mask_tolerance, bgmodel=bgmodel)
         binary_im = binary_im.prune_contours(area_thresh=min_contour_area, dist_thresh=contour_dist_thresh)
         if binary_im is None:
-            return None, None, None
+            return None, None, None, None
 
         color_im = color_im.mask_binary(binary_im)
 
         # kmeans segmentation
-        segment_im = color_im.segment_kmeans(color_seg_rgb_weight,
-                                             color_seg_num_clusters,
-                                             hue_weight=color_seg_hsv_weight)
+        centers = None
+        if 'color_seg_fast' in cfg.keys() and cfg['color_seg_fast']:
+            if init_centers is not None and init_centers.shape[0] != color_seg_num_clusters:
+                init_centers = None
+            segment_im, centers = color_im.segment_kmeans(color_seg_rgb_weight,
+                                                          color_seg_num_clusters,
+                                                          hue_weight=color_seg_hsv_weight,
+                                                          fast=True,
+                                                          init_centers=init_centers,
+                                                          return_centers=True)
+        else:
+            segment_im = color_im.segment_kmeans(color_seg_rgb_weight,
+                                                 color_seg_num_clusters,
+                                                 hue_weight=color_seg_hsv_weight)
         
         # keep the segment that is farthest from the background
         bg_dists = []
@@ -255,24 +272,28 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
                                                          float(bgmodel[2]) / 255))
         hsv_bgmodel = np.r_[color_seg_rgb_weight * np.array(bgmodel), color_seg_hsv_weight * hsv_bgmodel[:1]]
 
-        for k in range(segment_im.num_segments-1):
-            seg_mask = segment_im.segment_mask(k)
-            color_im_segment = color_im.mask_binary(seg_mask)
-            color_im_segment_data = color_im_segment.nonzero_data()
-            color_im_segment_data = np.c_[color_seg_rgb_weight * color_im_segment_data, color_seg_hsv_weight * color_im_segment.nonzero_hsv_data()[:,:1]]
-
-            # take the median distance from the background
-            bg_dist = np.median(np.linalg.norm(color_im_segment_data - hsv_bgmodel, axis=1))
+        # weighted color features of every pixel, computed once for all segments
+        color_data = color_im.data
+        hue_data = cv2.cvtColor(color_data, cv2.COLOR_BGR2HSV)[:,:,:1]
+        features = np.concatenate([color_seg_rgb_weight * color_data.astype(np.float64),
+                                   color_seg_hsv_weight * hue_data.astype(np.float64)], axis=2)
+        feature_dists = np.linalg.norm(features - hsv_bgmodel, axis=2)
+
+        # take the median distance from the background over the nonzero pixels of each segment
+        valid = np.any(color_data != 0, axis=2)
+        seg_bg_dists = segment_im.segment_medians(feature_dists, mask=valid)
+        for k in range(1, segment_im.num_segments):
+            bg_dist = seg_bg_dists[k]
             if vis_segmentation:
                 logging.info('BG Dist for segment %d: %.4f' %(k, bg_dist))
             bg_dists.append(bg_dist)
 
         # sort by distance
-        dists_and_indices = zip(np.arange(len(bg_dists)), bg_dists)
+        dists_and_indices = list(zip(np.arange(1, len(bg_dists)+1), bg_dists))
         dists_and_indices.sort(key = lambda x: x[1], reverse=True)
         
         # mask out the segment in the binary image
-        if color_seg_num_clusters > 1 and abs(dists_and_indices[0][1] - dists_and_indices[1][1]) > color_seg_dist_thresh and dists_and_indices[1][1] < color_seg_min_bg_dist:
+        if len(dists_and_indices) > 1 and abs(dists_and_indices[0][1] - dists_and_indices[1][1]) > color_seg_dist_thresh and dists_and_indices[1][1] < color_seg_min_bg_dist:
             obj_segment = dists_and_indices[0][0]
             obj_seg_mask = segment_im.segment_mask(obj_segment)
             binary_im = binary_im.mask_binary(obj_seg_mask)
@@ -295,11 +316,12 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
             plt.axis('off')
             plt.show()
 
-        return binary_im, segment_im, bounding_box
+        return binary_im, segment_im, bounding_box, centers
 
     def detect(self, color_im, depth_im, cfg, camera_intr=None,
                T_camera_world=None,
-               vis_foreground=False, vis_segmentation=False, segmask=None):
+               vis_foreground=False, vis_segmentation=False, segmask=None,
+               prev_detections=None):
         """
         Detects all relevant objects in an rgbd image pair using foreground masking.
 
@@ -317,6 +339,10 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
             registration of the camera to world frame
         segmask : :obj:`BinaryImage`
             optional segmask of invalid pixels
+        prev_detections : :obj:`list` of :obj:`RgbdDetection`
+            detections from the previous frame; with fast color segmentation,
+            each object is warm-started from the kmeans centers of the nearest
+            previous detection within half a crop of it
 
         Returns
         ------
@@ -385,9 +411,21 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
                 max_pt = orig_box.center + half_crop_dims
                 query_box = Box(min_pt, max_pt, frame=orig_box.frame)
 
+                # warm-start from the same object in the previous frame
+                init_centers = None
+                if prev_detections is not None:
+                    prev_dists = [np.linalg.norm(d.bounding_box.center - query_box.center) for d in prev_detections
+                                  if d.color_seg_centers is not None]
+                    prev_centers = [d.color_seg_centers for d in prev_detections
+                                    if d.color_seg_centers is not None]
+                    if len(prev_dists) > 0 and np.min(prev_dists) < np.min(half_crop_dims):
+                        init_centers = prev_centers[np.argmin(prev_dists)]
+
                 # segment color to get refined detection
                 color_thumbnail = color_im.crop(query_box.height, query_box.width, query_box.ci, query_box.cj)
-                binary_thumbnail, segment_thumbnail, query_box = self._segment_color(color_thumbnail, query_box, bgmodel, cfg, vis_segmentation=vis_segmentation)
+                binary_thumbnail, segment_thumbnail, query_box, color_seg_centers = self._segment_color(color_thumbnail, query_box, bgmodel, cfg,
+                                                                                                         vis_segmentation=vis_segmentation,
+                                                                                                         init_centers=init_centers)
                 if binary_thumbnail is None:
                     continue
             else:
@@ -397,6 +435,7 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
                                 frame = contour.bounding_box.frame)
 
                 binary_thumbnail = binary_im_filtered.crop(query_box.height, query_box.width, query_box.ci, query_box.cj)
+                color_seg_centers = None
 
             # crop to get thumbnails
             color_thumbnail = color_im.crop(query_box.height, query_box.width, query_box.ci, query_box.cj)
@@ -422,7 +461,8 @@ class RgbdForegroundMaskQueryImageDetector(RgbdDetector):
                                             query_box,
                                             binary_thumbnail=binary_thumbnail,
                                             contour=contour,
-                                            camera_intr=thumbnail_intr))
+                                            camera_intr=thumbnail_intr,
+                                            color_seg_centers=color_seg_centers))
 
         return detections
 
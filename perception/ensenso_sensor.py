@@ -6,7 +6,6 @@ import IPython
 import logging
 import numpy as np
 import os
-import struct
 import sys
 import time
 
@@ -20,6 +19,8 @@ except ImportError:
     
 from .constants import MM_TO_METERS, INTR_EXTENSION
 from . import CameraIntrinsics, CameraSensor, ColorImage, DepthImage, Image
+from .frame_synchronizer import FrameSynchronizer
+from .point_cloud2 import pointcloud2_to_array
 
 class EnsensoSensor(CameraSensor):
     """ Class for interfacing with an Ensenso N* sensor.
@@ -28,9 +29,8 @@ class EnsensoSensor(CameraSensor):
         # set member vars
         self._frame = frame
         self._initialized = False
-        self._format = None
         self._camera_intr = None
-        self._cur_depth_im = None
+        self._frame_sync = FrameSynchronizer(['depth'])
         self._running = False
         
     def __del__(self):
@@ -39,11 +39,6 @@ class EnsensoSensor(CameraSensor):
         if self.is_running:
             self.stop()
         
-    def _set_format(self, msg):
-        """ Set the buffer formatting. """
-        num_points = msg.height * msg.width
-        self._format = '<' + num_points * 'ffff'
-            
     def _set_camera_properties(self, msg):
         """ Set the camera intrinsics from an info msg. """
         focal_x = msg.K[0]
@@ -59,33 +54,21 @@ class EnsensoSensor(CameraSensor):
 
     def _depth_im_from_pointcloud(self, msg):
         """ Convert a pointcloud2 message to a depth image. """
-        # set format
-        if self._format is None:
-            self._set_format(msg)
-
         # rescale camera intr in case binning is turned on
         if msg.height != self._camera_intr.height:
             rescale_factor = float(msg.height) / self._camera_intr.height
             self._camera_intr = self._camera_intr.resize(rescale_factor)
             
-        # read num points
-        num_points = msg.height * msg.width
-            
-        # read buffer
-        raw_tup = struct.Struct(self._format).unpack_from(msg.data, 0)
-        raw_arr = np.array(raw_tup)
-
-        # subsample depth values and reshape
-        depth_ind = 2 + 4 * np.arange(num_points)
-        depth_buf = raw_arr[depth_ind]
-        depth_arr = depth_buf.reshape(msg.height, msg.width)
+        # view the z field of the points as an image
+        depth_arr = pointcloud2_to_array(msg)['z']
         depth_im = DepthImage(depth_arr, frame=self._frame)
 
         return depth_im
 
     def _pointcloud_callback(self, msg):
         """ Callback for handling point clouds. """
-        self._cur_depth_im = self._depth_im_from_pointcloud(msg)
+        depth_im = self._depth_im_from_pointcloud(msg)
+        self._frame_sync.add('depth', msg.header.stamp.to_sec(), depth_im)
         
     def _camera_info_callback(self, msg):
         """ Callback for reading camera info. """
@@ -149,37 +132,11 @@ class EnsensoSensor(CameraSensor):
             If the Ensenso stream is not running.
         """
         # wait for a new image
-        while self._cur_depth_im is None:
-            time.sleep(0.01)
-            
+        (depth_im,), _ = self._frame_sync.wait()
+
         # read next image
-        depth_im = self._cur_depth_im
         color_im = ColorImage(np.zeros([depth_im.height,
                                         depth_im.width,
                                         3]).astype(np.uint8), frame=self._frame)
-        self._cur_depth_im = None
         return color_im, depth_im, None
 
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
-        
@@ -10,7 +10,7 @@ import time
 
 from .constants import *
 from .cnn import AlexNet
-from .image import Image, ColorImage, DepthImage
+from .image import Image, ColorImage, DepthImage, ImageBatch
 
 class FeatureExtractor:
     __metaclass__ = ABCMeta
@@ -54,29 +54,23 @@ class CNNBatchFeatureExtractor(FeatureExtractor):
         num_images = len(images)
         if num_images == 0:
             return None
-        for image in images:
-            if not isinstance(image, Image):
-                new_images = []
-                for image in images:
-                    if len(image.shape) > 2:
-                        new_images.append(ColorImage(image, frame='unspecified'))
-                    elif image.dtype == np.float32 or image.dtype == np.float64:
-                        new_images.append(DepthImage(image, frame='unspecified'))
-                    else:
-                        raise ValueError('Image type not understood')
-                images = new_images
-                break
+        if not isinstance(images, ImageBatch):
+            for image in images:
+                if not isinstance(image, Image):
+                    new_images = []
+                    for image in images:
+                        if len(image.shape) > 2:
+                            new_images.append(ColorImage(image, frame='unspecified', copy=False))
+                        elif image.dtype == np.float32 or image.dtype == np.float64:
+                            new_images.append(DepthImage(image, frame='unspecified', copy=False))
+                        else:
+                            raise ValueError('Image type not understood')
+                    images = new_images
+                    break
+            images = ImageBatch.from_images(images)
 
-        im_height = images[0].height
-        im_width = images[0].width
-        channels = images[0].channels
         tensor_channels = 3
-        image_arr = np.zeros([num_images, im_height, im_width, tensor_channels])
-        for j, image in enumerate(images):
-            if channels == 3:
-                image_arr[j,:,:,:] = image.raw_data
-            else:
-                image_arr[j,:,:,:] = np.tile(image.raw_data, [1,1,1,3])
+        image_arr = images.to_tensor(num_channels=tensor_channels)
 
         # predict
         fp_start = time.time()
@@ -181,10 +181,14 @@ class PointToPlaneFeatureMatcher(FeatureMatcher):
         threshold distance to consider a match valid
     norm_thresh : float
         threshold cosine distance alignment betwen normals to consider a match valid
+    use_kdtree : bool
+        whether or not to only compare points within dist_thresh of each other using a KD-tree,
+        which avoids forming dense NxM matrices for large point sets
     """
-    def __init__(self, dist_thresh=0.05, norm_thresh=0.75):
+    def __init__(self, dist_thresh=0.05, norm_thresh=0.75, use_kdtree=False):
         self.dist_thresh_ = dist_thresh
         self.norm_thresh_ = norm_thresh
+        self.use_kdtree_ = use_kdtree
         FeatureMatcher.__init__(self)
 
     def match(self, source_points, target_points, source_normals, target_normals):
@@ -207,6 +211,9 @@ class PointToPlaneFeatureMatcher(FeatureMatcher):
         :obj`Correspondences`
             the correspondences between source and target
         """
+        if self.use_kdtree_:
+            return self._match_kdtree(source_points, target_points, source_normals, target_normals)
+
         # compute the distances and inner products between the point sets
         dists = ssd.cdist(source_points, target_points, 'euclidean')
         ip = source_normals.dot(target_normals.T) # abs because we don't have correct orientations
@@ -229,3 +236,55 @@ class PointToPlaneFeatureMatcher(FeatureMatcher):
         match_indices[invalid_matches[0]] = -1
 
         return NormalCorrespondences(match_indices, source_points, target_points, source_normals, target_normals)
+
+    def _match_kdtree(self, source_points, target_points, source_normals, target_normals):
+        """
+        Matches points between two point-normal sets by only evaluating the pairs within dist_thresh of each other.
+        Produces the same matches as the dense criterion.
+
+        Parameters
+        ----------
+        source_point_cloud : Nx3 :obj:`numpy.ndarray`
+            source object points
+        target_point_cloud : Nx3 :obj:`numpy.ndarray`
+            target object points
+        source_normal_cloud : Nx3 :obj:`numpy.ndarray`
+            source object outward-pointing normals
+        target_normal_cloud : Nx3 :obj`numpy.ndarray`
+            target object outward-pointing normals
+
+        Returns
+        -------
+        :obj`Correspondences`
+            the correspondences between source and target
+        """
+        # find all candidate pairs within the distance threshold
+        source_tree = spatial.cKDTree(source_points)
+        target_tree = spatial.cKDTree(target_points)
+        pairs = source_tree.sparse_distance_matrix(target_tree, self.dist_thresh_,
+                                                   output_type='ndarray')
+        source_inds = pairs['i']
+        target_inds = pairs['j']
+
+        # remove candidates with misaligned normals
+        ip = np.sum(source_normals[source_inds,:] * target_normals[target_inds,:], axis=1)
+        valid_pairs = np.where(ip >= self.norm_thresh_)[0]
+        source_inds = source_inds[valid_pairs]
+        target_inds = target_inds[valid_pairs]
+
+        # difference in inner products with the target normal
+        corr_target_normals = target_normals[target_inds,:]
+        source_ip = np.sum(source_points[source_inds,:] * corr_target_normals, axis=1)
+        target_ip = np.sum(target_points[target_inds,:] * corr_target_normals, axis=1)
+        abs_diff = np.abs(source_ip - target_ip)
+
+        # choose the closest match for each source point, breaking ties by target index
+        order = np.lexsort((target_inds, abs_diff, source_inds))
+        source_inds = source_inds[order]
+        target_inds = target_inds[order]
+        first_inds = np.ones(source_inds.shape[0], dtype=bool)
+        first_inds[1:] = source_inds[1:] != source_inds[:-1]
+        match_indices = -1 * np.ones(source_points.shape[0], dtype=np.int64)
+        match_indices[source_inds[first_inds]] = target_inds[first_inds]
+
+        return NormalCorrespondences(match_indices, source_points, target_points, source_normals, target_normals)
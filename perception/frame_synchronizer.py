@@ -0,0 +1,139 @@
+"""
+Pairs frames from separate sensor streams by approximate timestamp.
+"""
+import collections
+import threading
+import time
+
+from .exceptions import SensorUnresponsiveException
+
+class FrameSynchronizer(object):
+    """Matches frames from several streams (e.g. color and depth topics) whose
+    timestamps lie within a tolerance of each other, and wakes up waiting
+    readers as soon as a matched set is complete.
+
+    Frames are added from subscriber callbacks with add() and read with
+    wait(), which blocks on a condition variable instead of polling.
+    """
+    def __init__(self, streams, slop=0.05, queue_size=10, match_queue_size=1):
+        """
+        Parameters
+        ----------
+        streams : :obj:`list` of :obj:`str`
+            names of the streams to synchronize
+        slop : float
+            maximum difference in seconds between the timestamps of matched frames
+        queue_size : int
+            number of unmatched frames to keep per stream
+        match_queue_size : int
+            number of unread matches to keep, oldest first; with the default
+            of one, only the latest match is kept
+        """
+        self._streams = list(streams)
+        self._slop = slop
+        self._queues = dict([(s, collections.deque(maxlen=queue_size)) for s in self._streams])
+        self._matches = collections.deque(maxlen=match_queue_size)
+        self._cond = threading.Condition()
+
+    @property
+    def streams(self):
+        """:obj:`list` of :obj:`str` : The names of the synchronized streams.
+        """
+        return self._streams
+
+    @property
+    def num_matches(self):
+        """int : The number of unread matches.
+        """
+        return len(self._matches)
+
+    def clear(self):
+        """Discards all pending frames and any unread matches."""
+        with self._cond:
+            for queue in self._queues.values():
+                queue.clear()
+            self._matches.clear()
+
+    def add(self, stream, stamp, frame):
+        """Adds a frame to a stream, completing a match if every other stream
+        has a frame within the slop of its timestamp.
+
+        Parameters
+        ----------
+        stream : :obj:`str`
+            name of the stream
+        stamp : float
+            timestamp of the frame in seconds
+        frame : :obj:`object`
+            the frame data
+
+        Raises
+        ------
+        ValueError
+            If the stream is unknown.
+        """
+        if stream not in self._queues.keys():
+            raise ValueError('Stream %s not synchronized' %(stream))
+
+        with self._cond:
+            self._queues[stream].append((stamp, frame))
+
+            # find the closest frame of every other stream
+            matched = {}
+            for s in self._streams:
+                if s == stream:
+                    matched[s] = (stamp, frame)
+                    continue
+                best = None
+                for entry in self._queues[s]:
+                    if best is None or abs(entry[0] - stamp) < abs(best[0] - stamp):
+                        best = entry
+                if best is None or abs(best[0] - stamp) > self._slop:
+                    return
+                matched[s] = best
+
+            # drop the matched frames and anything older
+            for s in self._streams:
+                match_stamp = matched[s][0]
+                queue = self._queues[s]
+                while len(queue) > 0 and queue[0][0] <= match_stamp:
+                    queue.popleft()
+
+            self._matches.append([matched[s] for s in self._streams])
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """Returns the oldest unread match, waiting for one if necessary.
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait in seconds, or None to wait indefinitely
+
+        Returns
+        -------
+        :obj:`list`
+            the matched frames, in the order of the streams
+        :obj:`list` of float
+            the timestamps of the matched frames
+
+        Raises
+        ------
+        SensorUnresponsiveException
+            If no match is completed within the timeout.
+        """
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+        with self._cond:
+            while len(self._matches) == 0:
+                remaining = None
+                if end_time is not None:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        raise SensorUnresponsiveException('No synchronized frames received within %.3f sec' %(timeout))
+                self._cond.wait(remaining)
+            match = self._matches.popleft()
+        stamps = [m[0] for m in match]
+        frames = [m[1] for m in match]
+        return frames, stamps
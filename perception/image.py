@@ -14,21 +14,18 @@ import PIL.Image as PImage
 
 import scipy.misc as sm
 import scipy.signal as ssg
-import scipy.ndimage.filters as sf
 import scipy.ndimage.interpolation as sni
 import scipy.ndimage.morphology as snm
-import scipy.spatial.distance as ssd
 import scipy.signal as ssg
 
 import sklearn.cluster as sc
 import sklearn.mixture as smx
-import scipy.ndimage.filters as sf
-import scipy.spatial.distance as ssd
-import skimage.morphology as morph
 import scipy.ndimage.morphology as snm
 
 from autolab_core import PointCloud, NormalCloud, PointNormalCloud, Box, Contour
 from .constants import *
+from .binary_ray_tracer import BinaryRayTracer
+from .connected_components import ConnectedComponents
 
 try:
     from cv_bridge import CvBridge, CvBridgeError
@@ -39,6 +36,14 @@ except Exception:
 
 BINARY_IM_MAX_VAL = np.iinfo(np.uint8).max
 BINARY_IM_DEFAULT_THRESH = BINARY_IM_MAX_VAL / 2
+CV_MAX_CHANNELS = 128
+CV_INTERP_METHODS = {
+    'nearest': cv2.INTER_NEAREST,
+    'bilinear': cv2.INTER_LINEAR,
+    'bicubic': cv2.INTER_CUBIC,
+    'cubic': cv2.INTER_CUBIC,
+    'lanczos': cv2.INTER_LANCZOS4
+}
 
 
 class Image(object):
@@ -46,7 +51,7 @@ class Image(object):
     """
     __metaclass__ = ABCMeta
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create an image from an array of data.
 
         Parameters
@@ -64,6 +69,10 @@ class Image(object):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
@@ -76,16 +85,19 @@ class Image(object):
             raise ValueError('Must provide string name of frame of data')
 
         self._check_valid_data(data)
-        self._data = self._preprocess_data(data)
+        self._data = self._preprocess_data(data, copy=copy)
         self._frame = frame
 
-    def _preprocess_data(self, data):
+    def _preprocess_data(self, data, copy=True):
         """Converts a data array to the preferred 3D structure.
 
         Parameters
         ----------
         data : :obj:`numpy.ndarray`
             The data to process.
+        copy : bool
+            Whether or not to copy the data. Otherwise the returned array is
+            a view of data.
 
         Returns
         -------
@@ -97,7 +109,6 @@ class Image(object):
         ValueError
             If the data is not 1, 2, or 3D to begin with.
         """
-        original_type = data.dtype
         if len(data.shape) == 1:
             data = data[:, np.newaxis, np.newaxis]
         elif len(data.shape) == 2:
@@ -105,7 +116,9 @@ class Image(object):
         elif len(data.shape) == 0 or len(data.shape) > 3:
             raise ValueError(
                 'Illegal data array passed to image. Must be 1, 2, or 3 dimensional numpy array')
-        return data.astype(original_type)
+        if copy:
+            return data.copy()
+        return data
 
     @property
     def shape(self):
@@ -325,7 +338,7 @@ class Image(object):
         return type(self)(
             im_data_tf.astype(
                 self.data.dtype),
-            frame=self._frame)
+            frame=self._frame, copy=False)
 
     def align(self, scale, center, angle, height, width):
         """ Create a thumbnail from the original image that
@@ -445,7 +458,7 @@ class Image(object):
         new_data = np.zeros(self.shape)
         for ind in inds:
             new_data[ind[0], ind[1]] = self.data[ind[0], ind[1]]
-        return type(self)(new_data.astype(self.data.dtype), self.frame)
+        return type(self)(new_data.astype(self.data.dtype), self.frame, copy=False)
 
     def mask_by_linear_ind(self, linear_inds):
         """Create a new image by zeroing out data at locations not in the
@@ -502,14 +515,7 @@ class Image(object):
             A new Image of the same type whose data is the median of all of
             the images' data.
         """
-        images_data = np.array([image.data for image in images])
-        median_image_data = np.median(images_data, axis=0)
-
-        an_image = images[0]
-        return type(an_image)(
-            median_image_data.astype(
-                an_image.data.dtype),
-            an_image.frame)
+        return ImageBatch.from_images(images).median()
 
     @staticmethod
     def min_images(images):
@@ -526,16 +532,7 @@ class Image(object):
             A new Image of the same type whose data is the min of all of
             the images' data.
         """
-        images_data = np.array([image.data for image in images])
-        images_data[images_data == 0] = np.inf
-        min_image_data = np.min(images_data, axis=0)
-        min_image_data[min_image_data == np.inf] = 0.0
-
-        an_image = images[0]
-        return type(an_image)(
-            min_image_data.astype(
-                an_image.data.dtype),
-            an_image.frame)
+        return ImageBatch.from_images(images).min()
 
     def __getitem__(self, indices):
         """Index the image's data array.
@@ -618,7 +615,7 @@ class Image(object):
             method on the current image's data.
         """
         data = method(self.data, *args, **kwargs)
-        return type(self)(data.astype(self.type), self.frame)
+        return type(self)(data.astype(self.type), self.frame, copy=False)
 
     def copy(self):
         """ Returns a copy of this image.
@@ -628,9 +625,9 @@ class Image(object):
         :obj:`Image`
             copy of this image
         """
-        return type(self)(self.data.copy(), self.frame)
+        return type(self)(self.data.copy(), self.frame, copy=False)
 
-    def crop(self, height, width, center_i=None, center_j=None):
+    def crop(self, height, width, center_i=None, center_j=None, copy=True):
         """Crop the image centered around center_i, center_j.
 
         Parameters
@@ -649,6 +646,10 @@ class Image(object):
             The center width point at which to crop. If not specified, the center
             of the image is used.
 
+        copy : bool
+            If False and the crop window lies inside the image, the cropped
+            image is a read-only view of this image's data.
+
         Returns
         -------
         :obj:`Image`
@@ -662,12 +663,27 @@ class Image(object):
         if center_j is None:
             center_j = float(self.width) / 2
 
-        # crop using PIL
+        # compute crop window
         desired_start_row = int(np.floor(center_i - float(height) / 2))
         desired_end_row = int(np.floor(center_i + float(height) / 2))
         desired_start_col = int(np.floor(center_j - float(width) / 2))
         desired_end_col = int(np.floor(center_j + float(width) / 2))
 
+        # slice windows inside the image directly
+        if desired_start_row >= 0 and desired_end_row <= self.height and \
+           desired_start_col >= 0 and desired_end_col <= self.width:
+            crop_data = self._data[desired_start_row:desired_end_row,
+                                   desired_start_col:desired_end_col, :]
+            if crop_data.shape[0] != height or crop_data.shape[1] != width:
+                raise ValueError('Crop dims are incorrect')
+            if copy:
+                crop_data = crop_data.copy()
+            else:
+                crop_data = crop_data.view()
+                crop_data.flags.writeable = False
+            return type(self)(crop_data, self._frame, copy=False)
+
+        # crop using PIL, which zero-pads windows past the border
         pil_im = PImage.fromarray(self.data)
         cropped_pil_im = pil_im.crop((desired_start_col,
                                       desired_start_row,
@@ -678,7 +694,7 @@ class Image(object):
         if crop_data.shape[0] != height or crop_data.shape[1] != width:
             raise ValueError('Crop dims are incorrect')
 
-        return type(self)(crop_data.astype(self.data.dtype), self._frame)
+        return type(self)(crop_data.astype(self.data.dtype), self._frame, copy=False)
 
     def focus(self, height, width, center_i=None, center_j=None):
         """Zero out all of the image outside of a crop box.
@@ -718,7 +734,7 @@ class Image(object):
         focus_data = np.zeros(self._data.shape)
         focus_data[start_row:end_row + 1, start_col:end_col + \
             1] = self._data[start_row:end_row + 1, start_col:end_col + 1]
-        return type(self)(focus_data.astype(self._data.dtype), self._frame)
+        return type(self)(focus_data.astype(self._data.dtype), self._frame, copy=False)
 
     def center_nonzero(self):
         """Recenters the image on the mean of the coordinates of nonzero pixels.
@@ -754,7 +770,7 @@ class Image(object):
 
         return type(self)(
             shifted_data.astype(
-                self.data.dtype), frame=self._frame), diff_px
+                self.data.dtype), frame=self._frame, copy=False), diff_px
 
     def nonzero_pixels(self):
         """ Return an array of the nonzero pixels.
@@ -825,9 +841,9 @@ class Image(object):
         """
         new_data = self.data.copy()
         new_data[new_data <= zero_thresh] = val
-        return type(self)(new_data.astype(self.data.dtype), frame=self._frame)
+        return type(self)(new_data.astype(self.data.dtype), frame=self._frame, copy=False)
 
-    def save(self, filename):
+    def save(self, filename, compression_level=PNG_COMPRESSION_LEVEL):
         """Writes the image to a file.
 
         Parameters
@@ -835,6 +851,8 @@ class Image(object):
         filename : :obj:`str`
             The file to save the image to. Must be one of .png, .jpg,
             .npy, or .npz.
+        compression_level : int
+            The zlib compression level from 0 to 9 for 16-bit .png files.
 
         Raises
         ------
@@ -848,11 +866,7 @@ class Image(object):
                 pil_image = PImage.fromarray(im_data.squeeze())
                 pil_image.save(filename)
             else:
-                try:
-                    import png
-                except:
-                    raise ValueError('PyPNG not installed! Cannot save 16-bit images')
-                png.fromarray(im_data, 'L').save(filename)
+                Image._write_png16(filename, im_data, compression_level)
         elif file_ext == '.npy':
             np.save(filename, self._data)
         elif file_ext == '.npz':
@@ -895,6 +909,31 @@ class Image(object):
             dpi=dpi,
             format=format)
 
+    @staticmethod
+    def _write_png16(filename, data, compression_level=PNG_COMPRESSION_LEVEL):
+        """Writes single-channel 16-bit data to a lossless .png file.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a .png or cannot be written.
+        """
+        file_root, file_ext = os.path.splitext(filename)
+        if file_ext.lower() != '.png':
+            raise ValueError('16-bit images can only be saved as .png, not %s' %(file_ext))
+        if not cv2.imwrite(filename, data.squeeze().astype(np.uint16),
+                           [cv2.IMWRITE_PNG_COMPRESSION, compression_level]):
+            raise ValueError('Failed to write %s' %(filename))
+
+    @staticmethod
+    def _read_png16(filename):
+        """Reads a 16-bit .png file, returning None for files with other bit
+        depths."""
+        data = cv2.imread(filename, cv2.IMREAD_UNCHANGED)
+        if data is None or data.dtype != np.uint16:
+            return None
+        return data
+
     @staticmethod
     def load_data(filename):
         """Loads a data matrix from a given file.
@@ -927,7 +966,7 @@ class ColorImage(Image):
     """An RGB color image.
     """
 
-    def __init__(self, data, frame='unspecified', encoding='rgb8'):
+    def __init__(self, data, frame='unspecified', encoding='rgb8', copy=True):
         """Create a color image from an array of data.
 
         Parameters
@@ -946,13 +985,17 @@ class ColorImage(Image):
         encoding : :obj:`str`
             Either rgb8 or bgr8, depending on the channel storage mode
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
         self._encoding = encoding
         if self._encoding != 'rgb8' and self._encoding != 'bgr8':
             raise ValueError(
@@ -1000,6 +1043,12 @@ class ColorImage(Image):
         """
         return self._data
 
+    @property
+    def encoding(self):
+        """:obj:`str` : The channel storage mode, either rgb8 or bgr8.
+        """
+        return self._encoding
+
     @property
     def r_data(self):
         """:obj:`numpy.ndarray` of uint8 : The red-channel data.
@@ -1021,12 +1070,12 @@ class ColorImage(Image):
     def bgr2rgb(self):
         """ Converts data using the cv conversion. """
         new_data = cv2.cvtColor(self.raw_data, cv2.COLOR_BGR2RGB)
-        return ColorImage(new_data, frame=self.frame, encoding='rgb8')
+        return ColorImage(new_data, frame=self.frame, encoding='rgb8', copy=False)
 
     def rgb2bgr(self):
         """ Converts data using the cv conversion. """
         new_data = cv2.cvtColor(self.raw_data, cv2.COLOR_RGB2BGR)
-        return ColorImage(new_data, frame=self.frame, encoding='bgr8')
+        return ColorImage(new_data, frame=self.frame, encoding='bgr8', copy=False)
 
     def swap_channels(self, channel_swap):
         """ Swaps the two channels specified in the tuple.
@@ -1050,7 +1099,7 @@ class ColorImage(Image):
         new_data = self.data.copy()
         new_data[:, :, ci] = self.data[:, :, cj]
         new_data[:, :, cj] = self.data[:, :, ci]
-        return ColorImage(new_data, frame=self._frame)
+        return ColorImage(new_data, frame=self._frame, copy=False)
 
     def resize(self, size, interp='bilinear'):
         """Resize the image.
@@ -1072,7 +1121,7 @@ class ColorImage(Image):
             The resized image.
         """
         resized_data = sm.imresize(self.data, size, interp=interp)
-        return ColorImage(resized_data, self._frame)
+        return ColorImage(resized_data, self._frame, copy=False)
 
     def find_chessboard(self, sx=6, sy=9):
         """Finds the corners of an sx X sy chessboard in the image.
@@ -1139,7 +1188,7 @@ class ColorImage(Image):
         data = np.copy(self._data)
         ind = np.where(binary_im.data == 0)
         data[ind[0], ind[1], :] = 0.0
-        return ColorImage(data, self._frame)
+        return ColorImage(data, self._frame, copy=False)
 
     def foreground_mask(
             self,
@@ -1300,7 +1349,9 @@ class ColorImage(Image):
         nonzero_px = self.nonzero_pixels()
         return hsv_data[nonzero_px[:, 0], nonzero_px[:, 1], ...]
 
-    def segment_kmeans(self, rgb_weight, num_clusters, hue_weight=0.0):
+    def segment_kmeans(self, rgb_weight, num_clusters, hue_weight=0.0,
+                       fast=False, max_pixels=2000, max_iter=20,
+                       init_centers=None, return_centers=False):
         """
         Segment a color image using KMeans based on spatial and color distances.
         Black pixels will automatically be assigned to their own 'background' cluster.
@@ -1313,15 +1364,30 @@ class ColorImage(Image):
             number of clusters to use
         hue_weight : float
             weighting of hue from hsv relative to spatial and RGB distance
+        fast : bool
+            whether to fit the clusters with mini-batch KMeans on a random
+            subset of the pixels instead of a full KMeans fit on every pixel
+        max_pixels : int
+            maximum number of pixels to fit the clusters to in fast mode
+        max_iter : int
+            maximum number of passes over the subset in fast mode
+        init_centers : :obj:`numpy.ndarray` of float
+            num_clusters x D cluster centers to start from in fast mode, e.g.
+            the centers returned for the previous frame
+        return_centers : bool
+            whether to also return the cluster centers
 
         Returns
         -------
         :obj:`SegmentationImage`
             image containing the segment labels
+        :obj:`numpy.ndarray` of float
+            num_clusters x D array of the cluster centers in feature space,
+            only returned if return_centers is True
         """
         # form features array
         label_offset = 1
-        nonzero_px = np.where(self.data != 0.0)
+        nonzero_px = np.where(np.any(self.data != 0, axis=2))
         nonzero_px = np.c_[nonzero_px[0], nonzero_px[1]]
 
         # get hsv data if specified
@@ -1331,16 +1397,40 @@ class ColorImage(Image):
             hsv_data = cv2.cvtColor(self.data, cv2.COLOR_BGR2HSV)
             color_vals = np.c_[color_vals, hue_weight *
                                hsv_data[nonzero_px[:, 0], nonzero_px[:, 1], :1]]
-        features = np.c_[nonzero_px, color_vals.astype(np.float32)]
+        features = np.c_[nonzero_px, color_vals.astype(np.float32)].astype(np.float32)
 
-        # perform KMeans clustering
-        kmeans = sc.KMeans(n_clusters=num_clusters)
-        labels = kmeans.fit_predict(features)
+        if not fast:
+            # perform KMeans clustering
+            kmeans = sc.KMeans(n_clusters=num_clusters)
+            labels = kmeans.fit_predict(features)
+            centers = kmeans.cluster_centers_
+        else:
+            # fit on a subset of the pixels, warm-starting when centers are given
+            sample_features = features
+            if features.shape[0] > max_pixels:
+                sample_inds = np.random.choice(features.shape[0], size=max_pixels, replace=False)
+                sample_features = features[sample_inds]
+            init = 'k-means++'
+            if init_centers is not None:
+                init = np.asarray(init_centers, dtype=np.float32)
+                if init.shape != (num_clusters, features.shape[1]):
+                    raise ValueError('Initial centers must have shape %s' %(str((num_clusters, features.shape[1]))))
+            kmeans = sc.MiniBatchKMeans(n_clusters=num_clusters, init=init, n_init=1,
+                                        max_iter=max_iter, batch_size=min(1024, sample_features.shape[0]))
+            kmeans.fit(sample_features)
+            centers = kmeans.cluster_centers_
+
+            # assign every pixel to its nearest center in one pass
+            sq_dists = -2 * features.dot(centers.T) + np.sum(centers**2, axis=1)
+            labels = np.argmin(sq_dists, axis=1)
 
         # create output label array
         label_im = np.zeros([self.height, self.width]).astype(np.uint8)
         label_im[nonzero_px[:, 0], nonzero_px[:, 1]] = labels + label_offset
-        return SegmentationImage(label_im, frame=self.frame)
+        segment_im = SegmentationImage(label_im, frame=self.frame)
+        if return_centers:
+            return segment_im, centers
+        return segment_im
 
     def inpaint(self, win_size=3, rescale_factor=1.0):
         """ Fills in the zero pixels in the image.
@@ -1372,9 +1462,9 @@ class ColorImage(Image):
         # fill in zero pixels with inpainted and resized image
         filled_data = inpainted_im.resize(
             orig_shape, interp='bilinear').data
-        new_data = self.data
+        new_data = np.copy(self.data)
         new_data[self.data == 0] = filled_data[self.data == 0]
-        return ColorImage(new_data, frame=self.frame)
+        return ColorImage(new_data, frame=self.frame, copy=False)
 
     def to_binary(self, threshold=0.0):
         """Converts the color image to binary.
@@ -1396,7 +1486,7 @@ class ColorImage(Image):
             Grayscale image corresponding to original color image.
         """
         gray_data = cv2.cvtColor(self.data, cv2.COLOR_RGB2GRAY)
-        return GrayscaleImage(gray_data, frame=self.frame)
+        return GrayscaleImage(gray_data, frame=self.frame, copy=False)
 
     @staticmethod
     def open(filename, frame='unspecified'):
@@ -1418,7 +1508,7 @@ class ColorImage(Image):
             The new color image.
         """
         data = Image.load_data(filename).astype(np.uint8)
-        return ColorImage(data, frame)
+        return ColorImage(data, frame, copy=False)
 
 
 class DepthImage(Image):
@@ -1426,7 +1516,7 @@ class DepthImage(Image):
     depth channel.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a depth image from an array of data.
 
         Parameters
@@ -1440,15 +1530,29 @@ class DepthImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
-        self._data = self._data.astype(np.float32)
-        self._data[np.isnan(self._data)] = 0.0
+        # the conversion to float32 already copies the data
+        cast = (data.dtype != np.float32)
+        Image.__init__(self, data, frame, copy=(copy and not cast))
+        if cast:
+            self._data = self._data.astype(np.float32)
+            copy = True
+
+        nan_px = np.isnan(self._data)
+        if np.any(nan_px):
+            if not copy:
+                # never write into a wrapped buffer
+                self._data = self._data.copy()
+            self._data[nan_px] = 0.0
         self._encoding = 'passthrough'
 
     def _check_valid_data(self, data):
@@ -1540,7 +1644,7 @@ class DepthImage(Image):
             The resized image.
         """
         resized_data = sm.imresize(self.data, size, interp=interp, mode='F')
-        return DepthImage(resized_data, self._frame)
+        return DepthImage(resized_data, self._frame, copy=False)
 
     def threshold(self, front_thresh=0.0, rear_thresh=100.0):
         """Creates a new DepthImage by setting all depths less than
@@ -1562,7 +1666,7 @@ class DepthImage(Image):
         data = np.copy(self._data)
         data[data < front_thresh] = 0.0
         data[data > rear_thresh] = 0.0
-        return DepthImage(data, self._frame)
+        return DepthImage(data, self._frame, copy=False)
 
     def threshold_gradients(self, grad_thresh):
         """Creates a new DepthImage by zeroing out all depths
@@ -1587,7 +1691,7 @@ class DepthImage(Image):
         gradient_mags = np.linalg.norm(gradients, axis=2)
         ind = np.where(gradient_mags > grad_thresh)
         data[ind[0], ind[1]] = 0.0
-        return DepthImage(data, self._frame)
+        return DepthImage(data, self._frame, copy=False)
 
     def threshold_gradients_pctile(self, thresh_pctile, min_mag=0.0):
         """Creates a new DepthImage by zeroing out all depths
@@ -1617,32 +1721,67 @@ class DepthImage(Image):
             (gradient_mags > grad_thresh) & (
                 gradient_mags > min_mag))
         data[ind[0], ind[1]] = 0.0
-        return DepthImage(data, self._frame)
+        return DepthImage(data, self._frame, copy=False)
 
-    def inpaint(self, rescale_factor=1.0):
+    def inpaint(self, rescale_factor=1.0, method='convolve'):
         """ Fills in the zero pixels in the image.
 
         Parameters
         ----------
         rescale_factor : float
             amount to rescale the image for inpainting, smaller numbers increase speed
+        method : :obj:`str`
+            inpainting method to use:
+            'convolve' repeatedly averages the nonzero neighbors of each zero pixel,
+            which takes a number of passes proportional to the largest hole diameter,
+            'pyramid' uses a push-pull fill over an image pyramid, and
+            'nearest' copies the closest nonzero pixel found with a distance transform.
+            The last two take a bounded number of passes.
 
         Returns
         -------
         :obj:`DepthImage`
             depth image with zero pixels filled in
         """
+        if method not in ['convolve', 'pyramid', 'nearest']:
+            raise ValueError('Inpainting method %s not supported' %(method))
+
         # get original shape
         orig_shape = (self.height, self.width)
 
-        # form inpaint kernel
-        inpaint_kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
-
         # resize the image
-        resized_data = self.resize(rescale_factor, interp='nearest').data
+        resized_data = self.data
+        if rescale_factor != 1.0:
+            resized_data = self.resize(rescale_factor, interp='nearest').data
 
         # inpaint the smaller image
-        cur_data = resized_data.copy()
+        if not np.any(resized_data != 0):
+            return self.copy()
+        if method == 'pyramid':
+            cur_data = DepthImage._inpaint_pyramid(resized_data)
+        elif method == 'nearest':
+            cur_data = DepthImage._inpaint_nearest(resized_data)
+        else:
+            cur_data = DepthImage._inpaint_convolve(resized_data)
+
+        # fill in zero pixels with inpainted and resized image
+        filled_data = cur_data
+        if rescale_factor != 1.0:
+            inpainted_im = DepthImage(cur_data, frame=self.frame)
+            filled_data = inpainted_im.resize(
+                orig_shape, interp='bilinear').data
+        new_data = np.copy(self.data)
+        new_data[self.data == 0] = filled_data[self.data == 0]
+        return DepthImage(new_data, frame=self.frame, copy=False)
+
+    @staticmethod
+    def _inpaint_convolve(data):
+        """ Fills zero pixels by repeatedly averaging the nonzero 8-neighbors
+        until no zeros remain. """
+        # form inpaint kernel
+        inpaint_kernel = np.array([[1, 1, 1], [1, 0, 1], [1, 1, 1]])
+
+        cur_data = data.copy()
         zeros = (cur_data == 0)
         while np.any(zeros):
             neighbors = ssg.convolve2d((cur_data != 0), inpaint_kernel,
@@ -1652,17 +1791,48 @@ class DepthImage(Image):
             avg_depth[neighbors > 0] = avg_depth[neighbors > 0] / \
                 neighbors[neighbors > 0]
             avg_depth[neighbors == 0] = 0
-            avg_depth[resized_data > 0] = resized_data[resized_data > 0]
+            avg_depth[data > 0] = data[data > 0]
             cur_data = avg_depth
             zeros = (cur_data == 0)
+        return cur_data
 
-        # fill in zero pixels with inpainted and resized image
-        inpainted_im = DepthImage(cur_data, frame=self.frame)
-        filled_data = inpainted_im.resize(
-            orig_shape, interp='bilinear').data
-        new_data = np.copy(self.data)
-        new_data[self.data == 0] = filled_data[self.data == 0]
-        return DepthImage(new_data, frame=self.frame)
+    @staticmethod
+    def _inpaint_pyramid(data):
+        """ Fills zero pixels with a push-pull fill over an image pyramid.
+        Nonzero depths are summed into 2x2 blocks until every block at the
+        coarsest level holds a depth, then the block averages are copied back
+        down into the holes of each finer level. """
+        # push: sum depths and counts of valid pixels into coarser levels
+        values = np.where(data > 0, data, 0).astype(np.float32)
+        weights = (data > 0).astype(np.float32)
+        levels = [(values, weights)]
+        while np.any(weights == 0) and max(weights.shape) > 1:
+            height, width = weights.shape
+            pad = ((0, height % 2), (0, width % 2))
+            values = np.pad(values, pad, mode='constant')
+            weights = np.pad(weights, pad, mode='constant')
+            values = values[0::2,0::2] + values[1::2,0::2] + values[0::2,1::2] + values[1::2,1::2]
+            weights = weights[0::2,0::2] + weights[1::2,0::2] + weights[0::2,1::2] + weights[1::2,1::2]
+            levels.append((values, weights))
+
+        # pull: fill the holes at each level from the level above
+        filled = None
+        for values, weights in reversed(levels):
+            avg = np.zeros(values.shape, dtype=np.float32)
+            avg[weights > 0] = values[weights > 0] / weights[weights > 0]
+            if filled is not None:
+                upsampled = np.repeat(np.repeat(filled, 2, axis=0), 2, axis=1)
+                upsampled = upsampled[:values.shape[0],:values.shape[1]]
+                avg[weights == 0] = upsampled[weights == 0]
+            filled = avg
+        return filled
+
+    @staticmethod
+    def _inpaint_nearest(data):
+        """ Fills zero pixels with the depth of the closest nonzero pixel
+        using a single Euclidean distance transform. """
+        _, nearest_ind = snm.distance_transform_edt(data == 0, return_indices=True)
+        return data[nearest_ind[0], nearest_ind[1]]
 
     def invalid_pixel_mask(self):
         """ Returns a binary mask for the NaN- and zero-valued pixels.
@@ -1702,7 +1872,7 @@ class DepthImage(Image):
         data = np.copy(self._data)
         ind = np.where(binary_im.data == 0)
         data[ind[0], ind[1]] = 0.0
-        return DepthImage(data, self._frame)
+        return DepthImage(data, self._frame, copy=False)
 
     def pixels_farther_than(self, depth_im, filter_equal_depth=False):
         """
@@ -1749,7 +1919,7 @@ class DepthImage(Image):
         # take closest pixel
         new_data[(new_data > depth_im.data) & (depth_im.data > 0)] = depth_im.data[(
             new_data > depth_im.data) & (depth_im.data > 0)]
-        return DepthImage(new_data, frame=self.frame)
+        return DepthImage(new_data, frame=self.frame, copy=False)
 
     def to_binary(self, threshold=0.0):
         """Creates a BinaryImage from the depth image. Points where the depth
@@ -1784,7 +1954,7 @@ class DepthImage(Image):
             color image corresponding to the depth image
         """
         im_data = self._image_data(normalize=normalize)
-        return ColorImage(im_data, frame=self._frame)
+        return ColorImage(im_data, frame=self._frame, copy=False)
 
     def to_float(self):
         """ Converts to 32-bit data.
@@ -1794,7 +1964,7 @@ class DepthImage(Image):
         :obj:`DepthImage`
             depth image with 32 bit float data
         """
-        return DepthImage(self.data.astype(np.float32), frame=self.frame)
+        return DepthImage(self.data.astype(np.float32), frame=self.frame, copy=False)
 
     def point_normal_cloud(self, camera_intr):
         """Computes a PointNormalCloud from the depth image.
@@ -1818,9 +1988,34 @@ class DepthImage(Image):
             normal_cloud.data,
             frame=self._frame)
 
+    def save(self, filename, compression_level=PNG_COMPRESSION_LEVEL):
+        """Writes the image to a file. Depths are stored losslessly in .png
+        files as 16-bit millimeters, with invalid depths stored as zero.
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            The file to save the image to. Must be one of .png, .jpg,
+            .npy, or .npz.
+        compression_level : int
+            The zlib compression level from 0 to 9 for .png files.
+
+        Raises
+        ------
+        ValueError
+            If an unsupported file type is specified.
+        """
+        file_root, file_ext = os.path.splitext(filename)
+        if file_ext.lower() != '.png':
+            Image.save(self, filename, compression_level)
+            return
+        depth_mm = np.round(np.where(np.isfinite(self._data), self._data, 0) / np.float32(MM_TO_METERS))
+        Image._write_png16(filename, np.clip(depth_mm, 0, np.iinfo(np.uint16).max), compression_level)
+
     @staticmethod
     def open(filename, frame='unspecified'):
-        """Creates a DepthImage from a file.
+        """Creates a DepthImage from a file. 16-bit .png files are read as
+        millimeters.
 
         Parameters
         ----------
@@ -1838,17 +2033,21 @@ class DepthImage(Image):
             The new depth image.
         """
         file_root, file_ext = os.path.splitext(filename)
+        if file_ext.lower() == '.png':
+            depth_mm = Image._read_png16(filename)
+            if depth_mm is not None:
+                return DepthImage(depth_mm.astype(np.float32) * np.float32(MM_TO_METERS), frame, copy=False)
         data = Image.load_data(filename)
         if file_ext.lower() in COLOR_IMAGE_EXTS:
             data = (data * (MAX_DEPTH / BINARY_IM_MAX_VAL)).astype(np.float32)
-        return DepthImage(data, frame)
+        return DepthImage(data, frame, copy=False)
 
 
 class IrImage(Image):
     """An IR image in which individual pixels have a single uint16 channel.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create an IR image from an array of data.
 
         Parameters
@@ -1862,13 +2061,17 @@ class IrImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a uint16 array with one channel.
@@ -1922,11 +2125,35 @@ class IrImage(Image):
             The resized image.
         """
         resized_data = sm.imresize(self._data, size, interp=interp)
-        return IrImage(resized_data, self._frame)
+        return IrImage(resized_data, self._frame, copy=False)
+
+    def save(self, filename, compression_level=PNG_COMPRESSION_LEVEL):
+        """Writes the image to a file. IR values are stored losslessly in
+        16-bit .png files.
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            The file to save the image to. Must be one of .png, .jpg,
+            .npy, or .npz.
+        compression_level : int
+            The zlib compression level from 0 to 9 for .png files.
+
+        Raises
+        ------
+        ValueError
+            If an unsupported file type is specified.
+        """
+        file_root, file_ext = os.path.splitext(filename)
+        if file_ext.lower() != '.png':
+            Image.save(self, filename, compression_level)
+            return
+        Image._write_png16(filename, self._data, compression_level)
 
     @staticmethod
     def open(filename, frame='unspecified'):
-        """Creates an IrImage from a file.
+        """Creates an IrImage from a file. 16-bit .png files are read without
+        scaling.
 
         Parameters
         ----------
@@ -1943,16 +2170,21 @@ class IrImage(Image):
         :obj:`IrImage`
             The new IR image.
         """
+        file_root, file_ext = os.path.splitext(filename)
+        if file_ext.lower() == '.png':
+            data = Image._read_png16(filename)
+            if data is not None:
+                return IrImage(data, frame, copy=False)
         data = Image.load_data(filename)
         data = (data * (MAX_IR / BINARY_IM_MAX_VAL)).astype(np.uint16)
-        return IrImage(data, frame)
+        return IrImage(data, frame, copy=False)
 
 
 class GrayscaleImage(Image):
     """A grayscale image in which individual pixels have a single uint8 channel.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a grayscale image from an array of data.
 
         Parameters
@@ -1966,13 +2198,17 @@ class GrayscaleImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a uint8 array with one channel.
@@ -2027,7 +2263,7 @@ class GrayscaleImage(Image):
             The resized image.
         """
         resized_data = sm.imresize(self.data, size, interp=interp)
-        return GrayscaleImage(resized_data, self._frame)
+        return GrayscaleImage(resized_data, self._frame, copy=False)
 
     def to_color(self):
         """Convert the grayscale image to a ColorImage.
@@ -2038,7 +2274,7 @@ class GrayscaleImage(Image):
             A color image equivalent to the grayscale one.
         """
         color_data = np.repeat(self.data[:,:,np.newaxis], 3, axis=2)
-        return ColorImage(color_data, self._frame)
+        return ColorImage(color_data, self._frame, copy=False)
 
     @staticmethod
     def open(filename, frame='unspecified'):
@@ -2060,7 +2296,7 @@ class GrayscaleImage(Image):
             The new grayscale image.
         """
         data = Image.load_data(filename)
-        return GrayscaleImage(data, frame)
+        return GrayscaleImage(data, frame, copy=False)
 
 
 class BinaryImage(Image):
@@ -2068,7 +2304,7 @@ class BinaryImage(Image):
     """
 
     def __init__(self, data, frame='unspecified',
-                 threshold=BINARY_IM_DEFAULT_THRESH):
+                 threshold=BINARY_IM_DEFAULT_THRESH, copy=True):
         """Create a BinaryImage image from an array of data.
 
         Parameters
@@ -2088,6 +2324,11 @@ class BinaryImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False and the data only contains 0 and BINARY_IM_MAX_VAL, the
+            data array is wrapped without copying it, so changes to one are
+            visible in the other. Any other data is thresholded into a new array.
+
         Raises
         ------
         ValueError
@@ -2095,9 +2336,14 @@ class BinaryImage(Image):
             string.
         """
         self._threshold = threshold
-        data = BINARY_IM_MAX_VAL * \
-            (data > threshold).astype(data.dtype)  # binarize
-        Image.__init__(self, data, frame)
+        self._ray_tracers = {}
+        self._set_ray_tracers = {}
+        self._components = {}
+        if copy or not (0 <= threshold < BINARY_IM_MAX_VAL) or \
+           not np.all((data == 0) | (data == BINARY_IM_MAX_VAL)):
+            data = BINARY_IM_MAX_VAL * \
+                (data > threshold).astype(data.dtype)  # binarize
+        Image.__init__(self, data, frame, copy=False)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a uint8 array with one channel.
@@ -2201,88 +2447,63 @@ class BinaryImage(Image):
         data[ind[0], ind[1], ...] = BINARY_IM_MAX_VAL
         return BinaryImage(data, self._frame)
 
+    def connected_components(self, connectivity=8):
+        """Labels the white connected components of the image and computes
+        their statistics in a single pass. The result is computed once per
+        connectivity and reused, so the image must not be modified in place
+        afterwards.
+
+        Parameters
+        ----------
+        connectivity : int
+            4 or 8 pixel connectivity.
+
+        Returns
+        -------
+        :obj:`ConnectedComponents`
+            The labels, areas, bounding boxes and centroids of the components.
+        """
+        if connectivity not in self._components.keys():
+            self._components[connectivity] = ConnectedComponents(self.data, connectivity)
+        return self._components[connectivity]
+
     def prune_contours(self, area_thresh=1000.0, dist_thresh=20,
                        preserve_topology=True):
         """Removes all white connected components with area less than area_thresh.
         Parameters
         ----------
         area_thresh : float
-            The minimum area for which a white connected component will not be
-            zeroed out.
+            The minimum area in pixels for which a white connected component
+            will not be zeroed out.
         dist_thresh : int
-            If a connected component is within dist_thresh of the top of the
-            image, it will not be pruned out, regardless of its area.
+            Components within dist_thresh of the component closest to the
+            image center are kept, and all others are zeroed out.
+        preserve_topology : bool
+            If False, holes in the kept components are filled in. If True,
+            the holes are kept, along with any white components inside them.
         Returns
         -------
         :obj:`BinaryImage`
             The new pruned binary image.
         """
-        # get all contours (connected components) from the binary image
-        contours, hierarchy = cv2.findContours(
-            self.data.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-        num_contours = len(contours)
-        middle_pixel = np.array(self.shape)[:2] / 2
-        middle_pixel = middle_pixel.reshape(1, 2)
-        center_contour = None
-        pruned_contours = []
-
-        # find which contours need to be pruned
-        for i in range(num_contours):
-            area = cv2.contourArea(contours[i])
-            if area > area_thresh:
-                # check close to origin
-                fill = np.zeros([self.height, self.width, 3])
-                cv2.fillPoly(
-                    fill,
-                    pts=[
-                        contours[i]],
-                    color=(
-                        BINARY_IM_MAX_VAL,
-                        BINARY_IM_MAX_VAL,
-                        BINARY_IM_MAX_VAL))
-                nonzero_px = np.where(fill > 0)
-                nonzero_px = np.c_[nonzero_px[0], nonzero_px[1]]
-                dists = ssd.cdist(middle_pixel, nonzero_px)
-                min_dist = np.min(dists)
-                pruned_contours.append((contours[i], min_dist))
-
-        if len(pruned_contours) == 0:
+        components = self.connected_components()
+        candidates = np.nonzero(components.areas > area_thresh)[0]
+        if candidates.shape[0] == 0:
             return None
 
-        pruned_contours.sort(key=lambda x: x[1])
-
-        # keep all contours within some distance of the top
-        num_contours = len(pruned_contours)
-        keep_indices = [0]
-        source_coords = pruned_contours[0][0].squeeze().astype(np.float32)
-        for i in range(1, num_contours):
-            target_coords = pruned_contours[i][0].squeeze().astype(np.float32)
-            dists = ssd.cdist(source_coords, target_coords)
-            min_dist = np.min(dists)
-            if min_dist < dist_thresh:
-                keep_indices.append(i)
-
-        # keep the top num_areas pruned contours
-        keep_indices = np.unique(keep_indices)
-        pruned_contours = [pruned_contours[i][0] for i in keep_indices]
-
-        # mask out bad areas in the image
-        pruned_data = np.zeros([self.height, self.width, 3])
-        for contour in pruned_contours:
-            cv2.fillPoly(
-                pruned_data,
-                pts=[contour],
-                color=(
-                    BINARY_IM_MAX_VAL,
-                    BINARY_IM_MAX_VAL,
-                    BINARY_IM_MAX_VAL))
-        pruned_data = pruned_data[:, :, 0]  # convert back to one channel
-
-        # preserve topology of original image
+        # keep the component closest to the image center and its neighbors
+        middle_pixel = np.array(self.shape)[:2] / 2
+        center_dists = components.min_distances(middle_pixel)[candidates]
+        center_ind = candidates[np.argmin(center_dists)]
+        neighbor_dists = components.distances_to_component(center_ind)[candidates]
+        keep_indices = candidates[neighbor_dists < dist_thresh]
+
+        # fill the kept components so that smaller components lying in
+        # their holes survive, then cut the holes back out
+        pruned_mask = snm.binary_fill_holes(components.mask(keep_indices))
         if preserve_topology:
-            orig_zeros = np.where(self.data == 0)
-            pruned_data[orig_zeros[0], orig_zeros[1]] = 0
-        return BinaryImage(pruned_data.astype(np.uint8), self._frame)
+            pruned_mask = pruned_mask & (self.data > 0)
+        return BinaryImage(BINARY_IM_MAX_VAL * pruned_mask.astype(np.uint8), self._frame)
 
     def find_contours(self, min_area=0.0, max_area=np.inf):
         """Returns a list of connected components with an area between
@@ -2290,39 +2511,49 @@ class BinaryImage(Image):
         Parameters
         ----------
         min_area : float
-            The minimum area for a contour
+            The minimum area for a contour in pixels
         max_area : float
-            The maximum area for a contour
+            The maximum area for a contour in pixels
         Returns
         -------
         :obj:`list` of :obj:`Contour`
             A list of resuting contours
         """
-        # get all contours (connected components) from the binary image
-        _, contours, hierarchy = cv2.findContours(
-            self.data.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-        num_contours = len(contours)
+        components = self.connected_components()
+        areas = components.areas
+        kept_indices = np.nonzero((areas > min_area) & (areas < max_area))[0]
         kept_contours = []
-
-        # find which contours need to be pruned
-        for i in range(num_contours):
-            area = cv2.contourArea(contours[i])
-            logging.debug('Contour %d area: %.3f' % (len(kept_contours), area))
-            if area > min_area and area < max_area:
-                boundary_px = contours[i].squeeze()
-                boundary_px_ij_swapped = np.zeros(boundary_px.shape)
-                boundary_px_ij_swapped[:, 0] = boundary_px[:, 1]
-                boundary_px_ij_swapped[:, 1] = boundary_px[:, 0]
-                kept_contours.append(
-                    Contour(
-                        boundary_px_ij_swapped,
-                        area=area,
-                        frame=self._frame))
-
+        for i in kept_indices:
+            boundary_px = components.boundary_pixels(i)
+
+            # a single boundary pixel does not define a contour
+            if boundary_px.shape[0] < 2:
+                continue
+            kept_contours.append(
+                Contour(
+                    boundary_px.astype(np.float64),
+                    area=float(areas[i]),
+                    frame=self._frame))
         return kept_contours
 
     def contour_mask(self, contour):
         """ Generates a binary image with only the given contour filled in. """
+        # contours traced from one of this image's components, e.g. by
+        # find_contours, fill exactly that component unless another component
+        # lies inside its bounding box, e.g. in a hole
+        boundary_px = contour.boundary_pixels.reshape(-1, 2)
+        if np.all(boundary_px >= 0) and np.all(boundary_px < [self.height, self.width]):
+            components = self.connected_components()
+            label = components.labels[int(boundary_px[0, 0]), int(boundary_px[0, 1])]
+            if label > 0:
+                index = label - 1
+                min_i, min_j, max_i, max_j = components.bboxes[index]
+                box_labels = components.labels[min_i:max_i + 1, min_j:max_j + 1]
+                if np.all((box_labels == 0) | (box_labels == label)) and \
+                   np.array_equal(components.boundary_pixels(index), boundary_px):
+                    new_data = (components.labels == label).astype(np.uint8)
+                    return BinaryImage(BINARY_IM_MAX_VAL * new_data, frame=self._frame)
+
         # fill in new data
         new_data = np.zeros(self.data.shape)
         num_boundary = contour.boundary_pixels.shape[0]
@@ -2356,6 +2587,26 @@ class BinaryImage(Image):
                      contour.boundary_pixels[:, 1].astype(np.uint8)] = np.iinfo(np.uint8).max
         return BinaryImage(new_data.astype(np.uint8), frame=self.frame)
 
+    def ray_tracer(self, w=13):
+        """Returns a query engine for batches of closest_nonzero_pixel and
+        closest_allzero_pixel queries with window width w. The engine is built
+        once per width and reused, so the image must not be modified in place
+        afterwards.
+
+        Parameters
+        ----------
+        w : int
+            The width of the square window checked at each position.
+
+        Returns
+        -------
+        :obj:`BinaryRayTracer`
+            The query engine.
+        """
+        if w not in self._ray_tracers.keys():
+            self._ray_tracers[w] = BinaryRayTracer(self.data > 0, w)
+        return self._ray_tracers[w]
+
     def closest_pixel_to_set(self, start, pixel_set, direction, w=13, t=0.5):
         """Starting at pixel, moves start by direction * t until there is a
         pixel from pixel_set within a radius w of start. Then, returns start.
@@ -2385,38 +2636,44 @@ class BinaryImage(Image):
             The first pixel location along the direction vector at which there
             exists some intersection with pixel_set within a radius w.
         """
+        tracer = self.set_ray_tracer(pixel_set, w)
+        pixels, _ = tracer.closest_nonzero_or_border_pixels(start, direction, t)
+        return pixels[0]
 
-        # create circular structure for checking clearance
-        y, x = np.meshgrid(np.arange(w) - w / 2, np.arange(w) - w / 2)
-        cur_px_y = np.ravel(y + start[0]).astype(np.uint16)
-        cur_px_x = np.ravel(x + start[1]).astype(np.uint16)
-        
-        # create comparison set, check set overlap
-        cur_px = set(zip(cur_px_y, cur_px_x))
-        includes = True
-        if np.all(
-            cur_px_y >= 0) and np.all(
-            cur_px_y < self.height) and np.all(
-            cur_px_x >= 0) and np.all(
-                cur_px_x < self.width):
-            includes = not cur_px.isdisjoint(pixel_set)
-
-        # Continue until out of bounds or sets overlap
-        while not includes:
-            start = start + t * direction
-            cur_px_y = np.ravel(y + start[0]).astype(np.uint16)
-            cur_px_x = np.ravel(x + start[1]).astype(np.uint16)
-            cur_px = set(zip(cur_px_y, cur_px_x))
-            if np.all(
-                cur_px_y >= 0) and np.all(
-                cur_px_y < self.height) and np.all(
-                cur_px_x >= 0) and np.all(
-                    cur_px_x < self.width):
-                includes = not cur_px.isdisjoint(pixel_set)
-            else:
-                includes = True
-        
-        return start
+    def set_ray_tracer(self, pixel_set, w=13):
+        """Returns a query engine for batches of closest_pixel_to_set queries
+        against one pixel set, via its closest_nonzero_or_border_pixels
+        method. Engines for the most recently used sets are cached.
+
+        Parameters
+        ----------
+        pixel_set : set of 2-tuples of float
+            The set of pixels to check set intersection with.
+        w : int
+            The width of the square window checked at each position.
+
+        Returns
+        -------
+        :obj:`BinaryRayTracer`
+            The query engine.
+        """
+        key = (frozenset(pixel_set), w)
+        if key in self._set_ray_tracers.keys():
+            return self._set_ray_tracers[key]
+
+        # rasterize the integer pixels of the set inside the image
+        set_mask = np.zeros([self.height, self.width], dtype=bool)
+        if len(pixel_set) > 0:
+            set_px = np.array(list(pixel_set), dtype=np.float64).reshape(-1, 2)
+            valid = np.all(set_px == np.floor(set_px), axis=1) & np.all(set_px >= 0, axis=1) & \
+                    (set_px[:, 0] < self.height) & (set_px[:, 1] < self.width)
+            set_px = set_px[valid].astype(np.int64)
+            set_mask[set_px[:, 0], set_px[:, 1]] = True
+
+        if len(self._set_ray_tracers) >= MAX_SET_RAY_TRACERS:
+            self._set_ray_tracers.clear()
+        self._set_ray_tracers[key] = BinaryRayTracer(set_mask, w)
+        return self._set_ray_tracers[key]
 
     def closest_nonzero_pixel(self, pixel, direction, w=13, t=0.5):
         """Starting at pixel, moves pixel by direction * t until there is a
@@ -2444,31 +2701,10 @@ class BinaryImage(Image):
             The first pixel location along the direction vector at which there
             exists some non-zero pixel within a radius w.
         """
-        # create circular structure for checking clearance
-        y, x = np.meshgrid(np.arange(w) - w / 2, np.arange(w) - w / 2)
-
-        cur_px_y = np.ravel(y + pixel[0]).astype(np.uint16)
-        cur_px_x = np.ravel(x + pixel[1]).astype(np.uint16)
-        occupied = False
-        if np.all(
-            cur_px_y >= 0) and np.all(
-            cur_px_y < self.height) and np.all(
-            cur_px_x >= 0) and np.all(
-                cur_px_x < self.width):
-            occupied = np.any(self[cur_px_y, cur_px_x] >= self._threshold)
-        while not occupied:
-            pixel = pixel + t * direction
-            cur_px_y = np.ravel(y + pixel[0]).astype(np.uint16)
-            cur_px_x = np.ravel(x + pixel[1]).astype(np.uint16)
-            if np.all(
-                cur_px_y >= 0) and np.all(
-                cur_px_y < self.height) and np.all(
-                cur_px_x >= 0) and np.all(
-                    cur_px_x < self.width):
-                occupied = np.any(self[cur_px_y, cur_px_x] >= self._threshold)
-            else:
-                return None
-        return pixel
+        pixels, found = self.ray_tracer(w).closest_nonzero_pixels(pixel, direction, t)
+        if not found[0]:
+            return None
+        return pixels[0]
     
     def closest_allzero_pixel(self, pixel, direction, w=13, t=0.5):
         """Starting at pixel, moves pixel by direction * t until all
@@ -2496,37 +2732,10 @@ class BinaryImage(Image):
             The first pixel location along the direction vector at which there
             exists all zero pixels within a radius w.
         """
-        # create circular structure for checking clearance
-        y, x = np.meshgrid(np.arange(w) - w / 2, np.arange(w) - w / 2)
-
-        cur_px_y = np.ravel(y + pixel[0]).astype(np.uint16)
-        cur_px_x = np.ravel(x + pixel[1]).astype(np.uint16)
-        
-        # Check if all pixels in radius are in bounds and zero-valued
-        empty = False
-        if np.all(
-            cur_px_y >= 0) and np.all(
-            cur_px_y < self.height) and np.all(
-            cur_px_x >= 0) and np.all(
-                cur_px_x < self.width):
-            empty = np.all(self[cur_px_y, cur_px_x] <= self._threshold)
-        
-        # If some nonzero pixels, continue incrementing along direction
-        # and checking for empty space
-        while not empty:
-            pixel = pixel + t * direction
-            cur_px_y = np.ravel(y + pixel[0]).astype(np.uint16)
-            cur_px_x = np.ravel(x + pixel[1]).astype(np.uint16)
-            if np.all(
-                cur_px_y >= 0) and np.all(
-                cur_px_y < self.height) and np.all(
-                cur_px_x >= 0) and np.all(
-                    cur_px_x < self.width):
-                empty = np.all(self[cur_px_y, cur_px_x] <= self._threshold)
-            else:
-                return None
-                
-        return pixel
+        pixels, found = self.ray_tracer(w).closest_allzero_pixels(pixel, direction, t)
+        if not found[0]:
+            return None
+        return pixels[0]
 
     def add_frame(
             self,
@@ -2651,21 +2860,56 @@ class BinaryImage(Image):
                 count += 1
         return count
 
-    def to_sdf(self):
-        """ Converts the 2D image to a 2D signed distance field.
+    def to_sdf(self, band=None, dtype=np.float64):
+        """ Converts the 2D image to a 2D signed distance field using exact
+        Euclidean distance transforms. Distances are positive outside the
+        nonzero region and negative inside it.
+
+        Parameters
+        ----------
+        band : float
+            if given, distances are only computed within this many pixels
+            of the boundary and clipped to [-band, band] elsewhere, which
+            skips the far field when only near-boundary distances are needed
+        dtype : :obj:`numpy.dtype`
+            datatype of the output, e.g. np.float32 to halve its size
 
         Returns
         -------
         :obj:`numpy.ndarray`
             2D float array of the signed distance field
-        """
-        # compute medial axis transform
-        skel, sdf_in = morph.medial_axis(self.data, return_distance=True)
-        useless_skel, sdf_out = morph.medial_axis(
-            np.iinfo(np.uint8).max - self.data, return_distance=True)
 
-        # convert to true sdf
-        sdf = sdf_out - sdf_in
+        Raises
+        ------
+        ValueError
+            If the band is not positive.
+        """
+        if band is not None and band <= 0:
+            raise ValueError('Band must be positive')
+        mask = self.data > 0
+        if band is None:
+            sdf = snm.distance_transform_edt(~mask) - snm.distance_transform_edt(mask)
+            return sdf.astype(dtype)
+
+        # the closest pixel of the other region always lies on the boundary,
+        # so pixels within the band only depend on the boundary's bounding box
+        sdf = np.where(mask, -band, band).astype(dtype)
+        boundary = np.zeros(mask.shape, dtype=bool)
+        boundary[:, :-1] |= mask[:, :-1] != mask[:, 1:]
+        boundary[:, 1:] |= mask[:, :-1] != mask[:, 1:]
+        boundary[:-1, :] |= mask[:-1, :] != mask[1:, :]
+        boundary[1:, :] |= mask[:-1, :] != mask[1:, :]
+        boundary_px = np.where(boundary)
+        if boundary_px[0].shape[0] == 0:
+            return sdf
+        margin = int(np.ceil(band))
+        min_i = max(np.min(boundary_px[0]) - margin, 0)
+        max_i = min(np.max(boundary_px[0]) + margin + 1, self.height)
+        min_j = max(np.min(boundary_px[1]) - margin, 0)
+        max_j = min(np.max(boundary_px[1]) + margin + 1, self.width)
+        window = mask[min_i:max_i, min_j:max_j]
+        window_sdf = snm.distance_transform_edt(~window) - snm.distance_transform_edt(window)
+        sdf[min_i:max_i, min_j:max_j] = np.clip(window_sdf, -band, band)
         return sdf
 
     def to_color(self):
@@ -2710,7 +2954,7 @@ class BinaryImage(Image):
 class RgbdImage(Image):
     """ An image containing a red, green, blue, and depth channel. """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """ Create an RGB-D image from an array of data.
 
         Parameters
@@ -2727,13 +2971,17 @@ class RgbdImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a float array with four channels.
@@ -2960,7 +3208,7 @@ class RgbdImage(Image):
 class GdImage(Image):
     """ An image containing a grayscale and depth channel. """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a G-D image from an array of data.
 
         Parameters
@@ -2977,13 +3225,17 @@ class GdImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a float array with four channels.
@@ -3115,7 +3367,7 @@ class SegmentationImage(Image):
     """An image containing integer-valued segment labels.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a Segmentation image from an array of data.
 
         Parameters
@@ -3130,6 +3382,10 @@ class SegmentationImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
@@ -3137,7 +3393,7 @@ class SegmentationImage(Image):
             string.
         """
         self._num_segments = np.max(data) + 1
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """ Checks for uint8, single channel """
@@ -3156,6 +3412,37 @@ class SegmentationImage(Image):
     def _image_data(self):
         return self._data
 
+    def boundary_mask(self, include_zero=False):
+        """Returns a mask of the pixels adjacent to a pixel of another
+        segment, computed in one pass over the label image.
+
+        Parameters
+        ----------
+        include_zero : bool
+            whether boundaries with the zero segment count, in which case
+            zero-segment pixels on those boundaries are also included
+
+        Returns
+        -------
+        :obj:`BinaryImage`
+             binary image that is nonzero on the boundary pixels
+        """
+        labels = self.data
+        boundary = np.zeros(labels.shape, dtype=bool)
+
+        # compare each pixel with its right, lower and both lower diagonal
+        # neighbors, marking both pixels of every differing pair
+        for (a, b) in [((slice(None), slice(None, -1)), (slice(None), slice(1, None))),
+                       ((slice(None, -1), slice(None)), (slice(1, None), slice(None))),
+                       ((slice(None, -1), slice(None, -1)), (slice(1, None), slice(1, None))),
+                       ((slice(None, -1), slice(1, None)), (slice(1, None), slice(None, -1)))]:
+            differ = labels[a] != labels[b]
+            if not include_zero:
+                differ &= (labels[a] > 0) & (labels[b] > 0)
+            boundary[a] |= differ
+            boundary[b] |= differ
+        return BinaryImage(BINARY_IM_MAX_VAL * boundary.astype(np.uint8), frame=self.frame)
+
     def border_pixels(
             self,
             grad_sigma=0.5,
@@ -3167,34 +3454,18 @@ class SegmentationImage(Image):
         Parameters
         ----------
         grad_sigma : float
-            standard deviation used for gaussian gradient filter
+            ignored, kept for backwards compatibility with the former gradient-based boundary
         grad_lower_thresh : float
-            lower threshold on gradient threshold used to determine the boundary pixels
+            ignored, kept for backwards compatibility with the former gradient-based boundary
         grad_upper_thresh : float
-            upper threshold on gradient threshold used to determine the boundary pixels
+            ignored, kept for backwards compatibility with the former gradient-based boundary
 
         Returns
         -------
         :obj:`numpy.ndarray`
              Nx2 array of pixels on the boundary
         """
-        # boundary pixels
-        boundary_im = np.ones(self.shape)
-        for i in range(1, self.num_segments):
-            label_border_im = self.data.copy()
-            label_border_im[self.data == 0] = i
-            grad_mag = sf.gaussian_gradient_magnitude(
-                label_border_im.astype(np.float32), sigma=grad_sigma)
-
-            nonborder_px = np.where(
-                (grad_mag < grad_lower_thresh) | (
-                    grad_mag > grad_upper_thresh))
-            boundary_im[nonborder_px[0], nonborder_px[1]] = 0
-
-        # return boundary pixels
-        border_px = np.where(boundary_im > 0)
-        border_px = np.c_[border_px[0], border_px[1]]
-        return border_px
+        return self.boundary_mask().nonzero_pixels()
 
     def segment_mask(self, segnum):
         """ Returns a binary image of just the segment corresponding to the given number.
@@ -3209,9 +3480,147 @@ class SegmentationImage(Image):
         :obj:`BinaryImage`
              binary image data
         """
-        binary_data = np.zeros(self.shape)
-        binary_data[self.data == segnum] = BINARY_IM_MAX_VAL
-        return BinaryImage(binary_data.astype(np.uint8), frame=self.frame)
+        binary_data = BINARY_IM_MAX_VAL * (self._data == segnum).astype(np.uint8)
+        return BinaryImage(binary_data, frame=self.frame, copy=False)
+
+    def segment_areas(self):
+        """Returns the number of pixels in each segment.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+             the area of each segment, indexed by segment label
+        """
+        return np.bincount(self._data.ravel(), minlength=self.num_segments)
+
+    def segment_centroids(self):
+        """Returns the centroid of each segment.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+             num_segments x 2 array of the (row, column) centroid of each
+             segment, indexed by segment label, with NaN for empty segments
+        """
+        labels = self._data.ravel()
+        rows, cols = np.indices([self.height, self.width])
+        areas = np.bincount(labels, minlength=self.num_segments)
+        sums = np.c_[np.bincount(labels, weights=rows.ravel(), minlength=self.num_segments),
+                     np.bincount(labels, weights=cols.ravel(), minlength=self.num_segments)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / areas[:, np.newaxis]
+
+    @staticmethod
+    def _sorted_segments(labels, num_labels, values=None):
+        """Sorts flat pixel labels, and by value within each label if values
+        are given.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+            flat pixel indices in sorted order
+        :obj:`numpy.ndarray` of int
+            the nonempty labels
+        :obj:`numpy.ndarray` of int
+            position in the sorted order of the first pixel of each nonempty label
+        :obj:`numpy.ndarray` of int
+            number of pixels with each nonempty label
+        """
+        if values is None:
+            order = np.argsort(labels, kind='stable')
+        else:
+            order = np.lexsort((values, labels))
+        areas = np.bincount(labels, minlength=num_labels)
+        present = np.nonzero(areas)[0]
+        starts = (np.cumsum(areas) - areas)[present]
+        return order, present, starts, areas[present]
+
+    def segment_bboxes(self):
+        """Returns the bounding box of each segment.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of int
+             num_segments x 4 array of the inclusive bounding box of each
+             segment as (min row, min column, max row, max column), indexed by
+             segment label, with -1 for empty segments
+        """
+        order, present, starts, areas = self._sorted_segments(self._data.ravel(), self.num_segments)
+
+        # pixels of each segment are in raster order, so rows are sorted
+        rows = order // self.width
+        cols = order % self.width
+        bboxes = -np.ones([self.num_segments, 4], dtype=np.int64)
+        bboxes[present, 0] = rows[starts]
+        bboxes[present, 1] = np.minimum.reduceat(cols, starts)
+        bboxes[present, 2] = rows[starts + areas - 1]
+        bboxes[present, 3] = np.maximum.reduceat(cols, starts)
+        return bboxes
+
+    def segment_means(self, image, ignore_zeros=False):
+        """Returns the mean value of another image over each segment, e.g.
+        the mean color or depth.
+
+        Parameters
+        ----------
+        image : :obj:`Image`
+            an image of the same height and width, e.g. a ColorImage or DepthImage
+        ignore_zeros : bool
+            whether to exclude pixels whose channels are all zero, e.g.
+            invalid depths
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+             num_segments x C array of the mean of each channel, indexed by
+             segment label, with NaN for segments without valid pixels
+
+        Raises
+        ------
+        ValueError
+            If the image size does not match.
+        """
+        if image.height != self.height or image.width != self.width:
+            raise ValueError('Image size does not match segmentation')
+        labels = self._data.ravel()
+        values = image.raw_data.reshape(-1, image.channels).astype(np.float64)
+        weights = None
+        if ignore_zeros:
+            weights = np.any(values != 0, axis=1).astype(np.float64)
+        counts = np.bincount(labels, weights=weights, minlength=self.num_segments)
+        sums = np.array([np.bincount(labels, weights=values[:, c], minlength=self.num_segments)
+                         for c in range(image.channels)]).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / counts[:, np.newaxis]
+
+    def segment_medians(self, values, mask=None):
+        """Returns the median of a per-pixel array over each segment.
+
+        Parameters
+        ----------
+        values : :obj:`numpy.ndarray` of float
+            array with the same height and width as the image
+        mask : :obj:`numpy.ndarray` of bool
+            optional mask of the pixels to include
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+             the median over each segment, indexed by segment label, with NaN
+             for segments without valid pixels
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        labels = self._data.ravel()
+        if mask is not None:
+            # move excluded pixels to an extra label past the last segment
+            labels = labels.astype(np.int64)
+            labels[~np.asarray(mask, dtype=bool).ravel()] = self.num_segments
+        order, present, starts, areas = self._sorted_segments(labels, self.num_segments + 1, values)
+        sorted_values = values[order]
+        medians = np.full(self.num_segments + 1, np.nan)
+        medians[present] = 0.5 * (sorted_values[starts + (areas - 1) // 2] +
+                                  sorted_values[starts + areas // 2])
+        return medians[:self.num_segments]
 
     def mask_binary(self, binary_im):
         """Create a new image by zeroing out data at locations
@@ -3232,7 +3641,7 @@ class SegmentationImage(Image):
         data = np.copy(self._data)
         ind = np.where(binary_im.data == 0)
         data[ind[0], ind[1], :] = 0
-        return SegmentationImage(data, self._frame)
+        return SegmentationImage(data, self._frame, copy=False)
     
     def resize(self, size, interp='nearest'):
         """Resize the image.
@@ -3249,20 +3658,20 @@ class SegmentationImage(Image):
             'bicubic', or 'cubic')
         """
         resized_data = sm.imresize(self.data, size, interp=interp, mode='L')
-        return SegmentationImage(resized_data, self._frame)
+        return SegmentationImage(resized_data, self._frame, copy=False)
 
     @staticmethod
     def open(filename, frame='unspecified'):
         """ Opens a segmentation image """
         data = Image.load_data(filename)
-        return SegmentationImage(data, frame)
+        return SegmentationImage(data, frame, copy=False)
 
 
 class PointCloudImage(Image):
     """A point cloud image in which individual pixels have three float channels.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a PointCloudImage image from an array of data.
 
         Parameters
@@ -3276,13 +3685,17 @@ class PointCloudImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a float array with three channels.
@@ -3343,79 +3756,78 @@ class PointCloudImage(Image):
         resized_data[:,:,0] = resized_data_0
         resized_data[:,:,1] = resized_data_1
         resized_data[:,:,2] = resized_data_2
-        return PointCloudImage(resized_data, self._frame)
+        return PointCloudImage(resized_data, self._frame, copy=False)
+
+    def triangulate(self, dist_thresh=0.01):
+        """ Triangulates the organized grid of points. Each 2x2 block of pixels
+        is split into two triangles along its diagonal, and a triangle is kept
+        if the depth differences between its corners are below dist_thresh.
+
+        Parameters
+        ----------
+        dist_thresh : float
+            maximum depth difference between the corners of a triangle
+
+        Returns
+        -------
+        :obj:`numpy.ndarray` of float
+            Nx3 array of the vertices used by at least one triangle
+        :obj:`numpy.ndarray` of int
+            Mx3 array of the vertex indices of each triangle
+        """
+        # depth differences across the edges of each block
+        z = self._data[:,:,2]
+        z0 = z[:-1,:-1]
+        z1 = z[:-1,1:]
+        z2 = z[1:,:-1]
+        z3 = z[1:,1:]
+        d01 = np.abs(z0 - z1)
+        d03 = np.abs(z0 - z3)
+        d13 = np.abs(z1 - z3)
+        d23 = np.abs(z2 - z3)
+        valid_tris = np.stack([np.maximum(np.maximum(d01, d03), d13) < dist_thresh,
+                               np.maximum(np.maximum(d01, d03), d23) < dist_thresh],
+                              axis=2)
+
+        # triangles (v0, v1, v3) and (v0, v3, v2) of each block, in pixel order
+        px_indices = np.arange(self.height * self.width, dtype=np.int32).reshape(self.height, self.width)
+        i0 = px_indices[:-1,:-1]
+        i1 = px_indices[:-1,1:]
+        i2 = px_indices[1:,:-1]
+        i3 = px_indices[1:,1:]
+        all_tris = np.stack([np.stack([i0, i1, i3], axis=2),
+                             np.stack([i0, i3, i2], axis=2)],
+                            axis=2)
+        triangles = all_tris[valid_tris]
+
+        # keep only the vertices used by a triangle
+        used = np.zeros(self.height * self.width, dtype=bool)
+        used[triangles.ravel()] = True
+        vertex_indices = (np.cumsum(used) - 1).astype(np.int32)
+        vertices = self._data.reshape(-1, 3)[used]
+        triangles = vertex_indices[triangles]
+        return vertices, triangles
 
     def to_mesh(self, dist_thresh=0.01):
         """ Convert the point cloud to a mesh.
 
+        Parameters
+        ----------
+        dist_thresh : float
+            maximum depth difference between the corners of a triangle
+
         Returns
         -------
         :obj:`trimesh.Trimesh`
             mesh of the point cloud
         """
-        # init vertex and triangle buffers
-        vertices = []
-        triangles = []
-        vertex_indices = -1 * np.ones([self.height, self.width]).astype(np.int32)
-        
-        for i in range(self.height-1):
-            for j in range(self.width-1):
-                # read corners of square
-                v0 = self.data[i,j,:]
-                v1 = self.data[i,j+1,:]
-                v2 = self.data[i+1,j,:]
-                v3 = self.data[i+1,j+1,:]
-
-                # check distances
-                d01 = np.abs(v0[2] - v1[2])
-                d02 = np.abs(v0[2] - v2[2])
-                d03 = np.abs(v0[2] - v3[2])
-                d13 = np.abs(v1[2] - v3[2])
-                d23 = np.abs(v2[2] - v3[2])
-
-                # add tri 1
-                if max(d01, d03, d13) < dist_thresh:
-                    # add vertices
-                    if vertex_indices[i,j] == -1:
-                        vertices.append(v0)
-                        vertex_indices[i,j] = len(vertices)-1
-                    if vertex_indices[i,j+1] == -1:
-                        vertices.append(v1)
-                        vertex_indices[i,j+1] = len(vertices)-1
-                    if vertex_indices[i+1,j+1] == -1:
-                        vertices.append(v3)
-                        vertex_indices[i+1,j+1] = len(vertices)-1
-                
-                    # add tri
-                    i0 = vertex_indices[i,j]
-                    i1 = vertex_indices[i,j+1]
-                    i3 = vertex_indices[i+1,j+1]
-                    triangles.append([i0, i1, i3])
-
-                # add tri 2
-                if max(d01, d03, d23) < dist_thresh:
-                    # add vertices
-                    if vertex_indices[i,j] == -1:
-                        vertices.append(v0)
-                        vertex_indices[i,j] = len(vertices)-1
-                    if vertex_indices[i+1,j] == -1:
-                        vertices.append(v2)
-                        vertex_indices[i+1,j] = len(vertices)-1
-                    if vertex_indices[i+1,j+1] == -1:
-                        vertices.append(v3)
-                        vertex_indices[i+1,j+1] = len(vertices)-1
-                
-                    # add tri
-                    i0 = vertex_indices[i,j]
-                    i2 = vertex_indices[i+1,j]
-                    i3 = vertex_indices[i+1,j+1]
-                    triangles.append([i0, i3, i2])
+        vertices, triangles = self.triangulate(dist_thresh=dist_thresh)
 
         # return trimesh
         import trimesh
         mesh = trimesh.Trimesh(vertices, triangles)
         return mesh
-        
+
     def to_point_cloud(self):
         """Convert the image to a PointCloud object.
 
@@ -3457,7 +3869,7 @@ class PointCloudImage(Image):
         zero_px = self.zero_pixels()
         normal_im_data[zero_px[:,0], zero_px[:,1], :] = np.zeros(3)
         
-        return NormalCloudImage(normal_im_data, frame=self.frame)
+        return NormalCloudImage(normal_im_data, frame=self.frame, copy=False)
 
     @staticmethod
     def open(filename, frame='unspecified'):
@@ -3479,14 +3891,14 @@ class PointCloudImage(Image):
             The new PointCloudImage.
         """
         data = Image.load_data(filename)
-        return PointCloudImage(data, frame)
+        return PointCloudImage(data, frame, copy=False)
 
 
 class NormalCloudImage(Image):
     """A normal cloud image in which individual pixels have three float channels.
     """
 
-    def __init__(self, data, frame='unspecified'):
+    def __init__(self, data, frame='unspecified', copy=True):
         """Create a NormalCloudImage image from an array of data.
 
         Parameters
@@ -3500,13 +3912,17 @@ class NormalCloudImage(Image):
             A string representing the frame of reference in which this image
             lies.
 
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
         Raises
         ------
         ValueError
             If the data is not a properly-formatted ndarray or frame is not a
             string.
         """
-        Image.__init__(self, data, frame)
+        Image.__init__(self, data, frame, copy=copy)
 
     def _check_valid_data(self, data):
         """Checks that the given data is a float array with three channels.
@@ -3588,4 +4004,490 @@ class NormalCloudImage(Image):
             The new NormalCloudImage.
         """
         data = Image.load_data(filename)
-        return NormalCloudImage(data, frame)
+        return NormalCloudImage(data, frame, copy=False)
+
+
+class ImageBatch(object):
+    """A stack of same-size images of a single type backed by one
+    N x H x W x C array, so that image operations run over the whole stack
+    at once.
+    """
+
+    def __init__(self, data, image_type=ColorImage, frame='unspecified', copy=True,
+                 encoding=None):
+        """Create an image batch from an array of data.
+
+        Parameters
+        ----------
+        data : :obj:`numpy.ndarray`
+            An N x H x W x C array of image data, or an N x H x W array for
+            single-channel images.
+
+        image_type : :obj:`type`
+            The Image subclass of each image in the batch, e.g. ColorImage,
+            DepthImage, BinaryImage or SegmentationImage.
+
+        frame : :obj:`str`
+            A string representing the frame of reference in which the images
+            lie.
+
+        copy : bool
+            If False, the data array is wrapped without copying it, so changes
+            to one are visible in the other.
+
+        encoding : :obj:`str`
+            Either rgb8 or bgr8, the channel storage mode of color images.
+            Defaults to rgb8 for color images and is ignored otherwise.
+
+        Raises
+        ------
+        ValueError
+            If the data is not a 3 or 4 dimensional array or the images are
+            not valid for the image type.
+        """
+        if not isinstance(data, np.ndarray):
+            raise ValueError('Must initialize image batch with a numpy ndarray')
+        if not isinstance(image_type, type) or not issubclass(image_type, Image):
+            raise ValueError('Image type %s not supported in batches' %(image_type))
+        if len(data.shape) == 3:
+            data = data[:, :, :, np.newaxis]
+        elif len(data.shape) != 4:
+            raise ValueError(
+                'Illegal data array passed to image batch. Must be 3 or 4 dimensional numpy array')
+
+        # binarize the whole stack at once
+        if image_type is BinaryImage:
+            data = BINARY_IM_MAX_VAL * \
+                (data > BINARY_IM_DEFAULT_THRESH).astype(data.dtype)
+            copy = False
+
+        # only color images carry an encoding
+        if not issubclass(image_type, ColorImage):
+            encoding = None
+        elif encoding is None:
+            encoding = 'rgb8'
+        self._image_type = image_type
+        self._frame = frame
+        self._encoding = encoding
+
+        # check the data against the image type with a single view
+        if data.shape[0] > 0:
+            self._new_image(data[0])
+
+        if copy:
+            data = data.copy()
+        self._data = data
+
+    @staticmethod
+    def from_images(images):
+        """Stack a list of images into a batch.
+
+        Parameters
+        ----------
+        images : :obj:`list` of :obj:`Image`
+            images of the same type and size
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            a batch containing a copy of the image data
+
+        Raises
+        ------
+        ValueError
+            If the list is empty or the images differ in type, shape or
+            encoding.
+        """
+        if len(images) == 0:
+            raise ValueError('Cannot create a batch from an empty list of images')
+        an_image = images[0]
+        encoding = None
+        if isinstance(an_image, ColorImage):
+            encoding = an_image.encoding
+        data = np.empty((len(images),) + an_image.shape, dtype=an_image.raw_data.dtype)
+        for i, image in enumerate(images):
+            if type(image) is not type(an_image):
+                raise ValueError('All images in a batch must have the same type')
+            if image.shape != an_image.shape:
+                raise ValueError('All images in a batch must have the same shape')
+            if encoding is not None and image.encoding != encoding:
+                raise ValueError('All images in a batch must have the same encoding')
+            data[i, ...] = image.raw_data
+        return ImageBatch(data, type(an_image), an_image.frame, copy=False,
+                          encoding=encoding)
+
+    @property
+    def data(self):
+        """:obj:`numpy.ndarray` : The N x H x W x C array of image data.
+        """
+        return self._data
+
+    @property
+    def image_type(self):
+        """:obj:`type` : The Image subclass of the images in the batch.
+        """
+        return self._image_type
+
+    @property
+    def frame(self):
+        """:obj:`str` : The frame of reference of the images.
+        """
+        return self._frame
+
+    @property
+    def encoding(self):
+        """:obj:`str` : The channel storage mode of color images, or None for
+        other image types.
+        """
+        return self._encoding
+
+    @property
+    def shape(self):
+        """:obj:`tuple` of int : The shape of the data array.
+        """
+        return self._data.shape
+
+    @property
+    def num_images(self):
+        """int : The number of images in the batch.
+        """
+        return self._data.shape[0]
+
+    @property
+    def height(self):
+        """int : The height of each image.
+        """
+        return self._data.shape[1]
+
+    @property
+    def width(self):
+        """int : The width of each image.
+        """
+        return self._data.shape[2]
+
+    @property
+    def channels(self):
+        """int : The number of channels of each image.
+        """
+        return self._data.shape[3]
+
+    def __len__(self):
+        return self.num_images
+
+    def _new_image(self, data):
+        """Wraps image data with the type, frame and encoding of the batch."""
+        if self._encoding is not None:
+            return self._image_type(data, self._frame, encoding=self._encoding, copy=False)
+        return self._image_type(data, self._frame, copy=False)
+
+    def _new_batch(self, data, copy=False):
+        """Wraps a stack of image data with the type, frame and encoding of
+        the batch."""
+        return ImageBatch(data, self._image_type, self._frame, copy=copy,
+                          encoding=self._encoding)
+
+    def __getitem__(self, indices):
+        """Index the batch.
+
+        Parameters
+        ----------
+        indices : int, slice, or :obj:`numpy.ndarray`
+            * int - A single image index.
+            * slice or array - A subset of images.
+
+        Returns
+        -------
+        :obj:`Image` or :obj:`ImageBatch`
+            The image at an integer index, wrapping the batch data, or a
+            batch of the selected images.
+        """
+        if isinstance(indices, (int, np.integer)):
+            return self._new_image(self._data[indices])
+        return self._new_batch(self._data[indices])
+
+    def __iter__(self):
+        for i in range(self.num_images):
+            yield self[i]
+
+    def to_images(self):
+        """Split the batch into a list of images.
+
+        Returns
+        -------
+        :obj:`list` of :obj:`Image`
+            images wrapping the batch data
+        """
+        return [image for image in self]
+
+    def to_tensor(self, dtype=np.float32, num_channels=None):
+        """Export the batch as a tensor, e.g. for network inference.
+
+        Parameters
+        ----------
+        dtype : :obj:`numpy.dtype`
+            data type of the tensor
+        num_channels : int
+            number of channels in the tensor; single-channel images are
+            tiled to this many channels
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            N x H x W x num_channels array of image data
+
+        Raises
+        ------
+        ValueError
+            If the images cannot be converted to the number of channels.
+        """
+        if num_channels is None or num_channels == self.channels:
+            return self._data.astype(dtype)
+        if self.channels != 1:
+            raise ValueError('Cannot convert %d channel images to %d channels' %(self.channels, num_channels))
+        return np.repeat(self._data.astype(dtype), num_channels, axis=3)
+
+    def crop(self, height, width, center_i=None, center_j=None):
+        """Crop each image centered around center_i, center_j, padding
+        windows that extend past the border with zeros.
+
+        Parameters
+        ----------
+        height : int
+            The height of the desired images.
+
+        width : int
+            The width of the desired images.
+
+        center_i : float or :obj:`numpy.ndarray`
+            The center height point at which to crop, either shared by all
+            images or one per image. If not specified, the center of the
+            images is used.
+
+        center_j : float or :obj:`numpy.ndarray`
+            The center width point at which to crop, either shared by all
+            images or one per image. If not specified, the center of the
+            images is used.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            A batch of the cropped images.
+        """
+        # compute crop windows
+        height = int(np.round(height))
+        width = int(np.round(width))
+        if center_i is None:
+            center_i = float(self.height) / 2
+        if center_j is None:
+            center_j = float(self.width) / 2
+        center_i = np.broadcast_to(np.asarray(center_i, dtype=np.float64), [self.num_images])
+        center_j = np.broadcast_to(np.asarray(center_j, dtype=np.float64), [self.num_images])
+        start_rows = np.floor(center_i - float(height) / 2).astype(np.intp)
+        start_cols = np.floor(center_j - float(width) / 2).astype(np.intp)
+
+        # slice a shared window inside the images directly
+        if self.num_images > 0 and np.all(start_rows == start_rows[0]) and \
+           np.all(start_cols == start_cols[0]) and start_rows[0] >= 0 and \
+           start_cols[0] >= 0 and start_rows[0] + height <= self.height and \
+           start_cols[0] + width <= self.width:
+            crop_data = self._data[:, start_rows[0]:start_rows[0] + height,
+                                   start_cols[0]:start_cols[0] + width, :]
+            return self._new_batch(crop_data, copy=True)
+
+        # gather all windows at once, zeroing pixels outside the images
+        rows = start_rows[:, np.newaxis] + np.arange(height)
+        cols = start_cols[:, np.newaxis] + np.arange(width)
+        valid_px = ((rows >= 0) & (rows < self.height))[:, :, np.newaxis] & \
+                   ((cols >= 0) & (cols < self.width))[:, np.newaxis, :]
+        rows = np.clip(rows, 0, self.height - 1)
+        cols = np.clip(cols, 0, self.width - 1)
+        crop_data = self._data[np.arange(self.num_images)[:, np.newaxis, np.newaxis],
+                               rows[:, :, np.newaxis],
+                               cols[:, np.newaxis, :]]
+        crop_data[~valid_px] = 0
+        return self._new_batch(crop_data)
+
+    def resize(self, size, interp=None):
+        """Resize each image.
+
+        Parameters
+        ----------
+        size : int, float, or tuple
+            * int   - Percentage of current size.
+            * float - Fraction of current size.
+            * tuple - Size of the output images.
+
+        interp : :obj:`str`, optional
+            Interpolation to use for re-sizing ('nearest', 'lanczos', 'bilinear',
+            'bicubic', or 'cubic'). Defaults to 'nearest' for segmentation
+            images and 'bilinear' otherwise.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            A batch of the resized images.
+
+        Raises
+        ------
+        ValueError
+            If the interpolation method is not supported.
+        """
+        if interp is None:
+            interp = 'bilinear'
+            if self._image_type is SegmentationImage:
+                interp = 'nearest'
+        if interp not in CV_INTERP_METHODS.keys():
+            raise ValueError('Interpolation %s not supported' %(interp))
+
+        # compute output size
+        if isinstance(size, (int, np.integer)):
+            size = float(size) / 100
+        if isinstance(size, float):
+            new_height = int(self.height * size)
+            new_width = int(self.width * size)
+        else:
+            new_height = int(size[0])
+            new_width = int(size[1])
+
+        # resize the images as the channels of a single H x W x (N*C) array,
+        # in chunks of the maximum number of channels supported by OpenCV
+        num_images, height, width, channels = self._data.shape
+        stacked_data = self._data.transpose(1, 2, 0, 3).reshape(height, width, -1)
+        resized_data = np.zeros([new_height, new_width, stacked_data.shape[2]],
+                                dtype=self._data.dtype)
+        for start in range(0, stacked_data.shape[2], CV_MAX_CHANNELS):
+            end = min(start + CV_MAX_CHANNELS, stacked_data.shape[2])
+            resized_chunk = cv2.resize(np.ascontiguousarray(stacked_data[:, :, start:end]),
+                                       (new_width, new_height),
+                                       interpolation=CV_INTERP_METHODS[interp])
+            resized_data[:, :, start:end] = resized_chunk.reshape(new_height, new_width, -1)
+        resized_data = resized_data.reshape(new_height, new_width, num_images, channels)
+        return self._new_batch(np.ascontiguousarray(resized_data.transpose(2, 0, 1, 3)))
+
+    def threshold(self, front_thresh=0.0, rear_thresh=100.0):
+        """Sets all depths less than front_thresh and greater than rear_thresh
+        to 0 in a batch of depth images.
+
+        Parameters
+        ----------
+        front_thresh : float
+            The lower-bound threshold.
+
+        rear_thresh : float
+            The upper bound threshold.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            A new batch created from the thresholding operation.
+
+        Raises
+        ------
+        ValueError
+            If the batch does not contain depth images.
+        """
+        if self._image_type is not DepthImage:
+            raise ValueError('Thresholding is only supported for depth images')
+        data = np.copy(self._data)
+        data[(data < front_thresh) | (data > rear_thresh)] = 0.0
+        return self._new_batch(data)
+
+    def mask_binary(self, binary_im):
+        """Create a new batch by zeroing out data at locations where the
+        binary image is zero.
+
+        Parameters
+        ----------
+        binary_im : :obj:`BinaryImage` or :obj:`ImageBatch`
+            A single binary image applied to every image in the batch, or a
+            batch of binary images with one mask per image.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            A new batch of the same type, masked by the given binary images.
+
+        Raises
+        ------
+        ValueError
+            If the masks do not match the size of the images.
+        """
+        if isinstance(binary_im, ImageBatch):
+            if binary_im.num_images != self.num_images:
+                raise ValueError('Number of masks must match the number of images')
+            mask_data = binary_im.data
+        else:
+            mask_data = binary_im.raw_data
+        if mask_data.shape[-3:-1] != self._data.shape[1:3]:
+            raise ValueError('Mask must have the same height and width as the images')
+        data = self._data * (mask_data > 0)
+        return self._new_batch(data)
+
+    def to_binary(self, threshold=0.0):
+        """Creates a batch of binary images which are nonzero where the first
+        channel of each image is greater than threshold.
+
+        Parameters
+        ----------
+        threshold : float
+            The threshold.
+
+        Returns
+        -------
+        :obj:`ImageBatch`
+            A batch of BinaryImages.
+        """
+        data = BINARY_IM_MAX_VAL * (self._data[:, :, :, :1] > threshold)
+        return ImageBatch(data.astype(np.uint8), BinaryImage, self._frame, copy=False)
+
+    def median(self):
+        """Create an image whose data is the median of the images in the batch.
+
+        Returns
+        -------
+        :obj:`Image`
+            the median image
+        """
+        median_data = np.median(self._data, axis=0)
+        return self._new_image(median_data.astype(self._data.dtype))
+
+    def mean(self, ignore_zeros=False):
+        """Create an image whose data is the mean of the images in the batch.
+
+        Parameters
+        ----------
+        ignore_zeros : bool
+            If True, only nonzero values are averaged, and pixels that are zero
+            in every image remain zero.
+
+        Returns
+        -------
+        :obj:`Image`
+            the mean image
+        """
+        if not ignore_zeros:
+            mean_data = np.mean(self._data, axis=0)
+        else:
+            num_nonzero = np.count_nonzero(self._data, axis=0)
+            mean_data = np.sum(self._data, axis=0, dtype=np.float64)
+            mean_data = np.divide(mean_data, num_nonzero, out=np.zeros_like(mean_data),
+                                  where=num_nonzero > 0)
+        return self._new_image(mean_data.astype(self._data.dtype))
+
+    def min(self):
+        """Create an image whose data is the min of the nonzero values of the
+        images in the batch, or zero where all images are zero.
+
+        Returns
+        -------
+        :obj:`Image`
+            the min image
+        """
+        if np.issubdtype(self._data.dtype, np.floating):
+            max_val = np.inf
+        else:
+            max_val = np.iinfo(self._data.dtype).max
+        zero_px = self._data == 0
+        min_data = np.min(np.where(zero_px, max_val, self._data), axis=0)
+        min_data[np.all(zero_px, axis=0)] = 0
+        return self._new_image(min_data.astype(self._data.dtype))
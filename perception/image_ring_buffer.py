@@ -0,0 +1,65 @@
+"""
+Ring buffer of images for the stream_image_buffer ROS node.
+"""
+import threading
+
+import numpy as np
+
+class ImageRingBuffer(object):
+    """ Preallocated circular buffer of images in the stream's native dtype.
+
+    Frames are written in order of decreasing index, so the newest N frames
+    are slots head, head + 1, ..., head + N - 1 modulo bufsize, newest first.
+    """
+    def __init__(self, bufsize):
+        self.bufsize = bufsize
+        self.images = None
+        self.times = np.zeros(bufsize)
+        self.served = np.zeros(bufsize, dtype=bool)
+        self.head = 0
+        self.num_filled = 0
+        self.num_received = 0
+        self.num_dropped = 0
+        self.num_rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """ Memory used by the image buffer in bytes """
+        if self.images is None:
+            return 0
+        return self.images.nbytes
+
+    def add(self, image, timestamp):
+        """ Writes an image to the buffer, overwriting the oldest image when full """
+        if len(image.shape) == 2:
+            image = image[:, :, np.newaxis]
+        with self.lock:
+            # allocate on the first frame, once the shape and dtype are known
+            if self.images is None:
+                self.images = np.zeros((self.bufsize,) + image.shape, dtype=image.dtype)
+            if image.shape != self.images.shape[1:] or image.dtype != self.images.dtype:
+                self.num_rejected += 1
+                return
+
+            self.head = (self.head - 1) % self.bufsize
+            if self.num_filled == self.bufsize and not self.served[self.head]:
+                self.num_dropped += 1
+            self.images[self.head] = image
+            self.times[self.head] = timestamp
+            self.served[self.head] = False
+            self.num_filled = min(self.num_filled + 1, self.bufsize)
+            self.num_received += 1
+
+    def latest(self, num_images):
+        """ Returns copies of the newest num_images images and timestamps, newest first.
+        The images are gathered into one contiguous array under the lock, so
+        frames added concurrently never tear the returned images. """
+        with self.lock:
+            if num_images > self.num_filled:
+                raise RuntimeError("Number of images requested exceeds current buffer size")
+            inds = (self.head + np.arange(num_images)) % self.bufsize
+            self.served[inds] = True
+            images = np.take(self.images, inds, axis=0)
+            times = np.take(self.times, inds)
+        return images, times
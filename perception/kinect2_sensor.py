@@ -26,6 +26,7 @@ except ImportError:
 from .constants import MM_TO_METERS, INTR_EXTENSION
 from .camera_intrinsics import CameraIntrinsics
 from .camera_sensor import CameraSensor
+from .frame_synchronizer import FrameSynchronizer
 from .image import ColorImage, DepthImage, IrImage, Image
 
 class Kinect2PacketPipelineMode:
@@ -255,27 +256,6 @@ class Kinect2Sensor(CameraSensor):
         color_im, depth_im, ir_im, _ = self._frames_and_index_map(skip_registration=skip_registration)
         return color_im, depth_im, ir_im
 
-    def median_depth_img(self, num_img=1):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        return Image.median_images(depths)
-
     def _frames_and_index_map(self, skip_registration=False):
         """Retrieve a new frame from the Kinect and return a ColorImage,
         DepthImage, IrImage, and a map from depth pixels to color pixel indices.
@@ -344,7 +324,8 @@ class KinectSensorBridged(CameraSensor):
     because the kinect bridge will continuously publish image and point cloud info.
     """
 
-    def __init__(self, quality=Kinect2BridgedQuality.HD, frame='kinect2_rgb_optical_frame'):
+    def __init__(self, quality=Kinect2BridgedQuality.HD, frame='kinect2_rgb_optical_frame',
+                 sync_slop=0.05):
         """Initialize a Kinect v2 sensor which connects to the iai_kinect2 bridge
         ----------
         quality : :obj:`str`
@@ -352,6 +333,9 @@ class KinectSensorBridged(CameraSensor):
         frame : :obj:`str`
             The name of the frame of reference in which the sensor resides.
             If None, this will be set to 'kinect2_rgb_optical_frame'
+        sync_slop : float
+            Maximum difference in seconds between the timestamps of paired
+            color and depth images.
        """
         # set member vars
         self._frame = frame
@@ -363,7 +347,7 @@ class KinectSensorBridged(CameraSensor):
         self._initialized = False
         self._format = None
         self._camera_intr = None
-        self._cur_depth_im = None
+        self._frame_sync = FrameSynchronizer(['color', 'depth'], slop=sync_slop)
         self._running = False
         self._bridge = CvBridge()
         
@@ -408,7 +392,8 @@ class KinectSensorBridged(CameraSensor):
         """ subscribe to image topic and keep it up to date
         """
         color_arr = self._process_image_msg(image_msg)
-        self._cur_color_im = ColorImage(color_arr[:,:,::-1], self._frame)
+        color_im = ColorImage(color_arr[:,:,::-1], self._frame)
+        self._frame_sync.add('color', image_msg.header.stamp.to_sec(), color_im)
  
     def _depth_image_callback(self, image_msg):
         """ subscribe to depth image topic and keep it up to date
@@ -416,12 +401,12 @@ class KinectSensorBridged(CameraSensor):
         encoding = image_msg.encoding
         try:
             depth_arr = self._bridge.imgmsg_to_cv2(image_msg, encoding)
-            import pdb; pdb.set_trace()
-
         except CvBridgeError as e:
             rospy.logerr(e)
+            return
         depth = np.array(depth_arr*MM_TO_METERS, np.float32)
-        self._cur_depth_im = DepthImage(depth, self._frame)
+        depth_im = DepthImage(depth, self._frame, copy=False)
+        self._frame_sync.add('depth', image_msg.header.stamp.to_sec(), depth_im)
 
     def _camera_info_callback(self, msg):
         """ Callback for reading camera info. """
@@ -498,44 +483,12 @@ class KinectSensorBridged(CameraSensor):
         RuntimeError
             If the Kinect stream is not running.
         """
-        # wait for a new image
-        while self._cur_depth_im is None or self._cur_color_im is None:
-            time.sleep(0.01)
-            
-        # read next image
-        depth_im = self._cur_depth_im
-        color_im = self._cur_color_im
-
-        self._cur_color_im = None
-        self._cur_depth_im = None
+        # wait for a new pair of images with matching timestamps
+        (color_im, depth_im), _ = self._frame_sync.wait()
 
         #TODO add ir image
         return color_im, depth_im, None
 
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
-
-
 class VirtualKinect2Sensor(CameraSensor):
     """Class for a virtual Kinect v2 sensor that uses pre-captured images
     stored to disk instead of actually connecting to a sensor.
@@ -708,27 +661,6 @@ class VirtualKinect2Sensor(CameraSensor):
         self._im_index += 1
         return color_im, depth_im, ir_im
 
-    def median_depth_img(self, num_img=1):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        return Image.median_images(depths)
-
 class Kinect2SensorFactory:
     """ Factory class for Kinect2 sensors. """
 
@@ -35,10 +35,13 @@ class OpenCVCameraSensor(CameraSensor):
 
     def frames(self, flush=True):
         """ Returns the latest color image from the stream
+        Args:
+            flush: whether to discard stale buffered frames before reading
         Raises:
             Exception if opencv sensor gives ret_val of 0
         """
-        self.flush()
+        if flush:
+            self.flush()
         ret_val, frame = self._sensor.read()
         if not ret_val:
             raise Exception("Unable to retrieve frame from OpenCVCameraSensor for id {0}".format(self._device_id))
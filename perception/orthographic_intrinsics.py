@@ -10,6 +10,7 @@ import os
 
 from autolab_core import Point, PointCloud, ImageCoords
 
+from .camera_intrinsics import rasterize_depth
 from .constants import INTR_EXTENSION
 from .image import DepthImage, PointCloudImage
 
@@ -67,7 +68,7 @@ class OrthographicIntrinsics(object):
     def plane_height(self):
         """float : The height of the projection plane in pixels.
         """
-        return self._height
+        return self._plane_height
 
     @property
     def plane_width(self):
@@ -135,11 +136,8 @@ class OrthographicIntrinsics(object):
         if point_cloud.frame != self._frame:
             raise ValueError('Cannot project points in frame %s into camera with frame %s' %(point_cloud.frame, self._frame))
 
-        points_proj = self.S.dot(point_cloud.data) + self.t
-        if len(points_proj.shape) == 1:
-            points_proj = points_proj[:, np.newaxis]
-        point_depths = np.tile(points_proj[2,:], [3, 1])
-        points_proj = np.divide(points_proj, point_depths)
+        # orthographic projection scales and offsets points without a perspective divide
+        points_proj = self.S.dot(point_cloud.data.reshape(3, -1)) + self.t[:, np.newaxis]
         if round_px:
             points_proj = np.round(points_proj)
 
@@ -147,10 +145,11 @@ class OrthographicIntrinsics(object):
             return Point(data=points_proj[:2,:].astype(np.int16), frame=self._frame)
         return ImageCoords(data=points_proj[:2,:].astype(np.int16), frame=self._frame)
 
-    def project_to_image(self, point_cloud, round_px=True):
+    def project_to_image(self, point_cloud, round_px=True, splat_size=1, out=None):
         """Projects a point cloud onto the camera image plane and creates
         a depth image. Zero depth means no point projected into the camera
-        at that pixel location (i.e. infinite depth).
+        at that pixel location (i.e. infinite depth). When several points
+        project to the same pixel the closest one is kept.
 
         Parameters
         ----------
@@ -160,6 +159,14 @@ class OrthographicIntrinsics(object):
         round_px : bool
             If True, projections are rounded to the nearest pixel.
 
+        splat_size : int
+            The side length in pixels of the square footprint each point is
+            drawn into. Values greater than one fill holes in sparse clouds.
+
+        out : :obj:`numpy.ndarray` of float32
+            Optional contiguous height x width buffer to render into. Nonzero
+            depths already in the buffer take part in the depth test.
+
         Returns
         -------
         :obj:`DepthImage`
@@ -177,23 +184,16 @@ class OrthographicIntrinsics(object):
         if point_cloud.frame != self._frame:
             raise ValueError('Cannot project points in frame %s into camera with frame %s' %(point_cloud.frame, self._frame))
 
-        points_proj = self.S.dot(point_cloud.data) + self.t
-        if len(points_proj.shape) == 1:
-            points_proj = points_proj[:, np.newaxis]
+        points_proj = self.S.dot(point_cloud.data.reshape(3, -1)) + self.t[:, np.newaxis]
         point_depths = points_proj[2,:]
-        point_z = np.tile(point_depths, [3, 1])
-        points_proj = np.divide(points_proj, point_z)
+        points_proj = points_proj[:2,:]
         if round_px:
             points_proj = np.round(points_proj)
-        points_proj = points_proj[:2,:].astype(np.int16)
-
-        valid_ind = np.where((points_proj[0,:] >= 0) & \
-                             (points_proj[1,:] >= 0) & \
-                             (points_proj[0,:] < self.width) & \
-                             (points_proj[1,:] < self.height))[0]
 
-        depth_data = np.zeros([self.height, self.width])
-        depth_data[points_proj[1,valid_ind], points_proj[0,valid_ind]] = point_depths[valid_ind]
+        depth_data = rasterize_depth(points_proj, point_depths,
+                                     int(self._plane_height),
+                                     int(self._plane_width),
+                                     splat_size=splat_size, out=out)
         return DepthImage(depth_data, frame=self.frame)
 
     def deproject(self, depth_image):
@@ -1,5 +1,6 @@
 import time
 import logging
+import threading
 
 import numpy as np
 
@@ -13,12 +14,20 @@ except ImportError:
     logging.warning("Failed to import ROS in phoxi_sensor.py. PhoXiSensor functionality unavailable.")
 
 from . import CameraSensor, DepthImage, ColorImage, GrayscaleImage, CameraIntrinsics, Image, SensorUnresponsiveException
+from .frame_synchronizer import FrameSynchronizer
 
 class PhoXiSensor(CameraSensor):
     """Class for interfacing with a PhoXi Structured Light Sensor.
     """
-
-    def __init__(self, frame='phoxi', device_name='2018-02-020-LC3', size='small'):
+    MAX_WAIT_TIME = 5.0
+    MATCH_QUEUE_SIZE = 4
+    STOP_TIMEOUT = 5.0
+    MIN_TRIGGER_BACKOFF = 0.1
+    MAX_TRIGGER_BACKOFF = 2.0
+    MAX_TRIGGER_FAILURES = 5
+
+    def __init__(self, frame='phoxi', device_name='2018-02-020-LC3', size='small',
+                 pipelined=False):
         """Initialize a PhoXi Sensor.
 
         Parameters
@@ -32,6 +41,10 @@ class PhoXiSensor(CameraSensor):
         size : str
             An indicator for which size of image is desired.
             Either 'large' (2064x1544) or 'small' (1032x772).
+        pipelined : bool
+            If True, frames() queues the next scan on a background thread
+            before waiting for the current one, so that the next scan is
+            acquired while the current frame is delivered and processed.
         """
 
         self._frame = frame
@@ -40,9 +53,24 @@ class PhoXiSensor(CameraSensor):
         self._running = False
         self._bridge = CvBridge()
 
-        self._cur_color_im = None
-        self._cur_depth_im = None
-        self._cur_normal_map = None
+        self._pipelined = pipelined
+        self._frame_sync = FrameSynchronizer(['color', 'depth', 'normal'],
+                                             match_queue_size=PhoXiSensor.MATCH_QUEUE_SIZE)
+
+        # persistent service proxies, created on start
+        self._srv_lock = threading.Lock()
+        self._start_acquisition_srv = None
+        self._trigger_image_srv = None
+        self._get_frame_srv = None
+
+        # background triggering for pipelined and streaming modes
+        self._trigger_cond = threading.Condition()
+        self._trigger_thread = None
+        self._num_trigger_requests = 0
+        self._num_pending = 0
+        self._streaming = False
+        self._num_trigger_failures = 0
+        self._trigger_error = None
 
         # Set up camera intrinsics for the sensor
         width, height = 2064, 1544
@@ -87,6 +115,12 @@ class PhoXiSensor(CameraSensor):
         """
         return self._running
 
+    @property
+    def is_streaming(self):
+        """bool : True if frames are being triggered continuously, or false otherwise.
+        """
+        return self._streaming
+
     @property
     def frame(self):
         """str : The reference frame of the sensor.
@@ -121,7 +155,17 @@ class PhoXiSensor(CameraSensor):
         self._depth_im_sub = rospy.Subscriber('/phoxi_camera/depth_map', ImageMessage, self._depth_im_callback)
         self._normal_map_sub = rospy.Subscriber('/phoxi_camera/normal_map', ImageMessage, self._normal_map_callback)
 
+        # Set up persistent service connections and the trigger thread
+        self._create_service_proxies()
+        self._frame_sync.clear()
+        self._num_trigger_requests = 0
+        self._num_pending = 0
+        self._num_trigger_failures = 0
+        self._trigger_error = None
         self._running = True
+        self._trigger_thread = threading.Thread(target=self._trigger_loop)
+        self._trigger_thread.daemon = True
+        self._trigger_thread.start()
 
         return True
 
@@ -133,6 +177,17 @@ class PhoXiSensor(CameraSensor):
             logging.warning('PhoXi not running. Aborting stop')
             return False
 
+        # Stop the trigger thread
+        with self._trigger_cond:
+            self._running = False
+            self._streaming = False
+            self._trigger_cond.notify_all()
+        self._trigger_thread.join(PhoXiSensor.STOP_TIMEOUT)
+        if self._trigger_thread.is_alive():
+            logging.warning('PhoXi trigger thread did not stop within %.3f sec' %(PhoXiSensor.STOP_TIMEOUT))
+        self._trigger_thread = None
+        self._close_service_proxies()
+
         # Stop the subscribers
         self._color_im_sub.unregister()
         self._depth_im_sub.unregister()
@@ -141,62 +196,204 @@ class PhoXiSensor(CameraSensor):
         # Disconnect from the camera
         rospy.ServiceProxy('phoxi_camera/disconnect_camera', Empty)()
 
-        self._running = False
-
         return True
 
     def frames(self):
         """Retrieve a new frame from the PhoXi and convert it to a ColorImage,
         a DepthImage, and an IrImage.
 
+        In streaming mode this returns the oldest frame not yet read, and in
+        pipelined mode the frame triggered by the previous call.
+
         Returns
         -------
         :obj:`tuple` of :obj:`ColorImage`, :obj:`DepthImage`, :obj:`IrImage`, :obj:`numpy.ndarray`
             The ColorImage, DepthImage, and IrImage of the current frame.
-        """
-        # Run a software trigger
-        times = []
 
-        rospy.ServiceProxy('phoxi_camera/start_acquisition', Empty)()
-        rospy.ServiceProxy('phoxi_camera/trigger_image', TriggerImage)()
-
-        self._cur_color_im = None
-        self._cur_depth_im = None
-        self._cur_normal_map = None
-
-        rospy.ServiceProxy('phoxi_camera/get_frame', GetFrame)(-1)
+        Raises
+        ------
+        SensorUnresponsiveException
+            If the frame does not arrive in time, or if streaming stopped
+            because the sensor could not be triggered.
+        """
+        self._raise_trigger_error()
+        if self._streaming:
+            return self._wait_for_frame()
+
+        if self._pipelined:
+            # trigger this frame if it was not triggered by the last call,
+            # then queue the next scan behind it
+            with self._trigger_cond:
+                if self._num_pending == 0:
+                    self._request_trigger()
+                self._request_trigger()
+            return self._wait_for_frame()
 
-        max_time = 5.0
-        time_waiting = 0.0
-        while self._cur_color_im is None or self._cur_depth_im is None or self._cur_normal_map is None:
-            time.sleep(0.05)
-            time_waiting += 0.05
-            if time_waiting > max_time:
-                raise SensorUnresponsiveException('PhoXi sensor seems to be non-responsive')
-        return self._cur_color_im, self._cur_depth_im, None
+        # Run a software trigger
+        self._frame_sync.clear()
+        with self._trigger_cond:
+            self._num_pending = 1
+        self._trigger_frame()
+        return self._wait_for_frame()
+
+    def start_streaming(self):
+        """Trigger frames continuously in the background. Frames are read
+        with frames() or stream(), and the oldest unread frames are dropped
+        if they are not read as fast as they arrive.
+        """
+        if not self._running:
+            raise RuntimeError('PhoXi not running. Cannot stream frames')
+        with self._trigger_cond:
+            self._frame_sync.clear()
+            self._num_trigger_requests = 0
+            self._num_trigger_failures = 0
+            self._trigger_error = None
+            self._streaming = True
+            self._trigger_cond.notify_all()
+
+    def stop_streaming(self):
+        """Stop triggering frames continuously.
+        """
+        with self._trigger_cond:
+            self._streaming = False
+            self._num_pending = 0
 
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
+    def stream(self, num_frames=None):
+        """Yield frames continuously as they arrive.
 
         Parameters
         ----------
-        num_img : int
-            The number of consecutive frames to process.
+        num_frames : int
+            The number of frames to yield, or None to stream until
+            stop_streaming() is called.
 
         Returns
         -------
-        DepthImage
-            The median DepthImage collected from the frames.
+        :obj:`tuple` of :obj:`ColorImage`, :obj:`DepthImage`, :obj:`IrImage`
+            The frames, one set per iteration.
+
+        Raises
+        ------
+        SensorUnresponsiveException
+            If a frame does not arrive in time, or if streaming stopped
+            because the sensor could not be triggered.
         """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
+        stop = not self._streaming
+        if stop:
+            self.start_streaming()
+        try:
+            i = 0
+            while self._streaming and (num_frames is None or i < num_frames):
+                yield self._wait_for_frame()
+                i += 1
+            self._raise_trigger_error()
+        finally:
+            if stop:
+                self.stop_streaming()
+
+    def _create_service_proxies(self):
+        """Open persistent connections to the frame acquisition services.
+        """
+        self._start_acquisition_srv = rospy.ServiceProxy('phoxi_camera/start_acquisition', Empty, persistent=True)
+        self._trigger_image_srv = rospy.ServiceProxy('phoxi_camera/trigger_image', TriggerImage, persistent=True)
+        self._get_frame_srv = rospy.ServiceProxy('phoxi_camera/get_frame', GetFrame, persistent=True)
 
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
+    def _close_service_proxies(self):
+        """Close the persistent service connections.
+        """
+        for srv in [self._start_acquisition_srv, self._trigger_image_srv, self._get_frame_srv]:
+            if srv is not None:
+                srv.close()
+        self._start_acquisition_srv = None
+        self._trigger_image_srv = None
+        self._get_frame_srv = None
+
+    def _trigger_frame(self):
+        """Run a software trigger and request the resulting frame, which is
+        delivered on the image topics. Persistent connections are reopened
+        once if they were dropped.
+        """
+        with self._srv_lock:
+            for attempt in range(2):
+                try:
+                    self._start_acquisition_srv()
+                    self._trigger_image_srv()
+                    self._get_frame_srv(-1)
+                    return
+                except rospy.ServiceException as e:
+                    if attempt > 0:
+                        raise
+                    logging.warning('PhoXi service call failed, reconnecting: {}'.format(e))
+                    self._close_service_proxies()
+                    self._create_service_proxies()
+
+    def _request_trigger(self):
+        """Queue a trigger on the background thread. The trigger condition
+        is reentrant, so callers may already hold it.
+        """
+        with self._trigger_cond:
+            self._num_trigger_requests += 1
+            self._num_pending += 1
+            self._trigger_cond.notify_all()
+
+    def _trigger_loop(self):
+        """Runs queued triggers, or triggers continuously while streaming.
+        Failed triggers are retried after an exponential backoff, and
+        streaming stops after MAX_TRIGGER_FAILURES consecutive failures.
+        """
+        backoff = PhoXiSensor.MIN_TRIGGER_BACKOFF
+        while True:
+            with self._trigger_cond:
+                while self._running and not self._streaming and self._num_trigger_requests == 0:
+                    self._trigger_cond.wait()
+                if not self._running:
+                    return
+                if self._num_trigger_requests > 0:
+                    self._num_trigger_requests -= 1
+            try:
+                self._trigger_frame()
+            except rospy.ServiceException as e:
+                logging.error('PhoXi trigger failed: {}'.format(e))
+                with self._trigger_cond:
+                    self._num_trigger_failures += 1
+                    if self._streaming and self._num_trigger_failures >= PhoXiSensor.MAX_TRIGGER_FAILURES:
+                        logging.error('PhoXi trigger failed {} times in a row, stopping streaming'.format(self._num_trigger_failures))
+                        self._trigger_error = e
+                        self._streaming = False
+                        self._num_pending = 0
+                    self._trigger_cond.notify_all()
+
+                    # wait before retrying, unless the sensor is stopped
+                    if self._running:
+                        self._trigger_cond.wait(backoff)
+                backoff = min(2 * backoff, PhoXiSensor.MAX_TRIGGER_BACKOFF)
+                continue
+            with self._trigger_cond:
+                self._num_trigger_failures = 0
+            backoff = PhoXiSensor.MIN_TRIGGER_BACKOFF
+
+    def _raise_trigger_error(self):
+        """Raise the error that stopped streaming, if any, once.
+        """
+        with self._trigger_cond:
+            error = self._trigger_error
+            self._trigger_error = None
+        if error is not None:
+            raise SensorUnresponsiveException('PhoXi streaming stopped after repeated trigger failures: {}'.format(error))
+
+    def _wait_for_frame(self):
+        """Wait for the texture, depth map and normal map of the next frame.
+        """
+        try:
+            (color_im, depth_im, _), _ = self._frame_sync.wait(timeout=PhoXiSensor.MAX_WAIT_TIME)
+        except SensorUnresponsiveException:
+            with self._trigger_cond:
+                self._num_pending = 0
+            self._raise_trigger_error()
+            raise SensorUnresponsiveException('PhoXi sensor seems to be non-responsive')
+        with self._trigger_cond:
+            self._num_pending = max(self._num_pending - 1, 0)
+        return color_im, depth_im, None
 
     def _connect_to_sensor(self):
         """Connect to the sensor.
@@ -231,22 +428,24 @@ class PhoXiSensor(CameraSensor):
                 data = 255.0 * data / 1200.0 # Experimentally set value for white
             data = np.clip(data, 0., 255.0).astype(np.uint8)
             gsimage = GrayscaleImage(data, frame=self._frame)
-            self._cur_color_im = gsimage.to_color()
+            self._frame_sync.add('color', msg.header.stamp.to_sec(), gsimage.to_color())
         except:
-            self._cur_color_im = None
+            logging.warning('Failed to convert PhoXi texture')
 
     def _depth_im_callback(self, msg):
         """Callback for handling depth images.
         """
         try:
-            self._cur_depth_im = DepthImage(self._bridge.imgmsg_to_cv2(msg) / 1000.0, frame=self._frame)
+            depth_im = DepthImage(self._bridge.imgmsg_to_cv2(msg) / 1000.0, frame=self._frame)
+            self._frame_sync.add('depth', msg.header.stamp.to_sec(), depth_im)
         except:
-            self._cur_depth_im = None
+            logging.warning('Failed to convert PhoXi depth map')
 
     def _normal_map_callback(self, msg):
         """Callback for handling normal maps.
         """
         try:
-            self._cur_normal_map = self._bridge.imgmsg_to_cv2(msg)
+            normal_map = self._bridge.imgmsg_to_cv2(msg)
+            self._frame_sync.add('normal', msg.header.stamp.to_sec(), normal_map)
         except:
-            self._cur_normal_map = None
+            logging.warning('Failed to convert PhoXi normal map')
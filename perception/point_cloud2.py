@@ -0,0 +1,86 @@
+"""
+Decoding of sensor_msgs/PointCloud2 payloads into numpy arrays.
+"""
+import numpy as np
+
+# numpy types for the sensor_msgs/PointField datatype codes
+POINT_FIELD_DTYPES = {
+    1: np.int8,
+    2: np.uint8,
+    3: np.int16,
+    4: np.uint16,
+    5: np.int32,
+    6: np.uint32,
+    7: np.float32,
+    8: np.float64
+}
+
+def pointcloud2_dtype(fields, point_step, is_bigendian=False):
+    """Builds a structured dtype for the points of a PointCloud2 message.
+
+    Parameters
+    ----------
+    fields : :obj:`list` of :obj:`sensor_msgs.msg.PointField`
+        the fields of the message, with name, offset, datatype and count
+    point_step : int
+        the number of bytes per point, including padding
+    is_bigendian : bool
+        whether the data is big endian
+
+    Returns
+    -------
+    :obj:`numpy.dtype`
+        structured dtype with one named entry per field at its byte offset
+
+    Raises
+    ------
+    ValueError
+        If a field has an unknown datatype.
+    """
+    byte_order = '>' if is_bigendian else '<'
+    names = []
+    formats = []
+    offsets = []
+    for field in fields:
+        if field.datatype not in POINT_FIELD_DTYPES.keys():
+            raise ValueError('Unknown datatype %d for field %s' %(field.datatype, field.name))
+        field_dtype = np.dtype(POINT_FIELD_DTYPES[field.datatype]).newbyteorder(byte_order)
+        if field.count != 1:
+            field_dtype = np.dtype((field_dtype, (field.count,)))
+        names.append(field.name)
+        formats.append(field_dtype)
+        offsets.append(field.offset)
+    return np.dtype({'names': names,
+                     'formats': formats,
+                     'offsets': offsets,
+                     'itemsize': point_step})
+
+def pointcloud2_to_array(msg):
+    """Views the payload of a PointCloud2 message as a structured array
+    without copying it. Individual fields, e.g. arr['z'], are strided views.
+
+    Parameters
+    ----------
+    msg : :obj:`sensor_msgs.msg.PointCloud2`
+        the message to decode
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        height x width structured array with one entry per message field
+
+    Raises
+    ------
+    ValueError
+        If the payload is too small for the message dimensions.
+    """
+    dtype = pointcloud2_dtype(msg.fields, msg.point_step, msg.is_bigendian)
+    if len(msg.data) < msg.height * msg.row_step or msg.row_step < msg.width * msg.point_step:
+        raise ValueError('PointCloud2 payload does not match the message dimensions')
+
+    # view the points with strides that skip any padding at the end of each row
+    buf = np.frombuffer(msg.data, dtype=np.uint8, count=msg.height * msg.row_step)
+    if buf.size == 0:
+        return np.zeros([msg.height, msg.width], dtype=dtype)
+    return np.ndarray(shape=(msg.height, msg.width), dtype=dtype, buffer=buf,
+                      strides=(msg.row_step, msg.point_step))
@@ -74,12 +74,21 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
         weight of point-to-point objective relative to point-to-plane objective
     mu : float
         regularizer for matrix inversion in the Gauss-Newton step
+    use_float32 : bool
+        whether or not to assemble the Gauss-Newton step in single precision
+    convergence_thresh : float
+        stop iterating once the norm of the Gauss-Newton step falls below this value
     """
-    def __init__(self, sample_size=100, cost_sample_size=100, gamma=100.0, mu=1e-2):
+    def __init__(self, sample_size=100, cost_sample_size=100, gamma=100.0, mu=1e-2,
+                 use_float32=False, convergence_thresh=None):
         self.sample_size_ = sample_size
         self.cost_sample_size_ = cost_sample_size
         self.gamma_ = gamma
         self.mu_ = mu
+        self.dtype_ = np.float64
+        if use_float32:
+            self.dtype_ = np.float32
+        self.convergence_thresh_ = convergence_thresh
         IterativeRegistrationSolver.__init__(self)
     
     def register(self, source_point_cloud, target_point_cloud,
@@ -181,25 +190,26 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
                 break
 
             # create A and b matrices for Gauss-Newton step on joint cost function
-            A = np.zeros([6,6])
-            b = np.zeros([6,1])
-            Ap = np.zeros([6,6])
-            bp = np.zeros([6,1])
-            G = np.zeros([3,6])
-            G[:,3:] = np.eye(3)
-
-            for i in range(num_corrs):
-                s = source_corr_points[i:i+1,:].T
-                t = target_corr_points[i:i+1,:].T
-                n = target_corr_normals[i:i+1,:].T
-                G[:,:3] = skew(s).T
-                A += G.T.dot(n).dot(n.T).dot(G)
-                b += G.T.dot(n).dot(n.T).dot(t - s)
-
-                Ap += G.T.dot(G)
-                bp += G.T.dot(t - s)
+            # using the Jacobian G = [skew(s).T, I] of every correspondence
+            s = source_corr_points.astype(self.dtype_)
+            d = target_corr_points.astype(self.dtype_) - s
+            n = target_corr_normals.astype(self.dtype_)
+            G = np.zeros([num_corrs, 3, 6], dtype=self.dtype_)
+            G[:,0,1] = s[:,2]
+            G[:,0,2] = -s[:,1]
+            G[:,1,0] = -s[:,2]
+            G[:,1,2] = s[:,0]
+            G[:,2,0] = s[:,1]
+            G[:,2,1] = -s[:,0]
+            G[:,:,3:] = np.eye(3, dtype=self.dtype_)
+
+            Gn = np.einsum('kij,ki->kj', G, n)
+            A = Gn.T.dot(Gn)
+            b = Gn.T.dot(np.sum(n * d, axis=1))[:,np.newaxis]
+            Ap = np.einsum('kij,kil->jl', G, G)
+            bp = np.einsum('kij,ki->j', G, d)[:,np.newaxis]
             v = np.linalg.solve(A + self.gamma_*Ap + self.mu_*np.eye(6),
-                                b + self.gamma_*bp)
+                                b + self.gamma_*bp).astype(np.float64)
 
             # create pose values from the solution
             R = np.eye(3)
@@ -212,6 +222,11 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
             R_sol = R.dot(R_sol)
             t_sol = R.dot(t_sol) + t
 
+            # check convergence
+            if self.convergence_thresh_ is not None and np.linalg.norm(v) < self.convergence_thresh_:
+                logging.info('Point to plane ICP converged after %d iterations' %(i+1))
+                break
+
         T_source_target = RigidTransform(R_sol, t_sol, from_frame=source_point_cloud.frame, to_frame=target_point_cloud.frame)
 
         total_cost = 0
@@ -232,7 +247,7 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
             target_corr_normals = corrs.target_normals[corrs.index_map[valid_corrs], :]
 
             # determine total cost
-            source_target_alignment = np.diag((source_corr_points - target_corr_points).dot(target_corr_normals.T))
+            source_target_alignment = np.sum((source_corr_points - target_corr_points) * target_corr_normals, axis=1)
             point_plane_cost = (1.0 / num_corrs) * np.sum(source_target_alignment * source_target_alignment)
             point_dist_cost = (1.0 / num_corrs) * np.sum(np.linalg.norm(source_corr_points - target_corr_points, axis=1)**2)
             total_cost = point_plane_cost + self.gamma_ * point_dist_cost
@@ -333,26 +348,22 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
                 break
 
             # create A and b matrices for Gauss-Newton step on joint cost function
-            A = np.zeros([3,3]) # A and b for point to plane cost
-            b = np.zeros([3,1])
-            Ap = np.zeros([3,3]) # A and b for point to point cost
-            bp = np.zeros([3,1])
-            G = np.zeros([3,3])
-            G[:2,1:] = np.eye(2)
-
-            for i in range(num_corrs):
-                s = source_corr_points[i:i+1,:].T
-                t = target_corr_points[i:i+1,:].T
-                n = target_corr_normals[i:i+1,:].T
-                G[0,0] = -s[1] 
-                G[1,0] = s[0]
-                A += G.T.dot(n).dot(n.T).dot(G)
-                b += G.T.dot(n).dot(n.T).dot(t - s)
-
-                Ap += G.T.dot(G)
-                bp += G.T.dot(t - s)
+            # using the Jacobian G = [[-s_y, 1, 0], [s_x, 0, 1], [0, 0, 0]] of every correspondence
+            s = source_corr_points.astype(self.dtype_)
+            d = target_corr_points.astype(self.dtype_) - s
+            n = target_corr_normals.astype(self.dtype_)
+            G = np.zeros([num_corrs, 3, 3], dtype=self.dtype_)
+            G[:,0,0] = -s[:,1]
+            G[:,1,0] = s[:,0]
+            G[:,:2,1:] = np.eye(2, dtype=self.dtype_)
+
+            Gn = np.einsum('kij,ki->kj', G, n)
+            A = Gn.T.dot(Gn) # A and b for point to plane cost
+            b = Gn.T.dot(np.sum(n * d, axis=1))[:,np.newaxis]
+            Ap = np.einsum('kij,kil->jl', G, G) # A and b for point to point cost
+            bp = np.einsum('kij,ki->j', G, d)[:,np.newaxis]
             v = np.linalg.solve(A + self.gamma_*Ap + self.mu_*np.eye(3),
-                                b + self.gamma_*bp)
+                                b + self.gamma_*bp).astype(np.float64)
 
             # create pose values from the solution
             R = np.eye(3)
@@ -365,6 +376,11 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
             R_sol = R.dot(R_sol)
             t_sol = R.dot(t_sol) + t
 
+            # check convergence
+            if self.convergence_thresh_ is not None and np.linalg.norm(v) < self.convergence_thresh_:
+                logging.info('Point to plane ICP converged after %d iterations' %(i+1))
+                break
+
         # compute solution transform
         T_source_target = RigidTransform(R_sol, t_sol, from_frame=source_point_cloud.frame, to_frame=target_point_cloud.frame)
 
@@ -395,7 +411,7 @@ class PointToPlaneICPSolver(IterativeRegistrationSolver):
             target_corr_normals = corrs.target_normals[corrs.index_map[valid_corrs], :]
 
             # determine total cost
-            source_target_alignment = np.diag((source_corr_points - target_corr_points).dot(target_corr_normals.T))
+            source_target_alignment = np.sum((source_corr_points - target_corr_points) * target_corr_normals, axis=1)
             point_plane_cost = (1.0 / num_corrs) * np.sum(source_target_alignment * source_target_alignment)
             point_dist_cost = (1.0 / num_corrs) * np.sum(np.linalg.norm(source_corr_points - target_corr_points, axis=1)**2)
             total_cost = point_plane_cost + self.gamma_ * point_dist_cost
@@ -6,6 +6,7 @@ import copy
 import logging
 import numpy as np
 import os
+import time
 
 from .constants import MM_TO_METERS, INTR_EXTENSION
 try:
@@ -13,7 +14,7 @@ try:
 except:
     logging.warning('Unable to import openni2 driver. Python-only Primesense driver may not work properly')
 
-from perception import CameraIntrinsics, CameraSensor, ColorImage, DepthImage, IrImage, Image
+from perception import CameraIntrinsics, CameraSensor, ColorImage, DepthImage, IrImage, Image, ImageBatch
 
 try:
     import rospy
@@ -171,42 +172,33 @@ class PrimesenseSensor(CameraSensor):
 
     def _read_depth_image(self):
         """ Reads a depth image from the device """
-        # read raw uint16 buffer
+        # view the raw uint16 buffer as an image
         im_arr = self._depth_stream.read_frame()
-        raw_buf = im_arr.get_buffer_as_uint16()
-        buf_array = np.array([raw_buf[i] for i in range(PrimesenseSensor.DEPTH_IM_WIDTH * PrimesenseSensor.DEPTH_IM_HEIGHT)])
+        raw_buf = np.frombuffer(im_arr.get_buffer_as_uint16(), dtype=np.uint16)
+        depth_image = raw_buf.reshape(PrimesenseSensor.DEPTH_IM_HEIGHT,
+                                      PrimesenseSensor.DEPTH_IM_WIDTH)
 
-        # convert to image in meters
-        depth_image = buf_array.reshape(PrimesenseSensor.DEPTH_IM_HEIGHT,
-                                        PrimesenseSensor.DEPTH_IM_WIDTH)
-        depth_image = depth_image * MM_TO_METERS # convert to meters
+        # flip the view and convert to meters in a single pass
         if self._flip_images:
             depth_image = np.flipud(depth_image)
         else:
             depth_image = np.fliplr(depth_image)
-        return DepthImage(depth_image, frame=self._frame)
+        depth_image = depth_image * np.float32(MM_TO_METERS)
+        return DepthImage(depth_image, frame=self._frame, copy=False)
 
     def _read_color_image(self):
         """ Reads a color image from the device """
-        # read raw buffer
+        # view the raw RGB triplet buffer as an image
         im_arr = self._color_stream.read_frame()
-        raw_buf = im_arr.get_buffer_as_triplet()
-        r_array = np.array([raw_buf[i][0] for i in range(PrimesenseSensor.COLOR_IM_WIDTH * PrimesenseSensor.COLOR_IM_HEIGHT)])        
-        g_array = np.array([raw_buf[i][1] for i in range(PrimesenseSensor.COLOR_IM_WIDTH * PrimesenseSensor.COLOR_IM_HEIGHT)])        
-        b_array = np.array([raw_buf[i][2] for i in range(PrimesenseSensor.COLOR_IM_WIDTH * PrimesenseSensor.COLOR_IM_HEIGHT)])        
-
-        # convert to uint8 image
-        color_image = np.zeros([PrimesenseSensor.COLOR_IM_HEIGHT, PrimesenseSensor.COLOR_IM_WIDTH, 3])
-        color_image[:,:,0] = r_array.reshape(PrimesenseSensor.COLOR_IM_HEIGHT,
-                                             PrimesenseSensor.COLOR_IM_WIDTH)
-        color_image[:,:,1] = g_array.reshape(PrimesenseSensor.COLOR_IM_HEIGHT,
-                                             PrimesenseSensor.COLOR_IM_WIDTH)
-        color_image[:,:,2] = b_array.reshape(PrimesenseSensor.COLOR_IM_HEIGHT,
-                                             PrimesenseSensor.COLOR_IM_WIDTH)
+        raw_buf = np.frombuffer(im_arr.get_buffer_as_uint8(), dtype=np.uint8)
+        color_image = raw_buf.reshape(PrimesenseSensor.COLOR_IM_HEIGHT,
+                                      PrimesenseSensor.COLOR_IM_WIDTH, 3)
+
+        # flip the view and copy out of the driver's frame buffer
         if self._flip_images:
-            color_image = np.flipud(color_image.astype(np.uint8))
+            color_image = np.flipud(color_image)
         else:
-            color_image = np.fliplr(color_image.astype(np.uint8))
+            color_image = np.fliplr(color_image)
         return ColorImage(color_image, frame=self._frame)
 
     def frames(self):
@@ -227,50 +219,6 @@ class PrimesenseSensor(CameraSensor):
         depth_im = self._read_depth_image()
         return color_im, depth_im, None
 
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
-
-    def min_depth_img(self, num_img=1):
-        """Collect a series of depth images and return the min of the set.
-
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The min DepthImage collected from the frames.
-        """
-        depths = []
-
-        for _ in range(num_img):
-            _, depth, _ = self.frames()
-            depths.append(depth)
-
-        return Image.min_images(depths)
-
 class PrimesenseSensor_ROS(PrimesenseSensor):
     """ ROS-based version of Primesense RGBD sensor interface
     
@@ -332,8 +280,11 @@ class PrimesenseSensor_ROS(PrimesenseSensor):
             If None, staleness is ignored.
         Returns
         -------
-        List of nump.ndarray objects, each one an image
-        Images are in reverse chronological order (newest first)
+        numpy.ndarray
+            number x height x width x channels array of images, in reverse
+            chronological order (newest first)
+        numpy.ndarray
+            The age of each image in seconds
         """
         
         rospy.wait_for_service(stream_buffer, timeout = self.timeout)
@@ -344,12 +295,10 @@ class PrimesenseSensor_ROS(PrimesenseSensor):
                 raise RuntimeError("Got data {0} seconds old, more than allowed {1} seconds"
                                    .format(ret.timestamps[-1], staleness_limit))
             
-        data = ret.data.reshape(ret.data_dim1, ret.data_dim2, ret.data_dim3).astype(ret.dtype)
-        
-        # Special handling for 1 element, since dstack's behavior is different
-        if number == 1:
-            return [data]
-        return np.dsplit(data, number)
+        # view the raw bytes as a stack of images in their native dtype
+        data = np.frombuffer(ret.data, dtype=ret.dtype).reshape(ret.data_dim1, ret.data_dim2,
+                                                                ret.data_dim3, ret.depth_per)
+        return data, np.asarray(ret.timestamps)
 
     @property
     def is_running(self):
@@ -363,66 +312,67 @@ class PrimesenseSensor_ROS(PrimesenseSensor):
             return False
         return True
     
+    def _read_depth_batch(self, num_images):
+        """ Reads depth images from the device, oldest first """
+        depth_data, ages = self._ros_read_images(self._depth_image_buffer, num_images, self.staleness_limit)
+        depth_data = depth_data[::-1]
+        if self._flip_images:
+            depth_data = depth_data[:, ::-1, ::-1]
+        depth_data = depth_data * np.float32(MM_TO_METERS) # convert to meters
+        return ImageBatch(depth_data, DepthImage, self._frame, copy=False), ages[::-1]
+
+    def _read_color_batch(self, num_images):
+        """ Reads color images from the device, oldest first """
+        color_data, ages = self._ros_read_images(self._color_image_buffer, num_images, self.staleness_limit)
+        color_data = color_data[::-1]
+        if self._flip_images:
+            color_data = color_data[:, ::-1, ::-1]
+        return ImageBatch(color_data.astype(np.uint8), ColorImage, self._frame, copy=False), ages[::-1]
+
     def _read_depth_images(self, num_images):
         """ Reads depth images from the device """
-        depth_images = self._ros_read_images(self._depth_image_buffer, num_images, self.staleness_limit)
-        for i in range(0, num_images):
-            depth_images[i] = depth_images[i] * MM_TO_METERS # convert to meters
-            if self._flip_images:
-                depth_images[i] = np.flipud(depth_images[i])
-                depth_images[i] = np.fliplr(depth_images[i])
-            depth_images[i] = DepthImage(depth_images[i], frame=self._frame) 
-        return depth_images
+        return self._read_depth_batch(num_images)[0].to_images()
+
     def _read_color_images(self, num_images):
         """ Reads color images from the device """
-        color_images = self._ros_read_images(self._color_image_buffer, num_images, self.staleness_limit)
-        for i in range(0, num_images):
-            if self._flip_images:
-                color_images[i] = np.flipud(color_images[i].astype(np.uint8))
-                color_images[i] = np.fliplr(color_images[i].astype(np.uint8))
-            color_images[i] = ColorImage(color_images[i], frame=self._frame) 
-        return color_images
-    
+        return self._read_color_batch(num_images)[0].to_images()
+
     def _read_depth_image(self):
         """ Wrapper to maintain compatibility """
         return self._read_depth_images(1)[0]
     def _read_color_image(self):
         """ Wrapper to maintain compatibility """
         return self._read_color_images(1)[0]
-        
-    def median_depth_img(self, num_img=1, fill_depth=0.0):
-        """Collect a series of depth images and return the median of the set.
 
-        Parameters
-        ----------
-        num_img : int
-            The number of consecutive frames to process.
-
-        Returns
-        -------
-        :obj:`DepthImage`
-            The median DepthImage collected from the frames.
-        """
-        depths = self._read_depth_images(num_img)
-
-        median_depth = Image.median_images(depths)
-        median_depth.data[median_depth.data == 0.0] = fill_depth
-        return median_depth
-
-    def min_depth_img(self, num_img=1):
-        """Collect a series of depth images and return the min of the set.
+    def frames_batch(self, num_frames, color=True, depth=True):
+        """Read the most recent frames from the image buffers directly into
+        stacked arrays.
 
         Parameters
         ----------
-        num_img : int
-            The number of consecutive frames to process.
+        num_frames : int
+            The number of consecutive frames to collect.
+        color : bool
+            Whether or not to collect the color images.
+        depth : bool
+            Whether or not to collect the depth images.
 
         Returns
         -------
-        :obj:`DepthImage`
-            The min DepthImage collected from the frames.
+        :obj:`ImageBatch`
+            The color images, or None if not collected.
+        :obj:`ImageBatch`
+            The depth images, or None if not collected.
+        :obj:`numpy.ndarray`
+            The time at which each frame was received, in seconds since the
+            epoch, taken from the depth buffer if collected.
         """
-        depths = self._read_depth_images(num_img)
-
-        return Image.min_images(depths)
-        
+        request_time = time.time()
+        color_batch = None
+        depth_batch = None
+        ages = np.zeros(num_frames)
+        if color:
+            color_batch, ages = self._read_color_batch(num_frames)
+        if depth:
+            depth_batch, ages = self._read_depth_batch(num_frames)
+        return color_batch, depth_batch, request_time - ages
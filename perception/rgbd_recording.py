@@ -0,0 +1,480 @@
+"""
+Single-file recordings of synchronized color, depth and IR streams.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+from .camera_intrinsics import CameraIntrinsics
+from .camera_sensor import VirtualSensor
+from .image import ColorImage, DepthImage, IrImage
+
+# file layout: magic, json header, frame chunks, and on close an index
+# chunk followed by a trailer pointing to it
+RECORDING_MAGIC = b'RGBDREC1'
+TRAILER_MAGIC = b'RGBDIDX1'
+FRAME_TAG = b'FRME'
+INDEX_TAG = b'INDX'
+HEADER_LEN_FORMAT = '<I'
+FRAME_HEADER_FORMAT = '<4sqdBQ'
+STREAM_HEADER_FORMAT = '<BBIIIQ'
+INDEX_HEADER_FORMAT = '<4sq'
+TRAILER_FORMAT = '<8sq'
+
+# streams and their image types
+COLOR_STREAM = 0
+DEPTH_STREAM = 1
+IR_STREAM = 2
+STREAM_IMAGE_TYPES = {
+    COLOR_STREAM: ColorImage,
+    DEPTH_STREAM: DepthImage,
+    IR_STREAM: IrImage
+}
+STREAM_DTYPES = {
+    COLOR_STREAM: np.uint8,
+    DEPTH_STREAM: np.float32,
+    IR_STREAM: np.uint16
+}
+
+# lossless codecs
+PNG_CODEC = 0
+SHUFFLE_ZLIB_CODEC = 1
+
+def _intrinsics_to_dict(camera_intr):
+    """Converts camera intrinsics to a json-serializable dictionary."""
+    if camera_intr is None:
+        return None
+    return {'frame': camera_intr.frame, 'fx': camera_intr.fx, 'fy': camera_intr.fy,
+            'cx': camera_intr.cx, 'cy': camera_intr.cy, 'skew': camera_intr.skew,
+            'height': camera_intr.height, 'width': camera_intr.width}
+
+def _intrinsics_from_dict(intr_dict):
+    """Converts a dictionary from _intrinsics_to_dict back to intrinsics."""
+    if intr_dict is None:
+        return None
+    return CameraIntrinsics(**intr_dict)
+
+def _encode(data, codec, compression_level):
+    """Losslessly compresses an image array."""
+    if codec == PNG_CODEC:
+        ret, buf = cv2.imencode('.png', data, [cv2.IMWRITE_PNG_COMPRESSION, compression_level])
+        if not ret:
+            raise ValueError('Failed to encode image as PNG')
+        return buf.tobytes()
+
+    # group the bytes of each significance together, which compresses far
+    # better than interleaved multi-byte values
+    itemsize = data.dtype.itemsize
+    shuffled = np.ascontiguousarray(data).view(np.uint8).reshape(-1, itemsize).T
+    return zlib.compress(np.ascontiguousarray(shuffled).tobytes(), compression_level)
+
+def _decode(buf, codec, shape, dtype):
+    """Decompresses an image array encoded with _encode."""
+    if codec == PNG_CODEC:
+        data = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        return data.reshape(shape)
+    itemsize = np.dtype(dtype).itemsize
+    shuffled = np.frombuffer(zlib.decompress(buf), dtype=np.uint8).reshape(itemsize, -1)
+    return np.ascontiguousarray(shuffled.T).view(dtype).reshape(shape)
+
+def _read_index(f, file_size, data_offset):
+    """Reads the frame offsets and timestamps of a recording, using the index
+    if the recording was closed and scanning the frame chunks otherwise.
+
+    Returns
+    -------
+    :obj:`list` of int
+        byte offset of each frame chunk
+    :obj:`list` of float
+        timestamp of each frame
+    int
+        byte offset of the end of the last complete frame chunk
+    """
+    trailer_size = struct.calcsize(TRAILER_FORMAT)
+    if file_size >= data_offset + trailer_size:
+        f.seek(file_size - trailer_size)
+        magic, index_offset = struct.unpack(TRAILER_FORMAT, f.read(trailer_size))
+        if magic == TRAILER_MAGIC:
+            f.seek(index_offset)
+            index_header_size = struct.calcsize(INDEX_HEADER_FORMAT)
+            tag, num_frames = struct.unpack(INDEX_HEADER_FORMAT, f.read(index_header_size))
+            if tag == INDEX_TAG:
+                offsets = np.frombuffer(f.read(8 * num_frames), dtype='<i8').tolist()
+                timestamps = np.frombuffer(f.read(8 * num_frames), dtype='<f8').tolist()
+                return offsets, timestamps, index_offset
+    return _scan_frames(f, file_size, data_offset)
+
+def _scan_frames(f, file_size, offset):
+    """Scans the complete frame chunks starting at a byte offset. See
+    _read_index for the return values."""
+    offsets = []
+    timestamps = []
+    frame_header_size = struct.calcsize(FRAME_HEADER_FORMAT)
+    while offset + frame_header_size <= file_size:
+        f.seek(offset)
+        tag, _, timestamp, _, nbytes = struct.unpack(FRAME_HEADER_FORMAT, f.read(frame_header_size))
+        if tag != FRAME_TAG or offset + frame_header_size + nbytes > file_size:
+            break
+        offsets.append(offset)
+        timestamps.append(timestamp)
+        offset += frame_header_size + nbytes
+    return offsets, timestamps, offset
+
+def _read_header(f):
+    """Reads the json header of a recording.
+
+    Returns
+    -------
+    :obj:`dict`
+        the header
+    int
+        byte offset of the first frame chunk
+
+    Raises
+    ------
+    ValueError
+        If the file is not a recording.
+    """
+    f.seek(0)
+    if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+        raise ValueError('File is not an RGB-D recording')
+    len_size = struct.calcsize(HEADER_LEN_FORMAT)
+    header_len, = struct.unpack(HEADER_LEN_FORMAT, f.read(len_size))
+    header = json.loads(f.read(header_len).decode('utf-8'))
+    return header, len(RECORDING_MAGIC) + len_size + header_len
+
+class RgbdRecordingWriter(object):
+    """Records synchronized color, depth and IR images to a single file.
+
+    Each frame is stored as one chunk with its timestamp and the losslessly
+    compressed images: color as PNG, and depth and IR as byte-shuffled zlib
+    streams. Chunks are flushed as they are written, so an RgbdRecording can
+    read the frames while recording continues. Closing the writer appends an
+    index of the chunks for constant-time seeking.
+    """
+    def __init__(self, filename, color_intr=None, ir_intr=None, frame='unspecified',
+                 compression_level=6, append=False):
+        """
+        Parameters
+        ----------
+        filename : :obj:`str`
+            the file to record to
+        color_intr : :obj:`CameraIntrinsics`
+            intrinsics of the color camera
+        ir_intr : :obj:`CameraIntrinsics`
+            intrinsics of the depth and IR camera
+        frame : :obj:`str`
+            the reference frame of the images
+        compression_level : int
+            zlib compression level from 0 (fastest) to 9 (smallest)
+        append : bool
+            whether to add frames to an existing recording, in which case
+            the intrinsics and frame of the recording are kept
+
+        Raises
+        ------
+        ValueError
+            If the compression level is invalid.
+        """
+        if compression_level < 0 or compression_level > 9:
+            raise ValueError('Compression level must be between 0 and 9')
+        self._filename = filename
+        self._compression_level = compression_level
+
+        if append and os.path.exists(filename):
+            # drop the index, which is rewritten on close
+            self._file = open(filename, 'r+b')
+            file_size = os.path.getsize(filename)
+            self._header, data_offset = _read_header(self._file)
+            self._offsets, self._timestamps, end_offset = _read_index(self._file, file_size, data_offset)
+            self._file.seek(end_offset)
+            self._file.truncate()
+        else:
+            self._file = open(filename, 'wb')
+            self._header = {'frame': frame,
+                            'color_intrinsics': _intrinsics_to_dict(color_intr),
+                            'ir_intrinsics': _intrinsics_to_dict(ir_intr)}
+            header_bytes = json.dumps(self._header).encode('utf-8')
+            self._file.write(RECORDING_MAGIC)
+            self._file.write(struct.pack(HEADER_LEN_FORMAT, len(header_bytes)))
+            self._file.write(header_bytes)
+            self._offsets = []
+            self._timestamps = []
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def filename(self):
+        """:obj:`str` : The file being recorded to.
+        """
+        return self._filename
+
+    @property
+    def num_frames(self):
+        """int : The number of recorded frames.
+        """
+        return len(self._offsets)
+
+    def write(self, color_im=None, depth_im=None, ir_im=None, timestamp=None):
+        """Appends a frame to the recording.
+
+        Parameters
+        ----------
+        color_im : :obj:`ColorImage`
+            the color image, or None
+        depth_im : :obj:`DepthImage`
+            the depth image, or None
+        ir_im : :obj:`IrImage`
+            the IR image, or None
+        timestamp : float
+            the capture time of the frame, defaults to the current time
+
+        Raises
+        ------
+        ValueError
+            If the writer is closed or no image is given.
+        """
+        if self._file is None:
+            raise ValueError('Cannot write to a closed recording')
+        if timestamp is None:
+            timestamp = time.time()
+
+        streams = []
+        for stream, image, codec in [(COLOR_STREAM, color_im, PNG_CODEC),
+                                     (DEPTH_STREAM, depth_im, SHUFFLE_ZLIB_CODEC),
+                                     (IR_STREAM, ir_im, SHUFFLE_ZLIB_CODEC)]:
+            if image is None:
+                continue
+            height, width, channels = image.raw_data.shape
+            buf = _encode(image.raw_data, codec, self._compression_level)
+            streams.append(struct.pack(STREAM_HEADER_FORMAT, stream, codec, height, width, channels, len(buf)))
+            streams.append(buf)
+        if len(streams) == 0:
+            raise ValueError('Frame must contain at least one image')
+
+        # write the whole chunk at once so that readers never see a partial header
+        payload = b''.join(streams)
+        chunk = struct.pack(FRAME_HEADER_FORMAT, FRAME_TAG, len(self._offsets), timestamp,
+                            len(streams) // 2, len(payload)) + payload
+        self._offsets.append(self._file.tell())
+        self._timestamps.append(timestamp)
+        self._file.write(chunk)
+        self._file.flush()
+
+    def close(self):
+        """Writes the index and closes the file."""
+        if self._file is None:
+            return
+        index_offset = self._file.tell()
+        self._file.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_TAG, len(self._offsets)))
+        self._file.write(np.array(self._offsets, dtype='<i8').tobytes())
+        self._file.write(np.array(self._timestamps, dtype='<f8').tobytes())
+        self._file.write(struct.pack(TRAILER_FORMAT, TRAILER_MAGIC, index_offset))
+        self._file.close()
+        self._file = None
+
+class RgbdRecording(object):
+    """Random-access reader for recordings made with an RgbdRecordingWriter.
+    Frames can be read from multiple threads.
+    """
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename : :obj:`str`
+            the recording to read
+
+        Raises
+        ------
+        ValueError
+            If the file is not a recording.
+        """
+        self._filename = filename
+        self._file = open(filename, 'rb')
+        self._lock = threading.Lock()
+        self._header, data_offset = _read_header(self._file)
+        self._color_intr = _intrinsics_from_dict(self._header['color_intrinsics'])
+        self._ir_intr = _intrinsics_from_dict(self._header['ir_intrinsics'])
+        self._offsets, self._timestamps, self._end_offset = _read_index(self._file, os.path.getsize(filename), data_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @property
+    def filename(self):
+        """:obj:`str` : The recording file.
+        """
+        return self._filename
+
+    @property
+    def frame(self):
+        """:obj:`str` : The reference frame of the images.
+        """
+        return self._header['frame']
+
+    @property
+    def color_intrinsics(self):
+        """:obj:`CameraIntrinsics` : The intrinsics of the color camera, or None.
+        """
+        return self._color_intr
+
+    @property
+    def ir_intrinsics(self):
+        """:obj:`CameraIntrinsics` : The intrinsics of the depth and IR camera, or None.
+        """
+        return self._ir_intr
+
+    @property
+    def num_frames(self):
+        """int : The number of frames in the recording.
+        """
+        return len(self._offsets)
+
+    @property
+    def timestamps(self):
+        """:obj:`numpy.ndarray` of float : The capture time of each frame.
+        """
+        return np.array(self._timestamps)
+
+    @property
+    def closed(self):
+        """bool : True if the file has been closed.
+        """
+        return self._file.closed
+
+    def refresh(self):
+        """Picks up frames appended since the recording was opened.
+
+        Returns
+        -------
+        int
+            the number of new frames
+        """
+        with self._lock:
+            offsets, timestamps, self._end_offset = _scan_frames(self._file, os.path.getsize(self._filename), self._end_offset)
+        self._offsets.extend(offsets)
+        self._timestamps.extend(timestamps)
+        return len(offsets)
+
+    def read(self, index):
+        """Reads a frame.
+
+        Parameters
+        ----------
+        index : int
+            the index of the frame
+
+        Returns
+        -------
+        :obj:`tuple` of :obj:`ColorImage`, :obj:`DepthImage`, :obj:`IrImage`
+            the images of the frame, with None for streams that were not recorded
+
+        Raises
+        ------
+        ValueError
+            If the index is out of range.
+        """
+        if index < 0 or index >= len(self._offsets):
+            raise ValueError('Frame index %d out of range for %d frames' %(index, len(self._offsets)))
+
+        frame_header_size = struct.calcsize(FRAME_HEADER_FORMAT)
+        with self._lock:
+            self._file.seek(self._offsets[index])
+            _, _, _, num_streams, nbytes = struct.unpack(FRAME_HEADER_FORMAT, self._file.read(frame_header_size))
+            payload = self._file.read(nbytes)
+
+        # decompress outside of the lock
+        images = [None, None, None]
+        stream_header_size = struct.calcsize(STREAM_HEADER_FORMAT)
+        offset = 0
+        for _ in range(num_streams):
+            stream, codec, height, width, channels, buf_len = struct.unpack_from(STREAM_HEADER_FORMAT, payload, offset)
+            offset += stream_header_size
+            data = _decode(payload[offset:offset + buf_len], codec, (height, width, channels), STREAM_DTYPES[stream])
+            offset += buf_len
+            images[stream] = STREAM_IMAGE_TYPES[stream](data, self.frame, copy=False)
+        return tuple(images)
+
+    def close(self):
+        """Closes the file."""
+        self._file.close()
+
+class RgbdRecordingSensor(VirtualSensor):
+    """ Class for a virtual sensor that replays an RGB-D recording made with
+    an RgbdRecordingWriter.
+    """
+    def __init__(self, filename, frame=None, loop=True, num_prefetch=0, num_workers=4):
+        """Create a sensor that replays a recording.
+
+        Parameters
+        ----------
+        filename : :obj:`str`
+            The recording to replay.
+        frame : :obj:`str`
+            The name of the frame of reference in which the sensor resides.
+            If None, the frame of the recording is used.
+        loop : bool
+            Whether or not to loop back to the first image after running out
+        num_prefetch : int
+            The number of upcoming frames to decode ahead of time on a thread
+            pool while the stream is running. Zero disables prefetching.
+        num_workers : int
+            The number of threads used for prefetching.
+        """
+        self._init_stream(loop, num_prefetch, num_workers)
+        self._recording = RgbdRecording(filename)
+        self._path_to_images = filename
+        self._frame = frame
+        if self._frame is None:
+            self._frame = self._recording.frame
+        self._color_frame = self._frame
+        self._ir_frame = self._frame
+        self._color_intr = self._recording.color_intrinsics
+        self._ir_intr = self._recording.ir_intrinsics
+        if self._ir_intr is None:
+            self._ir_intr = self._color_intr
+        self._num_images = self._recording.num_frames
+
+    @property
+    def recording(self):
+        """:obj:`RgbdRecording` : The recording being replayed.
+        """
+        return self._recording
+
+    def start(self):
+        """Starts the sensor stream at the first frame, including any frames
+        appended to the recording since the last start.
+        """
+        self._recording.refresh()
+        self._num_images = self._recording.num_frames
+        VirtualSensor.start(self)
+
+    def close(self):
+        """Stops the sensor stream and closes the recording file.
+        """
+        self.stop()
+        self._recording.close()
+
+    def _load_frame(self, index):
+        """Reads the color, depth and IR images of a frame from the recording."""
+        images = self._recording.read(index)
+        if self._frame != self._recording.frame:
+            images = tuple([type(im)(im.raw_data, self._frame, copy=False) if im is not None else None for im in images])
+        return images
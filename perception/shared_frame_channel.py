@@ -0,0 +1,282 @@
+"""
+Shared-memory channel for passing images between processes without pickling.
+"""
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from .image import ColorImage
+from .exceptions import SensorUnresponsiveException
+
+class SharedFrameChannel(object):
+    """Passes images of a fixed shape and dtype from one producer process to
+    one consumer process through a ring of preallocated shared-memory slots.
+
+    The producer copies each image into a free slot with put(), blocking
+    while every slot is occupied. The consumer wraps the oldest unread slot
+    as an image with get() without copying; the slot is handed back to the
+    producer on the next get() or on release(). Every frame is tagged with a
+    sequence number so that the consumer can detect frames that the producer
+    dropped.
+
+    The channel must be created before the processes are started and passed
+    to them, e.g. as an argument of a :obj:`multiprocessing.Process`.
+    """
+    def __init__(self, height, width, channels=1, dtype=np.uint8,
+                 image_type=ColorImage, frame='unspecified', num_slots=4):
+        """
+        Parameters
+        ----------
+        height : int
+            height of the images
+        width : int
+            width of the images
+        channels : int
+            number of channels of the images
+        dtype : :obj:`numpy.dtype`
+            datatype of the images, e.g. np.float32 for a DepthImage
+        image_type : :obj:`type`
+            the Image subclass returned by get()
+        frame : :obj:`str`
+            the frame of the returned images
+        num_slots : int
+            number of frames that can be in flight at once
+
+        Raises
+        ------
+        ValueError
+            If the number of slots is not positive.
+        """
+        if num_slots < 1:
+            raise ValueError('Number of slots must be positive')
+        self._shape = (height, width, channels)
+        self._dtype = np.dtype(dtype)
+        self._image_type = image_type
+        self._frame = frame
+        self._num_slots = num_slots
+
+        frame_nbytes = height * width * channels * self._dtype.itemsize
+        self._buffer = mp.RawArray('B', num_slots * frame_nbytes)
+        self._seq_nums = mp.RawArray('q', num_slots)
+        self._timestamps = mp.RawArray('d', num_slots)
+        self._num_written = mp.RawValue('q', 0)
+        self._num_read = mp.RawValue('q', 0)
+        self._num_dropped = mp.RawValue('q', 0)
+        self._closed = mp.RawValue('b', 0)
+        self._cond = mp.Condition()
+
+        # per-process state
+        self._slots = None
+        self._held = False
+
+    @staticmethod
+    def from_image(image, num_slots=4):
+        """Creates a channel for images with the same type, shape, dtype and
+        frame as the given image.
+
+        Parameters
+        ----------
+        image : :obj:`Image`
+            an example image
+        num_slots : int
+            number of frames that can be in flight at once
+
+        Returns
+        -------
+        :obj:`SharedFrameChannel`
+            the channel
+        """
+        return SharedFrameChannel(image.height, image.width, image.channels,
+                                  image.raw_data.dtype, type(image),
+                                  image.frame, num_slots)
+
+    def __getstate__(self):
+        """Drops the per-process state when sent to a new process."""
+        state = self.__dict__.copy()
+        state['_slots'] = None
+        state['_held'] = False
+        return state
+
+    @property
+    def shape(self):
+        """:obj:`tuple` of int : The height, width and channels of the images.
+        """
+        return self._shape
+
+    @property
+    def dtype(self):
+        """:obj:`numpy.dtype` : The datatype of the images.
+        """
+        return self._dtype
+
+    @property
+    def num_slots(self):
+        """int : The number of shared-memory slots.
+        """
+        return self._num_slots
+
+    @property
+    def num_written(self):
+        """int : The number of frames written by the producer.
+        """
+        return self._num_written.value
+
+    @property
+    def num_dropped(self):
+        """int : The number of frames the producer dropped because every slot
+        was occupied.
+        """
+        return self._num_dropped.value
+
+    @property
+    def num_pending(self):
+        """int : The number of written frames not yet released by the consumer.
+        """
+        with self._cond:
+            return self._num_written.value - self._num_read.value
+
+    @property
+    def closed(self):
+        """bool : True if the producer closed the channel.
+        """
+        return bool(self._closed.value)
+
+    @property
+    def _slot_data(self):
+        """:obj:`numpy.ndarray` : View of the shared slots in this process."""
+        if self._slots is None:
+            self._slots = np.frombuffer(self._buffer, dtype=self._dtype).reshape((self._num_slots,) + self._shape)
+        return self._slots
+
+    def put(self, image, timestamp=None, block=True, timeout=None):
+        """Copies an image into the next free slot. Must only be called from
+        a single producer.
+
+        Parameters
+        ----------
+        image : :obj:`Image`
+            the image to send
+        timestamp : float
+            the capture time of the image, defaults to the current time
+        block : bool
+            whether to wait for a free slot when the consumer falls behind
+        timeout : float
+            maximum time to wait for a free slot in seconds, or None to wait
+            indefinitely
+
+        Returns
+        -------
+        bool
+            True if the image was written, False if it was dropped because
+            no slot was freed in time.
+
+        Raises
+        ------
+        ValueError
+            If the image shape or dtype does not match the channel.
+        RuntimeError
+            If the channel is closed.
+        """
+        if image.raw_data.shape != self._shape or image.raw_data.dtype != self._dtype:
+            raise ValueError('Image with shape %s and dtype %s does not match channel with shape %s and dtype %s'
+                             %(str(image.raw_data.shape), str(image.raw_data.dtype), str(self._shape), str(self._dtype)))
+        if timestamp is None:
+            timestamp = time.time()
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+
+        # wait for the consumer to release the oldest slot
+        with self._cond:
+            while True:
+                if self._closed.value:
+                    raise RuntimeError('Cannot write to a closed channel')
+                if self._num_written.value - self._num_read.value < self._num_slots:
+                    break
+                remaining = None
+                if end_time is not None:
+                    remaining = end_time - time.time()
+                if not block or (remaining is not None and remaining <= 0):
+                    self._num_dropped.value += 1
+                    return False
+                self._cond.wait(remaining)
+            seq_num = self._num_written.value
+
+        # the free slot belongs to the producer until the counter is advanced
+        ind = seq_num % self._num_slots
+        self._slot_data[ind] = image.raw_data
+        with self._cond:
+            self._seq_nums[ind] = seq_num
+            self._timestamps[ind] = timestamp
+            self._num_written.value += 1
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """Releases the previously returned slot and returns the oldest unread
+        frame as a read-only image backed by shared memory. The image is only
+        valid until the next call to get() or release(); copy it to keep it.
+
+        Parameters
+        ----------
+        timeout : float
+            maximum time to wait in seconds, or None to wait indefinitely
+
+        Returns
+        -------
+        :obj:`Image`
+            the image, of the channel's image type
+        int
+            the sequence number of the frame
+        float
+            the timestamp of the frame
+
+        Raises
+        ------
+        RuntimeError
+            If the channel is closed and every frame has been read.
+        SensorUnresponsiveException
+            If no frame arrives within the timeout.
+        """
+        self.release()
+        end_time = None
+        if timeout is not None:
+            end_time = time.time() + timeout
+        with self._cond:
+            while self._num_written.value == self._num_read.value:
+                if self._closed.value:
+                    raise RuntimeError('Channel closed')
+                remaining = None
+                if end_time is not None:
+                    remaining = end_time - time.time()
+                    if remaining <= 0:
+                        raise SensorUnresponsiveException('No frame received within %.3f sec' %(timeout))
+                self._cond.wait(remaining)
+            ind = self._num_read.value % self._num_slots
+            seq_num = self._seq_nums[ind]
+            timestamp = self._timestamps[ind]
+        self._held = True
+
+        data = self._slot_data[ind]
+        data.flags.writeable = False
+        return self._image_type(data, self._frame, copy=False), seq_num, timestamp
+
+    def release(self):
+        """Hands the slot of the last frame returned by get() back to the
+        producer.
+        """
+        if not self._held:
+            return
+        with self._cond:
+            self._num_read.value += 1
+            self._cond.notify_all()
+        self._held = False
+
+    def close(self):
+        """Closes the channel. The consumer can still read the pending frames,
+        after which get() raises a RuntimeError.
+        """
+        with self._cond:
+            self._closed.value = 1
+            self._cond.notify_all()
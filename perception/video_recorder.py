@@ -27,8 +27,10 @@ class _Camera(Process):
         number of frames per second
     rate : int
         rate at which to read frames (e.g. 2 means skip every other frame)
+    frame_channel : :obj:`SharedFrameChannel`
+        channel to publish recorded frames on, or None
     """
-    def __init__(self, camera, cmd_q, res, codec, fps, rate=1):
+    def __init__(self, camera, cmd_q, res, codec, fps, rate=1, frame_channel=None):
         Process.__init__(self)
         
         self.res = res
@@ -38,6 +40,7 @@ class _Camera(Process):
         self.camera = camera
         self.fourcc = cv2.VideoWriter_fourcc(*self.codec)
         self.rate = rate
+        self.frame_channel = frame_channel
         
         self.cmd_q = cmd_q
         self.recording = False
@@ -70,6 +73,10 @@ class _Camera(Process):
                     self.data_buf[0,...] = image.raw_data
                     self.out.writeFrame(self.data_buf)
 
+                    # never stall the recording on a slow consumer
+                    if self.frame_channel is not None:
+                        self.frame_channel.put(image, block=False)
+
                 self.count += 1
                 if self.count == self.rate:
                     self.count = 0
@@ -89,12 +96,16 @@ class VideoRecorder:
         frames per second of video captures. defaults to 30
     rate : int
         rate at which to read frames (e.g. 2 means skip every other frame)
+    frame_channel : :obj:`SharedFrameChannel`
+        channel on which the recording process publishes each recorded frame
+        without pickling, or None
     """
-    def __init__(self, camera, device_id=0, res=(640, 480), codec='XVID', fps=30, rate=1):
+    def __init__(self, camera, device_id=0, res=(640, 480), codec='XVID', fps=30, rate=1, frame_channel=None):
         self._res = res
         self._codec = codec
         self._fps = fps
         self._rate = rate
+        self._frame_channel = frame_channel
         
         self._cmd_q = Queue()
         
@@ -111,10 +122,15 @@ class VideoRecorder:
     def is_started(self):
         return self._started
 
+    @property
+    def frame_channel(self):
+        return self._frame_channel
+
     def start(self):
         """ Starts the camera recording process. """
         self._started = True
-        self._camera = _Camera(self._actual_camera, self._cmd_q, self._res, self._codec, self._fps, self._rate)
+        self._camera = _Camera(self._actual_camera, self._cmd_q, self._res, self._codec, self._fps, self._rate,
+                               self._frame_channel)
         self._camera.start()
 
     def start_recording(self, output_file):
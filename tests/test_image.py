@@ -7,7 +7,7 @@ import numpy as np
 import unittest
 
 from .constants import *
-from perception import Image, ColorImage, DepthImage, BinaryImage, SegmentationImage, GrayscaleImage, IrImage, PointCloudImage, NormalCloudImage
+from perception import Image, ColorImage, DepthImage, BinaryImage, SegmentationImage, GrayscaleImage, IrImage, PointCloudImage, NormalCloudImage, ImageBatch, TemporalDepthFilter, BinaryRayTracer
 
 class TestImage(unittest.TestCase):
     def test_color_init(self):
@@ -211,6 +211,39 @@ class TestImage(unittest.TestCase):
             caught_bad_norm = True
         self.assertTrue(caught_bad_norm)
 
+    def test_no_copy(self):
+        color_data = (255.0 * np.random.rand(IM_HEIGHT, IM_WIDTH, 3)).astype(np.uint8)
+        im = ColorImage(color_data)
+        view_im = ColorImage(color_data, copy=False)
+        self.assertFalse(np.shares_memory(im.raw_data, color_data))
+        self.assertTrue(np.shares_memory(view_im.raw_data, color_data))
+
+        # crops inside the image can be read-only views
+        crop_im = view_im.crop(IM_HEIGHT // 2, IM_WIDTH // 2, copy=False)
+        self.assertTrue(np.shares_memory(crop_im.raw_data, color_data))
+        self.assertFalse(crop_im.raw_data.flags.writeable)
+        self.assertTrue(np.array_equal(crop_im.data, view_im.crop(IM_HEIGHT // 2, IM_WIDTH // 2).data))
+
+        # wrapped depth buffers with NaNs are never modified
+        depth_data = np.random.rand(IM_HEIGHT, IM_WIDTH).astype(np.float32)
+        depth_data[0, 0] = np.nan
+        depth_im = DepthImage(depth_data, copy=False)
+        self.assertEqual(depth_im[0, 0], 0.0)
+        self.assertTrue(np.isnan(depth_data[0, 0]))
+        depth_data[0, 0] = 0.5
+        depth_im = DepthImage(depth_data, copy=False)
+        self.assertTrue(np.shares_memory(depth_im.raw_data, depth_data))
+
+        # binary data is only wrapped when it needs no thresholding
+        binary_data = 255 * (np.random.rand(IM_HEIGHT, IM_WIDTH) > 0.5).astype(np.uint8)
+        binary_im = BinaryImage(binary_data, copy=False)
+        self.assertTrue(np.shares_memory(binary_im.raw_data, binary_data))
+        self.assertTrue(np.shares_memory(binary_im.crop(IM_HEIGHT // 2, IM_WIDTH // 2, copy=False).raw_data, binary_data))
+        gray_data = binary_data // 2 + 1
+        binary_im = BinaryImage(gray_data, copy=False)
+        self.assertFalse(np.shares_memory(binary_im.raw_data, gray_data))
+        self.assertTrue(np.array_equal(binary_im.data, binary_data))
+
     def test_resize(self):
         random_valid_data = (255.0 * np.random.rand(IM_HEIGHT, IM_WIDTH, 3)).astype(np.uint8)
         im = ColorImage(random_valid_data)
@@ -252,6 +285,263 @@ class TestImage(unittest.TestCase):
         im2 = im.mask_by_ind(ind)
         self.assertEqual(np.sum(im2[1,1]), 0.0)
 
+    def test_inpaint(self):
+        ii, jj = np.meshgrid(np.arange(IM_HEIGHT), np.arange(IM_WIDTH), indexing='ij')
+        depth_data = (0.5 + 0.001 * ii + 0.002 * jj).astype(np.float32)
+        depth_data[20:60, 30:45] = 0.0
+        depth_data[np.random.rand(IM_HEIGHT, IM_WIDTH) < 0.1] = 0.0
+        im = DepthImage(depth_data)
+
+        for method in ['convolve', 'pyramid', 'nearest']:
+            inpainted_im = im.inpaint(method=method)
+            self.assertEqual(np.sum(inpainted_im.data == 0), 0)
+            self.assertTrue(np.allclose(inpainted_im.data[depth_data > 0], depth_data[depth_data > 0]))
+            self.assertTrue(np.all(inpainted_im.data >= np.min(depth_data[depth_data > 0]) - 1e-6))
+            self.assertTrue(np.all(inpainted_im.data <= np.max(depth_data) + 1e-6))
+
+    def test_triangulate(self, height=12, width=15):
+        pc_data = np.random.rand(height, width, 3).astype(np.float32)
+        pc_data[:,:,2] = 0.5 + 0.001 * np.random.rand(height, width)
+        pc_data[3:5,4:9,2] = 0.8
+        im = PointCloudImage(pc_data)
+        vertices, triangles = im.triangulate(dist_thresh=0.01)
+
+        # compare against a per-block triangulation
+        true_tris = []
+        for i in range(height-1):
+            for j in range(width-1):
+                v0, v1, v2, v3 = pc_data[i,j], pc_data[i,j+1], pc_data[i+1,j], pc_data[i+1,j+1]
+                d01 = abs(v0[2] - v1[2])
+                d03 = abs(v0[2] - v3[2])
+                d13 = abs(v1[2] - v3[2])
+                d23 = abs(v2[2] - v3[2])
+                if max(d01, d03, d13) < 0.01:
+                    true_tris.append(np.r_[v0, v1, v3])
+                if max(d01, d03, d23) < 0.01:
+                    true_tris.append(np.r_[v0, v3, v2])
+        tris = vertices[triangles].reshape(-1, 9)
+        self.assertEqual(tris.shape[0], len(true_tris))
+        self.assertTrue(np.allclose(tris, np.array(true_tris)))
+        self.assertEqual(vertices.shape[0], np.unique(triangles).shape[0])
+
+    def test_image_batch(self, num_images=5):
+        np.random.seed(0)
+        color_data = (255.0 * np.random.rand(num_images, IM_HEIGHT, IM_WIDTH, 3)).astype(np.uint8)
+        depth_data = np.random.rand(num_images, IM_HEIGHT, IM_WIDTH).astype(np.float32)
+        color_ims = [ColorImage(d) for d in color_data]
+        depth_ims = [DepthImage(d) for d in depth_data]
+        color_batch = ImageBatch.from_images(color_ims)
+        depth_batch = ImageBatch(depth_data, DepthImage, copy=False)
+        self.assertEqual(color_batch.shape, (num_images, IM_HEIGHT, IM_WIDTH, 3))
+        self.assertEqual(depth_batch.channels, 1)
+        self.assertTrue(isinstance(depth_batch[1], DepthImage))
+
+        # color images keep their encoding through batch operations
+        bgr_batch = ImageBatch.from_images([color_im.rgb2bgr() for color_im in color_ims])
+        self.assertEqual(bgr_batch.encoding, 'bgr8')
+        self.assertEqual(bgr_batch.crop(20, 30)[0].encoding, 'bgr8')
+        self.assertEqual(bgr_batch.median().encoding, 'bgr8')
+        self.assertEqual(depth_batch.encoding, None)
+
+        # crops match the per-image crops, including zero-padded windows
+        center_i = np.array([IM_HEIGHT / 2, 3, IM_HEIGHT - 2, 20, 50])
+        center_j = np.array([IM_WIDTH / 2, 40, IM_WIDTH - 5, 1, 60])
+        color_crops = color_batch.crop(20, 30, center_i, center_j)
+        for i, color_im in enumerate(color_ims):
+            true_crop = color_im.crop(20, 30, center_i[i], center_j[i])
+            self.assertTrue(np.array_equal(color_crops[i].data, true_crop.data))
+        depth_crops = depth_batch.crop(20, 30)
+        self.assertTrue(np.array_equal(depth_crops[2].data, depth_ims[2].crop(20, 30).data))
+
+        # thresholding, masking and binarization
+        binary_batch = depth_batch.threshold(0.2, 0.8).to_binary()
+        masked_batch = color_batch.mask_binary(binary_batch)
+        for i in range(num_images):
+            binary_im = depth_ims[i].threshold(0.2, 0.8).to_binary()
+            self.assertTrue(np.array_equal(binary_batch[i].data, binary_im.data))
+            self.assertTrue(np.array_equal(masked_batch[i].data,
+                                           color_ims[i].mask_binary(binary_im).data))
+
+        # resizing and tensor export
+        resized_batch = depth_batch.resize(0.5, interp='nearest')
+        self.assertEqual(resized_batch.shape, (num_images, IM_HEIGHT // 2, IM_WIDTH // 2, 1))
+        self.assertTrue(np.array_equal(resized_batch.data, depth_batch.data[:, ::2, ::2, :]))
+        tensor = depth_batch.to_tensor(num_channels=3)
+        self.assertEqual(tensor.shape, (num_images, IM_HEIGHT, IM_WIDTH, 3))
+        self.assertTrue(np.array_equal(tensor[:, :, :, 2], depth_data))
+
+        # reductions
+        median_im = Image.median_images(depth_ims)
+        self.assertTrue(np.allclose(median_im.data, np.median(depth_data, axis=0)))
+
+    def test_temporal_depth_filter(self, num_images=7, window_size=3, alpha=0.5):
+        np.random.seed(0)
+        depth_data = np.random.rand(num_images, IM_HEIGHT, IM_WIDTH).astype(np.float32)
+        depth_data[depth_data < 0.3] = 0
+        depth_filter = TemporalDepthFilter(window_size=window_size, alpha=alpha)
+        for d in depth_data:
+            depth_filter.add(DepthImage(d))
+        self.assertEqual(depth_filter.num_frames, num_images)
+
+        # the median only covers the window, the min and counts every frame
+        window = depth_data[-window_size:]
+        self.assertTrue(np.allclose(depth_filter.median().data, np.median(window, axis=0)))
+        true_min = Image.min_images([DepthImage(d) for d in depth_data])
+        self.assertTrue(np.allclose(depth_filter.min().data, true_min.data))
+        self.assertTrue(np.array_equal(depth_filter.valid_counts, np.sum(depth_data > 0, axis=0)))
+
+        # exponential mean of the valid depths
+        px = np.nonzero(depth_filter.valid_counts == num_images)
+        true_mean = depth_data[0][px]
+        for d in depth_data[1:]:
+            true_mean = true_mean + alpha * (d[px] - true_mean)
+        self.assertTrue(np.allclose(depth_filter.mean().data[px], true_mean))
+        self.assertTrue(np.all(depth_filter.mean().data[depth_filter.valid_counts == 0] == 0))
+
+        self.assertRaises(ValueError, depth_filter.add, DepthImage(depth_data[0, :10]))
+        depth_filter.reset()
+        self.assertRaises(ValueError, depth_filter.median)
+
+    def test_ray_tracer(self, height=50, width=100, w=5):
+        data = np.zeros([height, width], dtype=np.uint8)
+        data[20:30, 60:70] = 255
+        binary_im = BinaryImage(data)
+
+        # march rows 25 and 5 to the right, brute-force checking each window
+        def occupied(p):
+            return np.any(data[int(p[0] - w / 2.0):int(p[0] - w / 2.0) + w,
+                               int(p[1] - w / 2.0):int(p[1] - w / 2.0) + w])
+        starts = np.array([[25.0, 10.0], [5.0, 10.0], [25.0, 65.0]])
+        directions = np.array([[0.0, 1.0], [0.0, 1.0], [0.0, 1.0]])
+        pixels, found = binary_im.ray_tracer(w).closest_nonzero_pixels(starts, directions)
+        self.assertTrue(np.array_equal(found, [True, False, True]))
+        self.assertTrue(occupied(pixels[0]) and not occupied(pixels[0] - [0, 0.5]))
+        self.assertTrue(np.array_equal(pixels[2], starts[2]))
+        self.assertTrue(np.array_equal(binary_im.closest_nonzero_pixel(starts[0], directions[0], w), pixels[0]))
+        self.assertTrue(binary_im.closest_nonzero_pixel(starts[1], directions[1], w) is None)
+
+        # leaving the object and reaching the set
+        pixel = binary_im.closest_allzero_pixel(starts[2], directions[2], w)
+        self.assertTrue(not occupied(pixel) and occupied(pixel - [0, 0.5]))
+        pixel_set = set([(25, 60)])
+        pixel = binary_im.closest_pixel_to_set(starts[0], pixel_set, directions[0], w)
+        self.assertTrue(np.array_equal(pixel, pixels[0]))
+        tracer = binary_im.set_ray_tracer(set(pixel_set), w)
+        self.assertTrue(tracer is binary_im.set_ray_tracer(pixel_set, w))
+        set_pixels, set_found = tracer.closest_nonzero_or_border_pixels(starts[:2], directions[:2])
+        self.assertTrue(np.array_equal(set_found, [True, False]))
+        self.assertTrue(np.array_equal(set_pixels[0], pixels[0]))
+
+    def test_connected_components(self, height=60, width=80):
+        data = np.zeros([height, width], dtype=np.uint8)
+        data[10:30, 10:40] = 255
+        data[15:20, 15:20] = 0
+        data[40:50, 60:70] = 255
+        data[22:24, 50:52] = 255
+        binary_im = BinaryImage(data)
+
+        # statistics of each component
+        components = binary_im.connected_components()
+        self.assertEqual(components.num_components, 3)
+        self.assertTrue(np.array_equal(components.areas, [575, 4, 100]))
+        self.assertTrue(np.array_equal(components.bboxes[2], [40, 60, 49, 69]))
+        self.assertTrue(np.allclose(components.centroids[2], [44.5, 64.5]))
+        self.assertTrue(np.allclose(components.min_distances([30, 55]), [np.hypot(1, 16), np.hypot(7, 4), np.hypot(10, 5)]))
+
+        # contours and masks built on the components
+        contours = binary_im.find_contours(min_area=10)
+        self.assertEqual(len(contours), 2)
+        self.assertEqual(contours[1].bounding_box.min_pt.tolist(), [40, 60])
+        contour_mask = binary_im.contour_mask(contours[1])
+        self.assertTrue(np.array_equal(contour_mask.data > 0, components.labels == 3))
+
+        # foreign contours fill their polygon, keeping components in holes
+        other_data = np.zeros([height, width], dtype=np.uint8)
+        other_data[20:35, 30:45] = 255
+        foreign_contour = BinaryImage(other_data).find_contours()[0]
+        contour_mask = binary_im.contour_mask(foreign_contour)
+        self.assertTrue(np.array_equal(contour_mask.data > 0, (other_data > 0) & (data > 0)))
+        hole_data = data.copy()
+        hole_data[16:18, 16:18] = 255
+        hole_im = BinaryImage(hole_data)
+        contour_mask = hole_im.contour_mask(hole_im.find_contours(min_area=100)[0])
+        expected_mask = np.zeros([height, width], dtype=bool)
+        expected_mask[10:30, 10:40] = hole_data[10:30, 10:40] > 0
+        self.assertTrue(np.array_equal(contour_mask.data > 0, expected_mask))
+        pruned_im = binary_im.prune_contours(area_thresh=50, dist_thresh=15)
+        self.assertTrue(np.array_equal(pruned_im.data > 0, components.labels == 1))
+        pruned_im = binary_im.prune_contours(area_thresh=50, dist_thresh=30, preserve_topology=False)
+        self.assertEqual(np.sum(pruned_im.data > 0), 700)
+        self.assertTrue(binary_im.prune_contours(area_thresh=1000) is None)
+
+        # small components in a hole of a kept component are kept
+        pruned_im = hole_im.prune_contours(area_thresh=50, dist_thresh=15)
+        self.assertTrue(np.array_equal(pruned_im.data > 0, expected_mask))
+        pruned_im = hole_im.prune_contours(area_thresh=50, dist_thresh=15, preserve_topology=False)
+        self.assertEqual(np.sum(pruned_im.data > 0), 600)
+
+    def test_segment_kmeans_fast(self, height=40, width=60):
+        data = np.zeros([height, width, 3], dtype=np.uint8)
+        data[5:35, 5:25] = [200, 20, 20]
+        data[5:35, 35:55] = [20, 20, 200]
+        color_im = ColorImage(data)
+
+        # two well-separated clusters fit on a subset of the pixels
+        segment_im, centers = color_im.segment_kmeans(1.0, 2, fast=True, max_pixels=100, return_centers=True)
+        self.assertEqual(centers.shape, (2, 5))
+        self.assertTrue(np.all(segment_im.data[data[:,:,0] == 0] == 0))
+        left_label = segment_im.data[20, 15]
+        right_label = segment_im.data[20, 45]
+        self.assertNotEqual(left_label, right_label)
+        self.assertTrue(np.all(segment_im.data[5:35, 5:25] == left_label))
+        self.assertTrue(np.all(segment_im.data[5:35, 35:55] == right_label))
+
+        # warm start from the previous centers
+        warm_im = color_im.segment_kmeans(1.0, 2, fast=True, max_iter=1, init_centers=centers)
+        self.assertTrue(np.array_equal(warm_im.data, segment_im.data))
+        self.assertRaises(ValueError, color_im.segment_kmeans, 1.0, 3, fast=True, init_centers=centers)
+
+    def test_sdf(self, height=40, width=50, band=3):
+        data = np.zeros([height, width], dtype=np.uint8)
+        data[10:30, 15:25] = 255
+        binary_im = BinaryImage(data)
+
+        sdf = binary_im.to_sdf()
+        self.assertEqual(sdf[20, 10], 5)
+        self.assertEqual(sdf[20, 19], -5)
+        self.assertAlmostEqual(sdf[5, 10], np.hypot(5, 5))
+
+        # band-limited distances match the clipped full field
+        band_sdf = binary_im.to_sdf(band=band, dtype=np.float32)
+        self.assertEqual(band_sdf.dtype, np.float32)
+        self.assertTrue(np.allclose(band_sdf, np.clip(sdf, -band, band)))
+        self.assertTrue(np.all(BinaryImage(np.zeros([height, width], dtype=np.uint8)).to_sdf(band=band) == band))
+
+    def test_segmentation_stats(self, height=40, width=50):
+        data = np.zeros([height, width], dtype=np.uint8)
+        data[5:15, 10:30] = 1
+        data[15:35, 20:25] = 2
+        data[30:32, 40:41] = 4
+        segment_im = SegmentationImage(data)
+
+        # per-segment statistics in one pass
+        self.assertTrue(np.array_equal(segment_im.segment_areas(), [height*width - 302, 200, 100, 0, 2]))
+        bboxes = segment_im.segment_bboxes()
+        self.assertTrue(np.array_equal(bboxes[1], [5, 10, 14, 29]))
+        self.assertTrue(np.array_equal(bboxes[3], [-1, -1, -1, -1]))
+        self.assertTrue(np.allclose(segment_im.segment_centroids()[2], [24.5, 22]))
+        depth_im = DepthImage(np.arange(height*width, dtype=np.float32).reshape(height, width))
+        self.assertTrue(np.allclose(segment_im.segment_means(depth_im)[4], [30.5*width + 40]))
+        self.assertTrue(np.isnan(segment_im.segment_medians(depth_im.data)[3]))
+        self.assertEqual(segment_im.segment_medians(depth_im.data)[1], np.median(depth_im.data[data == 1]))
+        self.assertEqual(segment_im.segment_medians(depth_im.data, mask=depth_im.data > 10*width)[1],
+                         np.median(depth_im.data[(data == 1) & (depth_im.data > 10*width)]))
+
+        # boundaries between nonzero segments only
+        boundary_px = segment_im.border_pixels()
+        self.assertEqual(set(boundary_px[:, 0]), set([14, 15]))
+        self.assertEqual(set(boundary_px[:, 1]), set(range(19, 26)))
+
     def test_indexing(self, height=50, width=100):
         color_data = (255 * np.random.rand(height, width, 3)).astype(np.uint8)
         im = ColorImage(color_data, 'a')
@@ -409,6 +699,18 @@ class TestImage(unittest.TestCase):
         loaded_im = ColorImage.open(filename)
         self.assertTrue(np.sum(np.abs(loaded_im.data - im.data)) < 1e-5, msg='ColorImage data changed after load npz')
 
+        # depth and IR round trip exactly through 16-bit png
+        filename = file_root + '.png'
+        depth_mm = (3000 * np.random.rand(height, width)).astype(np.uint16)
+        im = DepthImage(depth_mm.astype(np.float32) * np.float32(0.001), 'a')
+        im.save(filename, compression_level=3)
+        loaded_im = DepthImage.open(filename, 'a')
+        self.assertTrue(np.array_equal(loaded_im.data, im.data), msg='DepthImage data changed after load png')
+        im = IrImage((65535 * np.random.rand(height, width)).astype(np.uint16), 'a')
+        im.save(filename)
+        loaded_im = IrImage.open(filename, 'a')
+        self.assertTrue(np.array_equal(loaded_im.data, im.data), msg='IrImage data changed after load png')
+
 if __name__ == '__main__':
     unittest.main()
     
@@ -0,0 +1,61 @@
+"""
+Tests the image ring buffer behind the stream_image_buffer ROS node.
+"""
+import os
+from io import BytesIO
+import numpy as np
+import unittest
+
+from perception.image_ring_buffer import ImageRingBuffer
+
+try:
+    import genpy.dynamic
+except ImportError:
+    genpy = None
+
+SRV_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'srv', 'ImageBuffer.srv')
+
+class TestImageBuffer(unittest.TestCase):
+    def test_ring_buffer(self, bufsize=4, height=3, width=5):
+        buf = ImageRingBuffer(bufsize)
+        for i in range(bufsize + 2):
+            buf.add(np.full([height, width], i, dtype=np.uint16), float(i))
+        buf.add(np.zeros([height, width], dtype=np.float32), 0.0)
+        self.assertEqual(buf.num_rejected, 1)
+        self.assertEqual(buf.num_dropped, 2)
+
+        # newest first, and unaffected by frames added afterwards
+        images, times = buf.latest(bufsize)
+        self.assertEqual(images.shape, (bufsize, height, width, 1))
+        self.assertEqual(images.dtype, np.uint16)
+        self.assertTrue(np.array_equal(times, [5, 4, 3, 2]))
+        buf.add(np.full([height, width], 6, dtype=np.uint16), 6.0)
+        self.assertTrue(np.array_equal(images[:, 0, 0, 0], [5, 4, 3, 2]))
+        self.assertRaises(RuntimeError, buf.latest, bufsize + 1)
+
+    @unittest.skipIf(genpy is None, 'ROS genpy not installed')
+    def test_response_serialization(self, num_images=3, height=4, width=6):
+        buf = ImageRingBuffer(num_images)
+        for i in range(num_images):
+            buf.add(np.full([height, width], i + 0.5, dtype=np.float32), float(i))
+        images, times = buf.latest(num_images)
+
+        # build the response the way the node does
+        response_def = open(SRV_FILENAME).read().split('---')[1]
+        response_class = genpy.dynamic.generate_dynamic('perception/ImageBufferResponse',
+                                                        response_def)['perception/ImageBufferResponse']
+        response = response_class(times, images.tobytes(), images.shape[3], str(images.dtype),
+                                  num_images, height, width)
+        buff = BytesIO()
+        response.serialize(buff)
+        received = response_class()
+        received.deserialize(buff.getvalue())
+
+        # read it the way PrimesenseSensor_ROS does
+        data = np.frombuffer(received.data, dtype=received.dtype).reshape(
+            received.data_dim1, received.data_dim2, received.data_dim3, received.depth_per)
+        self.assertTrue(np.array_equal(data, images))
+        self.assertTrue(np.array_equal(received.timestamps, times))
+
+if __name__ == '__main__':
+    unittest.main()
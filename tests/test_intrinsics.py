@@ -0,0 +1,107 @@
+"""
+Tests the camera intrinsics class.
+"""
+import logging
+import numpy as np
+import unittest
+
+from .constants import *
+from autolab_core import Point, PointCloud
+from perception import CameraIntrinsics, OrthographicIntrinsics, DepthImage
+
+class TestIntrinsics(unittest.TestCase):
+    def test_deproject(self):
+        np.random.seed(101)
+        camera_intr = CameraIntrinsics('camera', fx=525.0, fy=520.0,
+                                       cx=IM_WIDTH / 2 - 0.5,
+                                       cy=IM_HEIGHT / 2 + 1.5,
+                                       height=IM_HEIGHT, width=IM_WIDTH)
+        depth_data = np.random.rand(IM_HEIGHT, IM_WIDTH).astype(np.float32)
+        depth_data[depth_data < 0.1] = 0.0
+        depth_im = DepthImage(depth_data, frame='camera')
+
+        # reference deprojection
+        pixel_grid = np.meshgrid(np.arange(IM_WIDTH), np.arange(IM_HEIGHT))
+        pixels_homog = np.r_[pixel_grid[0].reshape(1,-1),
+                             pixel_grid[1].reshape(1,-1),
+                             np.ones([1, IM_HEIGHT * IM_WIDTH])]
+        true_points = depth_data.reshape(1,-1) * np.linalg.inv(camera_intr.K).dot(pixels_homog)
+
+        point_cloud = camera_intr.deproject(depth_im)
+        self.assertEqual(point_cloud.data.dtype, np.float32)
+        self.assertTrue(np.allclose(point_cloud.data, true_points, atol=1e-5))
+
+        # image and caller-supplied buffers
+        buf = np.zeros([IM_HEIGHT, IM_WIDTH, 3], dtype=np.float32)
+        point_cloud_im = camera_intr.deproject_to_image(depth_im, out=buf)
+        self.assertTrue(np.allclose(buf.reshape(-1, 3).T, true_points, atol=1e-5))
+        self.assertTrue(np.allclose(point_cloud_im.to_point_cloud().data, true_points, atol=1e-5))
+
+        # cache is reset by changing the intrinsics
+        rays = camera_intr.unit_rays()
+        self.assertTrue(rays is camera_intr.unit_rays())
+        camera_intr.cx = camera_intr.cx + 2.0
+        self.assertFalse(rays is camera_intr.unit_rays())
+        self.assertTrue(np.allclose(camera_intr.unit_rays()[:,:,2], 1.0))
+
+        caught_bad_buffer = False
+        try:
+            camera_intr.deproject(depth_im, out=np.zeros([3, IM_HEIGHT * IM_WIDTH], dtype=np.float32))
+        except ValueError:
+            caught_bad_buffer = True
+        self.assertTrue(caught_bad_buffer)
+
+    def test_project_to_image(self):
+        camera_intr = CameraIntrinsics('camera', fx=100.0, fy=100.0,
+                                       cx=IM_WIDTH / 2, cy=IM_HEIGHT / 2,
+                                       height=IM_HEIGHT, width=IM_WIDTH)
+
+        # the nearest point wins regardless of order, far off-image points are dropped
+        points = np.array([[0.0, 0.0, 0.0, 700.0, 0.01],
+                           [0.0, 0.0, 0.0, 0.0, 0.0],
+                           [0.5, 0.3, 0.9, 1.0, -1.0]])
+        depth_im = camera_intr.project_to_image(PointCloud(points, frame='camera'))
+        self.assertEqual(depth_im.data.dtype, np.float32)
+        self.assertEqual(np.sum(depth_im.data > 0), 1)
+        self.assertAlmostEqual(depth_im[IM_HEIGHT // 2, IM_WIDTH // 2], 0.3, places=6)
+
+        # splatting fills a footprint and respects existing depths
+        buf = np.zeros([IM_HEIGHT, IM_WIDTH], dtype=np.float32)
+        buf[IM_HEIGHT // 2, IM_WIDTH // 2 + 1] = 0.1
+        depth_im = camera_intr.project_to_image(PointCloud(points, frame='camera'),
+                                                splat_size=3, out=buf)
+        self.assertEqual(np.sum(buf > 0), 9)
+        self.assertAlmostEqual(buf[IM_HEIGHT // 2, IM_WIDTH // 2 + 1], 0.1, places=6)
+        self.assertAlmostEqual(buf[IM_HEIGHT // 2 - 1, IM_WIDTH // 2 - 1], 0.3, places=6)
+        self.assertTrue(np.allclose(depth_im.data, buf))
+
+    def test_orthographic_project(self):
+        camera_intr = OrthographicIntrinsics('camera', 1.0, 1.0, 1.0,
+                                             IM_HEIGHT, IM_WIDTH)
+
+        # pixels and depths are scaled and offset coordinates
+        points = np.array([[0.0, 0.0, 0.1, 2.0],
+                           [0.0, 0.0, -0.2, 0.0],
+                           [0.2, -0.1, 0.0, 0.0]])
+        point_cloud = PointCloud(points, frame='camera')
+        image_coords = camera_intr.project(point_cloud)
+        self.assertTrue(np.array_equal(image_coords.data[:,:3], [[50, 50, 60], [50, 50, 30]]))
+        point_coords = camera_intr.project(Point(points[:,2], frame='camera'))
+        self.assertTrue(np.array_equal(point_coords.data.ravel(), [60, 30]))
+
+        # the nearest point wins and off-image points are dropped
+        depth_im = camera_intr.project_to_image(point_cloud)
+        self.assertEqual(np.sum(depth_im.data > 0), 2)
+        self.assertAlmostEqual(depth_im[50, 50], 0.4, places=6)
+        self.assertAlmostEqual(depth_im[30, 60], 0.5, places=6)
+        self.assertTrue(np.allclose(camera_intr.deproject(depth_im).data[:, 30 * IM_WIDTH + 60], points[:,2]))
+
+        # splatting fills a footprint around each point
+        depth_im = camera_intr.project_to_image(point_cloud, splat_size=3)
+        self.assertEqual(np.sum(depth_im.data > 0), 18)
+        self.assertAlmostEqual(depth_im[51, 49], 0.4, places=6)
+        self.assertAlmostEqual(depth_im[29, 61], 0.5, places=6)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    unittest.main()
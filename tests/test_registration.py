@@ -59,6 +59,49 @@ class TestRegistration(TestCase):
 
         self.assertTrue(np.allclose(tf.matrix, result.T_source_target.matrix, atol=1e-3))
 
+    def test_registration_float32(self):
+        np.random.seed(102)
+
+        source_points = np.random.rand(3, NUM_POINTS).astype(np.float32)
+        source_normals = np.random.rand(3, NUM_POINTS).astype(np.float32)
+        source_normals = source_normals / np.tile(np.linalg.norm(source_normals, axis=0)[np.newaxis,:], [3,1])
+
+        source_point_cloud = PointCloud(source_points, frame='world')
+        source_normal_cloud = NormalCloud(source_normals, frame='world')
+
+        matcher = PointToPlaneFeatureMatcher()
+        solver = PointToPlaneICPSolver(sample_size=NUM_POINTS, use_float32=True,
+                                       convergence_thresh=1e-7)
+
+        tf = RigidTransform(rotation = RigidTransform.random_rotation(),
+                            translation = RigidTransform.random_translation(),
+                            from_frame='world', to_frame='world')
+        tf = RigidTransform(from_frame='world', to_frame='world').interpolate_with(tf, 0.01)
+        target_point_cloud = tf * source_point_cloud
+        target_normal_cloud = tf * source_normal_cloud
+
+        result = solver.register(source_point_cloud, target_point_cloud,
+                                 source_normal_cloud, target_normal_cloud,
+                                 matcher, num_iterations=NUM_ITERS)
+
+        self.assertTrue(np.allclose(tf.matrix, result.T_source_target.matrix, atol=1e-3))
+
+    def test_kdtree_matching(self):
+        np.random.seed(103)
+        source_points = 0.2 * np.random.rand(NUM_POINTS, 3)
+        target_points = 0.2 * np.random.rand(NUM_POINTS, 3)
+        source_normals = np.random.randn(NUM_POINTS, 3)
+        source_normals = source_normals / np.linalg.norm(source_normals, axis=1)[:,np.newaxis]
+        target_normals = np.random.randn(NUM_POINTS, 3)
+        target_normals = target_normals / np.linalg.norm(target_normals, axis=1)[:,np.newaxis]
+
+        dense_corrs = PointToPlaneFeatureMatcher().match(source_points, target_points,
+                                                         source_normals, target_normals)
+        kdtree_corrs = PointToPlaneFeatureMatcher(use_kdtree=True).match(source_points, target_points,
+                                                                         source_normals, target_normals)
+        self.assertTrue(np.any(dense_corrs.index_map != -1))
+        self.assertTrue(np.array_equal(dense_corrs.index_map, kdtree_corrs.index_map))
+
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.INFO)
     test_suite = unittest.TestSuite()
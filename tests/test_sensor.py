@@ -0,0 +1,324 @@
+"""
+Tests the camera sensor wrappers.
+"""
+import logging
+import multiprocessing
+import numpy as np
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from .constants import *
+from perception import (CameraIntrinsics, ColorImage, DepthImage, IrImage,
+                        CameraSensor, AsyncCameraSensor, VirtualSensor,
+                        RgbdRecordingWriter, RgbdRecording, RgbdRecordingSensor,
+                        FrameSynchronizer, SharedFrameChannel,
+                        SensorUnresponsiveException, pointcloud2_to_array)
+
+class CountingSensor(CameraSensor):
+    """ Sensor that returns depth images filled with the frame count. """
+    def __init__(self, delay=0.001):
+        self._delay = delay
+        self._count = 0
+        self._running = False
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def start(self):
+        self._running = True
+
+    def stop(self):
+        self._running = False
+
+    def frames(self):
+        time.sleep(self._delay)
+        self._count += 1
+        depth_im = DepthImage(self._count * np.ones([IM_HEIGHT, IM_WIDTH], dtype=np.float32))
+        return None, depth_im, None
+
+class FailingSensor(CountingSensor):
+    """ Sensor that returns one frame, then blocks in frames() until released and fails. """
+    def __init__(self):
+        CountingSensor.__init__(self)
+        self.release = threading.Event()
+
+    def frames(self):
+        if self._count == 0:
+            return CountingSensor.frames(self)
+        self.release.wait()
+        raise IOError('device disconnected')
+
+def produce_depth_frames(channel, num_frames):
+    """ Writes depth images filled with the frame count to a channel. """
+    for i in range(num_frames):
+        channel.put(DepthImage(i * np.ones([IM_HEIGHT, IM_WIDTH], dtype=np.float32)), timestamp=float(i))
+    channel.close()
+
+class PointField(object):
+    def __init__(self, name, offset, datatype, count=1):
+        self.name = name
+        self.offset = offset
+        self.datatype = datatype
+        self.count = count
+
+class PointCloud2(object):
+    def __init__(self, data, height, width):
+        self.height = height
+        self.width = width
+        self.fields = [PointField('x', 0, 7), PointField('y', 4, 7),
+                       PointField('z', 8, 7), PointField('rgb', 16, 6)]
+        self.is_bigendian = False
+        self.point_step = 32
+        self.row_step = data.shape[1] * self.point_step
+        self.data = data.tobytes()
+
+class TestSensor(unittest.TestCase):
+    def test_async_sensor(self, buffer_size=5):
+        sensor = AsyncCameraSensor(CountingSensor(), buffer_size=buffer_size)
+        self.assertFalse(sensor.is_running)
+        sensor.start()
+        self.assertTrue(sensor.sensor.is_running)
+
+        # the next frame is captured after the latest frame
+        _, depth_im, _ = sensor.frames()
+        (_, next_depth_im, _), timestamp = sensor.next_frame(timeout=1.0)
+        self.assertTrue(next_depth_im[0, 0] > depth_im[0, 0])
+        self.assertTrue(timestamp > 0)
+
+        # the last frames are consecutive and in order
+        while sensor.num_captured < 3 * buffer_size:
+            sensor.next_frame(timeout=1.0)
+        frames, timestamps = sensor.last_frames(2 * buffer_size)
+        self.assertEqual(len(frames), buffer_size)
+        depths = np.array([f[1][0, 0] for f in frames])
+        self.assertTrue(np.all(np.diff(depths) == 1))
+        self.assertTrue(np.all(np.diff(timestamps) >= 0))
+
+        # unread frames are dropped once the buffer wraps around
+        num_dropped = sensor.num_dropped
+        time.sleep(0.1)
+        self.assertTrue(sensor.stop())
+        self.assertFalse(sensor.sensor.is_running)
+        self.assertTrue(sensor.num_dropped > num_dropped)
+        self.assertTrue(sensor.num_dropped < sensor.num_captured)
+        self.assertFalse(sensor.stop())
+
+    def test_async_frames_batch(self, num_frames=5):
+        sensor = AsyncCameraSensor(CountingSensor())
+        sensor.start()
+        color_batch, depth_batch, timestamps = sensor.frames_batch(num_frames, timeout=1.0)
+        sensor.stop()
+        self.assertTrue(color_batch is None)
+        depths = depth_batch.data[:, 0, 0, 0]
+        self.assertEqual(len(np.unique(depths)), num_frames)
+        self.assertTrue(np.all(np.diff(depths) > 0))
+        self.assertTrue(np.all(np.diff(timestamps) >= 0))
+
+    def test_async_sensor_errors(self, stop_timeout=0.1):
+        # stop does not hang on a sensor blocked in frames()
+        sensor = AsyncCameraSensor(FailingSensor(), stop_timeout=stop_timeout)
+        sensor.start()
+        sensor.latest_frame(timeout=1.0)
+        start_time = time.time()
+        self.assertTrue(sensor.stop())
+        self.assertTrue(time.time() - start_time < 10 * stop_timeout)
+        sensor.sensor.release.set()
+
+        # capture errors are raised instead of returning stale frames
+        sensor = AsyncCameraSensor(FailingSensor())
+        sensor.start()
+        sensor.latest_frame(timeout=1.0)
+        sensor.sensor.release.set()
+        while sensor.is_running:
+            time.sleep(0.01)
+        self.assertRaises(RuntimeError, sensor.latest_frame)
+        self.assertTrue(isinstance(sensor.capture_error, IOError))
+        sensor.stop()
+
+    def test_frames_batch(self, num_frames=4):
+        sensor = CountingSensor(delay=0.0)
+        sensor.start()
+        color_ims, depth_ims, timestamps = sensor.frames_batch(num_frames)
+        self.assertTrue(color_ims is None)
+        self.assertEqual(depth_ims.shape, (num_frames, IM_HEIGHT, IM_WIDTH, 1))
+        self.assertTrue(np.array_equal(depth_ims.data[:, 0, 0, 0], np.arange(1, num_frames + 1)))
+        self.assertTrue(np.all(np.diff(timestamps) >= 0))
+
+        # reductions over frames 5-8, 9-12 and 13-16
+        self.assertTrue(np.allclose(sensor.median_depth_img(num_frames).data, 6.5))
+        self.assertTrue(np.allclose(sensor.min_depth_img(num_frames).data, 9.0))
+        self.assertTrue(np.allclose(sensor.mean_depth_img(num_frames).data, 14.5))
+
+    def test_frame_synchronizer(self):
+        frame_sync = FrameSynchronizer(['color', 'depth'], slop=0.01)
+        frame_sync.add('color', 1.0, 'color_1')
+        frame_sync.add('color', 2.0, 'color_2')
+        frame_sync.add('depth', 1.995, 'depth_2')
+        frames, stamps = frame_sync.wait(timeout=0.1)
+        self.assertEqual(frames, ['color_2', 'depth_2'])
+        self.assertEqual(stamps, [2.0, 1.995])
+
+        # matches are only returned once
+        caught_timeout = False
+        try:
+            frame_sync.wait(timeout=0.01)
+        except SensorUnresponsiveException:
+            caught_timeout = True
+        self.assertTrue(caught_timeout)
+
+        # waiting readers wake up when a frame from another thread completes a match
+        frame_sync.add('depth', 3.0, 'depth_3')
+        thread = threading.Timer(0.05, frame_sync.add, args=('color', 3.005, 'color_3'))
+        thread.start()
+        frames, _ = frame_sync.wait(timeout=1.0)
+        self.assertEqual(frames, ['color_3', 'depth_3'])
+        thread.join()
+
+        # queued matches are read oldest first
+        frame_sync = FrameSynchronizer(['depth'], match_queue_size=2)
+        for i in range(3):
+            frame_sync.add('depth', float(i), i)
+        self.assertEqual(frame_sync.num_matches, 2)
+        self.assertEqual(frame_sync.wait()[0], [1])
+        self.assertEqual(frame_sync.wait()[0], [2])
+
+    def test_pointcloud2_decode(self, height=4, width=6):
+        # points padded to 32 bytes with an extra padding point per row
+        data = np.random.rand(height, width + 1, 8).astype(np.float32)
+        msg = PointCloud2(data, height, width)
+        points = pointcloud2_to_array(msg)
+        self.assertEqual(points.shape, (height, width))
+        self.assertTrue(np.array_equal(points['z'], data[:, :width, 2]))
+        self.assertTrue(np.array_equal(points['rgb'], data[:, :width, 4].view(np.uint32)))
+
+        depth_im = DepthImage(points['z'])
+        self.assertTrue(np.array_equal(depth_im.data, data[:, :width, 2]))
+
+    def test_shared_frame_channel(self, num_frames=20, num_slots=3):
+        template = DepthImage(np.zeros([IM_HEIGHT, IM_WIDTH], dtype=np.float32), frame='camera')
+        channel = SharedFrameChannel.from_image(template, num_slots=num_slots)
+        self.assertRaises(ValueError, channel.put, DepthImage(np.zeros([IM_HEIGHT, 10], dtype=np.float32)))
+        self.assertRaises(SensorUnresponsiveException, channel.get, timeout=0.01)
+
+        # every frame arrives in order even though the producer outpaces the slots
+        producer = multiprocessing.Process(target=produce_depth_frames, args=(channel, num_frames))
+        producer.start()
+        for i in range(num_frames):
+            depth_im, seq_num, timestamp = channel.get(timeout=5.0)
+            self.assertTrue(isinstance(depth_im, DepthImage))
+            self.assertEqual(depth_im.frame, 'camera')
+            self.assertEqual(seq_num, i)
+            self.assertEqual(timestamp, float(i))
+            self.assertTrue(np.all(depth_im.data == i))
+            self.assertLessEqual(channel.num_pending, num_slots)
+        self.assertRaises(RuntimeError, channel.get)
+        producer.join()
+
+        # a full channel drops frames instead of blocking when asked to
+        channel = SharedFrameChannel.from_image(template, num_slots=1)
+        self.assertTrue(channel.put(template, block=False))
+        self.assertFalse(channel.put(template, block=False))
+        self.assertEqual(channel.num_dropped, 1)
+
+    def test_virtual_sensor(self, num_images=4):
+        image_dir = tempfile.mkdtemp()
+        try:
+            CameraIntrinsics('camera', 500.0, 500.0, height=IM_HEIGHT, width=IM_WIDTH).save(os.path.join(image_dir, 'camera.intr'))
+            for i in range(num_images):
+                ColorImage(i * np.ones([IM_HEIGHT, IM_WIDTH, 3], dtype=np.uint8)).save(os.path.join(image_dir, 'color_%d.png' %(i)))
+                np.save(os.path.join(image_dir, 'depth_%d.npy' %(i)), i * np.ones([IM_HEIGHT, IM_WIDTH], dtype=np.float32))
+
+            # prefetched frames match the files in order and wrap around when looping
+            sensor = VirtualSensor(image_dir, frame='camera', num_prefetch=2, mmap_depth=True)
+            self.assertEqual(sensor.num_images, num_images)
+            sensor.start()
+            for i in range(num_images + 2):
+                color_im, depth_im, _ = sensor.frames()
+                self.assertTrue(np.all(color_im.data == i % num_images))
+                self.assertTrue(np.all(depth_im.data == i % num_images))
+            color_im, depth_im, _ = sensor.frame_at(3)
+            self.assertTrue(np.all(depth_im.data == 3))
+            self.assertRaises(ValueError, sensor.frame_at, num_images)
+
+            # random access does not share images with the stream
+            next_index = (num_images + 2) % num_images
+            color_im, depth_im, _ = sensor.frame_at(next_index)
+            self.assertTrue(np.all(depth_im.data == next_index))
+            color_im.data[:] = 255
+            depth_im.data[:] = -1.0
+            color_im, depth_im, _ = sensor.frames()
+            self.assertTrue(np.all(color_im.data == next_index))
+            self.assertTrue(np.all(depth_im.data == next_index))
+            sensor.stop()
+
+            # without looping the stream ends after the last frame
+            sensor = VirtualSensor(image_dir, frame='camera', loop=False)
+            sensor.start()
+            for i in range(num_images):
+                sensor.frames()
+            self.assertRaises(RuntimeError, sensor.frames)
+            sensor.stop()
+        finally:
+            shutil.rmtree(image_dir)
+
+    def test_rgbd_recording(self, num_frames=5):
+        np.random.seed(0)
+        image_dir = tempfile.mkdtemp()
+        filename = os.path.join(image_dir, 'test.rgbd')
+        camera_intr = CameraIntrinsics('camera', 500.0, 500.0, height=IM_HEIGHT, width=IM_WIDTH)
+        color_ims = [ColorImage((255 * np.random.rand(IM_HEIGHT, IM_WIDTH, 3)).astype(np.uint8), 'camera') for i in range(num_frames)]
+        depth_ims = [DepthImage(np.random.rand(IM_HEIGHT, IM_WIDTH).astype(np.float32), 'camera') for i in range(num_frames)]
+        ir_ims = [IrImage((1000 * np.random.rand(IM_HEIGHT, IM_WIDTH)).astype(np.uint16), 'camera') for i in range(num_frames)]
+        try:
+            # frames are readable while recording continues
+            writer = RgbdRecordingWriter(filename, color_intr=camera_intr, frame='camera')
+            writer.write(color_ims[0], depth_ims[0], ir_ims[0], timestamp=0.0)
+            recording = RgbdRecording(filename)
+            self.assertEqual(recording.num_frames, 1)
+            for i in range(1, num_frames - 1):
+                writer.write(color_ims[i], depth_ims[i], timestamp=float(i))
+            self.assertEqual(recording.refresh(), num_frames - 2)
+            writer.close()
+            recording.close()
+
+            # appending to a closed recording keeps the indexed frames
+            with RgbdRecordingWriter(filename, append=True) as writer:
+                writer.write(color_ims[-1], depth_ims[-1], ir_ims[-1], timestamp=float(num_frames - 1))
+
+            # the images are recovered losslessly in any order
+            with RgbdRecording(filename) as recording:
+                self.assertEqual(recording.num_frames, num_frames)
+                self.assertTrue(np.array_equal(recording.timestamps, np.arange(num_frames)))
+                self.assertEqual(recording.color_intrinsics.fx, camera_intr.fx)
+                for i in reversed(range(num_frames)):
+                    color_im, depth_im, ir_im = recording.read(i)
+                    self.assertTrue(np.array_equal(color_im.data, color_ims[i].data))
+                    self.assertTrue(np.array_equal(depth_im.data, depth_ims[i].data))
+                    self.assertEqual(depth_im.frame, 'camera')
+                    if i == 0 or i == num_frames - 1:
+                        self.assertTrue(np.array_equal(ir_im.data, ir_ims[i].data))
+                    else:
+                        self.assertTrue(ir_im is None)
+                self.assertRaises(ValueError, recording.read, num_frames)
+
+            # replay
+            sensor = RgbdRecordingSensor(filename, num_prefetch=2)
+            self.assertEqual(sensor.ir_intrinsics.fx, camera_intr.fx)
+            sensor.start()
+            for i in range(num_frames + 1):
+                color_im, depth_im, _ = sensor.frames()
+                self.assertTrue(np.array_equal(depth_im.data, depth_ims[i % num_frames].data))
+            sensor.close()
+            self.assertFalse(sensor.is_running)
+            self.assertTrue(sensor.recording.closed)
+        finally:
+            shutil.rmtree(image_dir)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    unittest.main()
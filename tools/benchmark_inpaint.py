@@ -0,0 +1,59 @@
+"""
+Benchmark the depth image inpainting methods
+"""
+import argparse
+import logging
+import numpy as np
+import time
+
+from perception import DepthImage
+
+METHODS = ['convolve', 'pyramid', 'nearest']
+
+def synthetic_depth_im(height, width, hole_radius):
+    """ Creates a sloped plane with a large circular shadow and speckle noise. """
+    np.random.seed(0)
+    ii, jj = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+    data = (0.6 + 0.2 * ii / height + 0.1 * jj / width).astype(np.float32)
+    data[(ii - height / 2)**2 + (jj - width / 2)**2 < hole_radius**2] = 0.0
+    data[np.random.rand(height, width) < 0.05] = 0.0
+    return DepthImage(data)
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+
+    # parse args
+    parser = argparse.ArgumentParser(description='Benchmark depth image inpainting')
+    parser.add_argument('--depth_im', type=str, default=None, help='depth image to inpaint (defaults to a synthetic image)')
+    parser.add_argument('--height', type=int, default=772, help='height of the synthetic image')
+    parser.add_argument('--width', type=int, default=1032, help='width of the synthetic image')
+    parser.add_argument('--hole_radius', type=int, default=150, help='radius of the synthetic shadow region')
+    parser.add_argument('--rescale_factor', type=float, default=1.0, help='rescale factor for inpainting')
+    parser.add_argument('--num_trials', type=int, default=3, help='number of timed trials per method')
+    args = parser.parse_args()
+
+    if args.depth_im is not None:
+        depth_im = DepthImage.open(args.depth_im)
+    else:
+        depth_im = synthetic_depth_im(args.height, args.width, args.hole_radius)
+    valid_px = depth_im.data > 0
+    logging.info('Inpainting %dx%d image with %d zero pixels' %(depth_im.height, depth_im.width,
+                                                                np.sum(~valid_px)))
+
+    # time each method
+    results = {}
+    for method in METHODS:
+        times = []
+        for i in range(args.num_trials):
+            start = time.time()
+            results[method] = depth_im.inpaint(rescale_factor=args.rescale_factor,
+                                               method=method)
+            times.append(time.time() - start)
+        logging.info('%s: %.4f sec (min of %d)' %(method, np.min(times), args.num_trials))
+
+    # compare fills against the original method
+    ref_data = results['convolve'].data
+    for method in METHODS[1:]:
+        diff = np.abs(results[method].data - ref_data)[~valid_px]
+        logging.info('%s: mean abs diff from convolve %.4f, max %.4f' %(method, np.mean(diff),
+                                                                        np.max(diff)))